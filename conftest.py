@@ -1,6 +1,10 @@
 """
 Pytest configuration and shared fixtures for ES-MySQL pipeline tests
 
+The suite can run under pytest-xdist (pytest -n auto).
+Session-scoped fixtures are then built once per worker, and servers bind
+port 0 so workers never compete for a port.
+
 Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 GitHub: github.com/kmcallorum
 License: MIT
@@ -8,8 +12,18 @@ License: MIT
 import pytest
 import tempfile
 import csv
+import functools
 import json
 import os
+import mysql.connector.pooling
+from mysql.connector.connection import MySQLConnection
+from mysql.connector.cursor import MySQLCursor
+from types import SimpleNamespace
+from unittest.mock import Mock
+from urllib3.util.retry import Retry
+
+from pipeline import DataPipeline
+from test_impl import CSVSource, JSONLSink
 
 
 # =============================================================================
@@ -29,15 +43,9 @@ def sample_csv_file(temp_dir):
     csv_path = os.path.join(temp_dir, "test_data.csv")
 
     with open(csv_path, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=["id", "name", "value", "timestamp"])
-        writer.writeheader()
-        for i in range(1, 6):
-            writer.writerow({
-                "id": str(i),
-                "name": f"User{i}",
-                "value": str(i * 100),
-                "timestamp": f"2024-01-0{i}"
-            })
+        writer = csv.writer(f)
+        writer.writerow(("id", "name", "value", "timestamp"))
+        writer.writerows((str(i), f"User{i}", str(i * 100), f"2024-01-0{i}") for i in range(1, 6))
 
     return csv_path
 
@@ -60,19 +68,115 @@ def large_csv_file(temp_dir):
     """Create a larger CSV file for performance tests"""
     csv_path = os.path.join(temp_dir, "large_data.csv")
 
+    # Plain values need no quoting, so pre-format the lines for one writelines()
     with open(csv_path, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=["id", "data", "value"])
-        writer.writeheader()
-        for i in range(1000):
-            writer.writerow({
-                "id": str(i),
-                "data": f"test_data_{i}",
-                "value": str(i * 10)
-            })
+        f.write("id,data,value\n")
+        f.writelines([f"{i},test_data_{i},{i * 10}\n" for i in range(1000)])
 
     return csv_path
 
 
+@pytest.fixture(scope="session")
+def csv_fixture(tmp_path_factory):
+    """
+    Get the path of an "id,data" CSV with `rows` rows ("0,test0", "1,test1", ...).
+    
+    Each size is written once per session and shared by every test that asks
+    for it, so tests must only read the file.
+    """
+    directory = tmp_path_factory.mktemp("csv", numbered=False)
+
+    @functools.lru_cache(maxsize=None)
+    def build(rows: int) -> str:
+        path = directory / f"rows_{rows}.csv"
+        path.write_text("id,data\n" + "".join(f"{i},test{i}\n" for i in range(rows)))
+        return str(path)
+
+    return build
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    """
+    Build a DataPipeline reading a CSV into a fresh sink under tmp_path.
+    
+    Returns (pipeline, output_path); use the pipeline as a context manager so
+    source and sink are closed. sink_cls is called with the output path.
+    """
+    def build(csv_path, num_threads=1, analyzer=None, sink_cls=JSONLSink, **kwargs):
+        output_path = str(tmp_path / f"out_{num_threads}.jsonl")
+        pipeline = DataPipeline(CSVSource(str(csv_path)), sink_cls(output_path),
+                                num_threads=num_threads, error_analyzer=analyzer, **kwargs)
+        return pipeline, output_path
+    
+    return build
+
+
+@pytest.fixture
+def mysql_mocks(monkeypatch):
+    """
+    Patch MySQL connection pooling with a pool -> connection -> cursor Mock chain.
+    
+    Returns a namespace with pool_class, pool, conn and cursor. Each Mock is
+    specced on the real mysql-connector class, so a misspelt method fails
+    instead of silently passing. The chain is built per test because tests
+    script cursor.rowcount and side effects.
+    """
+    cursor = Mock(spec=MySQLCursor)
+    conn = Mock(spec=MySQLConnection)  # What a pooled connection proxies to
+    conn.cursor.return_value = cursor
+    pool = Mock(spec=mysql.connector.pooling.MySQLConnectionPool)
+    pool.get_connection.return_value = conn
+    pool_class = Mock(return_value=pool)
+    monkeypatch.setattr("production_impl.mysql.connector.pooling.MySQLConnectionPool", pool_class)
+    return SimpleNamespace(pool_class=pool_class, pool=pool, conn=conn, cursor=cursor)
+
+
+@pytest.fixture
+def make_mysql_sink(mysql_mocks):
+    """
+    Build a MySQLSink on the mocked pool for testdb.testtable.
+    
+    Keyword arguments (batch_size, pool_size, local_infile, ...) are passed
+    through to MySQLSink, so tests only spell out what they change.
+    """
+    from production_impl import MySQLSink
+
+    def build(**kwargs):
+        return MySQLSink(host="localhost", user="root", password="password",
+                         database="testdb", table="testtable", **kwargs)
+    
+    return build
+
+
+@pytest.fixture
+def mysql_sink(make_mysql_sink):
+    """MySQLSink on the mocked pool with the default batch and pool sizes"""
+    return make_mysql_sink()
+
+
+@pytest.fixture(autouse=True)
+def no_retry_backoff(monkeypatch):
+    """
+    Skip urllib3's retry backoff sleeps so retry tests cost no wall time.
+    
+    Returns the backoff (seconds) each skipped sleep would have waited.
+    Retry.sleep is patched rather than time.sleep, which other tests use
+    to wait for real servers.
+    """
+    backoffs = []
+    monkeypatch.setattr(Retry, "sleep", lambda self, response=None: backoffs.append(self.get_backoff_time()))
+    return backoffs
+
+
+@pytest.fixture
+def es_post(monkeypatch):
+    """Patch requests.Session.post; script responses through its side_effect"""
+    post = Mock()
+    monkeypatch.setattr("production_impl.requests.Session.post", post)
+    return post
+
+
 # =============================================================================
 # PYTEST-AGENTS FIXTURES
 # =============================================================================
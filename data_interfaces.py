@@ -15,6 +15,9 @@ logger = logging.getLogger(__name__)
 class DataSource(ABC):
     """Abstract base class for data sources"""
     
+    # Empty, so subclasses that declare __slots__ get no per-instance __dict__
+    __slots__ = ()
+    
     @abstractmethod
     def fetch_records(self, query_params: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, str]]:
         """
@@ -37,6 +40,9 @@ class DataSource(ABC):
 class DataSink(ABC):
     """Abstract base class for data sinks"""
     
+    # Empty, so subclasses that declare __slots__ get no per-instance __dict__
+    __slots__ = ()
+    
     @abstractmethod
     def insert_record(self, record_id: str, content: str) -> bool:
         """
@@ -0,0 +1,46 @@
+"""
+Test doubles for Elasticsearch source tests
+
+Kept out of test_impl.py, which the pipeline imports at runtime, so test-only
+helpers never ship with the runtime sources and sinks.
+
+Author: Kevin McAllorum (kevin_mcallorum@linux.com)
+GitHub: github.com/kmcallorum
+License: MIT
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+@dataclass(frozen=True)
+class FakeResponse:
+    """
+    Stand-in for a requests.Response in Elasticsearch source tests - just the
+    fields the source reads, so a typo'd attribute fails instead of mocking.
+    """
+    status_code: int
+    payload: Optional[Dict[str, Any]] = None
+    text: str = ""
+    
+    @property
+    def content(self) -> bytes:
+        return json.dumps(self.json()).encode()
+    
+    def json(self) -> Dict[str, Any]:
+        return self.payload if self.payload is not None else {}
+
+
+# Optional faster JSON parsing for request bodies (both accept bytes)
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover
+    json_loads = json.loads
+
+
+def sent_body(mock, index: int = -1) -> Dict[str, Any]:
+    """
+    Parse the JSON data= body of one call recorded on a mocked session
+    method - the last call by default, like mock.call_args.
+    """
+    return json_loads(mock.call_args_list[index].kwargs["data"])
@@ -8,7 +8,7 @@ Author: Mac McAllorum
 """
 import json
 import logging
-from typing import Generator, Tuple, Dict, Any
+from typing import Callable, Generator, Tuple, Dict, Any
 from data_interfaces import DataSource
 
 logger = logging.getLogger(__name__)
@@ -63,6 +63,10 @@ class JSONLSource(DataSource):
         if limit:
             logger.info(f"  Limit: {limit} records")
         
+        # Hoist per-record lookups out of the parse loop
+        loads = json.loads
+        extract = self._make_extractor()
+        
         try:
             with open(self.filepath, 'r') as f:
                 for line_num, line in enumerate(f, 1):
@@ -78,21 +82,9 @@ class JSONLSource(DataSource):
                     
                     try:
                         # Parse JSON
-                        record = json.loads(line)
-                        
-                        # Extract ID
-                        if self.id_field in record:
-                            record_id = str(record[self.id_field])
-                        else:
-                            # Generate ID from line number
-                            record_id = f"line_{line_num}"
+                        record = loads(line)
                         
-                        # Extract content
-                        if self.content_field and self.content_field in record:
-                            content = record[self.content_field]
-                        else:
-                            # Entire record is content
-                            content = record
+                        record_id, content = extract(record, line_num)
                         
                         self.records_read += 1
                         yield (record_id, content)
@@ -110,6 +102,29 @@ class JSONLSource(DataSource):
             logger.error(f"Error reading JSONL file: {e}")
             raise
     
+    def _make_extractor(self) -> Callable[[Dict[str, Any], int], Tuple[str, Any]]:
+        """
+        Build a (record, line_num) -> (record_id, content) function specialized
+        for the configured fields, so the per-record loop doesn't re-check
+        whether a content field is configured.
+        """
+        id_field = self.id_field
+        content_field = self.content_field
+        
+        if content_field:
+            def extract(record, line_num):
+                # Generate ID from line number when the record has none
+                record_id = str(record[id_field]) if id_field in record else f"line_{line_num}"
+                # Entire record is content when the content field is missing
+                content = record[content_field] if content_field in record else record
+                return record_id, content
+        else:
+            def extract(record, line_num):
+                record_id = str(record[id_field]) if id_field in record else f"line_{line_num}"
+                return record_id, record
+        
+        return extract
+    
     def close(self):
         """Close JSONL source"""
         logger.info(f"JSONLSource closed. Total records read: {self.records_read}")
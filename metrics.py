@@ -14,6 +14,7 @@ License: MIT
 from prometheus_client import Counter, Gauge, Histogram, Summary, Info
 import time
 from contextlib import contextmanager
+from functools import lru_cache
 from typing import Dict, Any
 import logging
 
@@ -113,6 +114,15 @@ insert_duration_seconds = Histogram(
     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
 )
 
+# Batch insert latency - one sample per insert_many() call, kept apart from
+# insert_duration_seconds so that one stays per record
+insert_batch_duration_seconds = Histogram(
+    'pipeline_insert_batch_duration_seconds',
+    'Time spent inserting one batch of records with insert_many()',
+    ['sink_type'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
 # Batch processing latency
 batch_duration_seconds = Histogram(
     'pipeline_batch_duration_seconds',
@@ -157,6 +167,23 @@ pipeline_info = Info(
 # HELPER FUNCTIONS
 # =============================================================================
 
+@lru_cache(maxsize=1024)
+def _labels_child(metric, label_items):
+    return metric.labels(**dict(label_items))
+
+
+def _labels_cached(metric, **labels):
+    """
+    Memoized metric.labels(**labels).
+    
+    labels() hashes the label values and takes the metric's lock on every
+    call; the child it returns never changes for a given label set, so
+    repeated lookups are served from a small cache instead. Code that calls
+    remove()/clear() on a metric must also clear _labels_child and bind_labels.
+    """
+    return _labels_child(metric, tuple(labels.items()))
+
+
 @contextmanager
 def time_operation(metric: Histogram, **labels):
     """
@@ -175,29 +202,72 @@ def time_operation(metric: Histogram, **labels):
         metric.labels(**labels).observe(duration)
 
 
+class BoundMetrics:
+    """
+    Metric children pre-bound to one (source_type, sink_type) pair.
+    
+    Looking the children up once keeps labels() - a hash plus a lock per
+    call - out of per-record code paths.
+    """
+    __slots__ = ('source_type', 'sink_type', 'processed', 'inserted', 'insert_duration',
+                 'insert_batch_duration')
+    
+    def __init__(self, source_type: str, sink_type: str):
+        self.source_type = source_type
+        self.sink_type = sink_type
+        self.processed = records_processed_total.labels(source_type=source_type, sink_type=sink_type)
+        self.inserted = records_inserted_total.labels(source_type=source_type, sink_type=sink_type)
+        self.insert_duration = insert_duration_seconds.labels(sink_type=sink_type)
+        self.insert_batch_duration = insert_batch_duration_seconds.labels(sink_type=sink_type)
+    
+    def skipped(self, reason: str = "duplicate"):
+        """Skipped-records child for a reason (reasons are open-ended, so looked up lazily)"""
+        return _labels_cached(records_skipped_total, source_type=self.source_type,
+                              sink_type=self.sink_type, reason=reason)
+    
+    def failed(self, error_type: str):
+        """Failed-records child for an error type"""
+        return _labels_cached(records_failed_total, source_type=self.source_type,
+                              sink_type=self.sink_type, error_type=error_type)
+    
+    def record_success(self):
+        self.processed.inc()
+        self.inserted.inc()
+    
+    def record_skip(self, reason: str = "duplicate"):
+        self.processed.inc()
+        self.skipped(reason).inc()
+    
+    def record_failure(self, error: Exception):
+        self.processed.inc()
+        self.failed(type(error).__name__).inc()
+
+
+@lru_cache(maxsize=256)
+def bind_labels(source_type: str, sink_type: str) -> BoundMetrics:
+    """Get the (cached) BoundMetrics for a source/sink pair"""
+    return BoundMetrics(source_type, sink_type)
+
+
 def record_success(source_type: str, sink_type: str):
     """Record a successful record insertion"""
-    records_processed_total.labels(source_type=source_type, sink_type=sink_type).inc()
-    records_inserted_total.labels(source_type=source_type, sink_type=sink_type).inc()
+    bind_labels(source_type, sink_type).record_success()
 
 
 def record_skip(source_type: str, sink_type: str, reason: str = "duplicate"):
     """Record a skipped record"""
-    records_processed_total.labels(source_type=source_type, sink_type=sink_type).inc()
-    records_skipped_total.labels(source_type=source_type, sink_type=sink_type, reason=reason).inc()
+    bind_labels(source_type, sink_type).record_skip(reason)
 
 
 def record_failure(source_type: str, sink_type: str, error: Exception):
     """Record a failed record"""
-    error_type = type(error).__name__
-    records_processed_total.labels(source_type=source_type, sink_type=sink_type).inc()
-    records_failed_total.labels(source_type=source_type, sink_type=sink_type, error_type=error_type).inc()
+    bind_labels(source_type, sink_type).record_failure(error)
 
 
 def record_ai_analysis(analyzer_type: str, success: bool):
     """Record an AI analysis request"""
     status = "success" if success else "failure"
-    ai_analysis_requests_total.labels(analyzer_type=analyzer_type, status=status).inc()
+    _labels_cached(ai_analysis_requests_total, analyzer_type=analyzer_type, status=status).inc()
 
 
 def set_pipeline_info(version: str = "1.0.0", **kwargs):
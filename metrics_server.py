@@ -11,17 +11,73 @@ GitHub: github.com/kmcallorum
 License: MIT
 """
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import threading
 import logging
 import json
+import time
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# /metrics output is reused for this many seconds, so bursts of scrapes
+# (several Prometheus replicas, dashboards) render the registry once
+METRICS_CACHE_TTL = 0.1
+
+# How often the serving thread checks for stop(); serve_forever()'s default
+# of 0.5s would make every stop() wait up to half a second
+SHUTDOWN_POLL_INTERVAL = 0.05
+
+# /health and /info never change, so their bodies are serialized once
+_HEALTH_BODY = json.dumps({
+    "status": "healthy",
+    "service": "es-mysql-pipeline-metrics",
+    "version": "1.0.0"
+}, indent=2).encode('utf-8')
+
+_INFO_BODY = json.dumps({
+    "service": "ES-MySQL Pipeline Metrics",
+    "version": "1.0.0",
+    "author": "Kevin McAllorum",
+    "endpoints": {
+        "/metrics": "Prometheus metrics (for scraping)",
+        "/health": "Health check endpoint",
+        "/info": "This page"
+    }
+}, indent=2).encode('utf-8')
+
+
+class _MetricsCache:
+    """generate_latest() output, regenerated at most once per ttl seconds"""
+    
+    def __init__(self, ttl: float = METRICS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()  # Handlers run in parallel threads
+        self._body: Optional[bytes] = None
+        self._rendered_at = 0.0
+    
+    def get(self) -> bytes:
+        """Return the cached exposition text, regenerating it if stale"""
+        with self._lock:
+            now = time.monotonic()
+            if self._body is None or now - self._rendered_at >= self.ttl:
+                self._body = generate_latest()
+                self._rendered_at = now
+            return self._body
+
 
 class MetricsHandler(BaseHTTPRequestHandler):
-    """HTTP request handler for metrics endpoints"""
+    """
+    HTTP request handler for metrics endpoints
+    
+    Speaks HTTP/1.1 so scrapers can keep one connection open across requests;
+    every response therefore carries a Content-Length.
+    """
+    
+    protocol_version = "HTTP/1.1"
+    
+    # Close idle keep-alive connections after this many seconds
+    timeout = 30
     
     def log_message(self, format, *args):
         """Override to use Python logging instead of stderr"""
@@ -41,67 +97,46 @@ class MetricsHandler(BaseHTTPRequestHandler):
     def _serve_metrics(self):
         """Serve Prometheus metrics"""
         try:
-            metrics = generate_latest()
-            self.send_response(200)
-            self.send_header('Content-Type', CONTENT_TYPE_LATEST)
-            self.end_headers()
-            self.wfile.write(metrics)
+            metrics = self.server.metrics_cache.get()
+            self._send(200, CONTENT_TYPE_LATEST, metrics)
         except Exception as e:
             logger.error(f"Error serving metrics: {e}")
             self._serve_error(500, str(e))
     
     def _serve_health(self):
         """Serve health check"""
-        health = {
-            "status": "healthy",
-            "service": "es-mysql-pipeline-metrics",
-            "version": "1.0.0"
-        }
-        self._serve_json(health)
+        self._send(200, 'application/json', _HEALTH_BODY)
     
     def _serve_info(self):
         """Serve info page"""
-        info = {
-            "service": "ES-MySQL Pipeline Metrics",
-            "version": "1.0.0",
-            "author": "Kevin McAllorum",
-            "endpoints": {
-                "/metrics": "Prometheus metrics (for scraping)",
-                "/health": "Health check endpoint",
-                "/info": "This page"
-            }
-        }
-        self._serve_json(info)
-    
-    def _serve_json(self, data: dict):
-        """Serve JSON response"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, indent=2).encode('utf-8'))
+        self._send(200, 'application/json', _INFO_BODY)
     
     def _serve_404(self):
         """Serve 404 Not Found"""
-        self.send_response(404)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
         error = {"error": "Not Found", "path": self.path}
-        self.wfile.write(json.dumps(error).encode('utf-8'))
+        self._send(404, 'application/json', json.dumps(error).encode('utf-8'))
     
     def _serve_error(self, code: int, message: str):
         """Serve error response"""
+        error = {"error": message, "code": code}
+        self._send(code, 'application/json', json.dumps(error).encode('utf-8'))
+    
+    def _send(self, code: int, content_type: str, body: bytes):
+        """Send a complete response with the Content-Length keep-alive needs"""
         self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        error = {"error": message, "code": code}
-        self.wfile.write(json.dumps(error).encode('utf-8'))
+        self.wfile.write(body)
 
 
 class MetricsServer:
     """
     HTTP server for Prometheus metrics.
     
-    Runs in a background thread, non-blocking.
+    Runs in a background thread, non-blocking. Each connection gets its own
+    (daemon) thread, so a client holding a keep-alive connection open
+    doesn't block other scrapers or shutdown.
     """
     
     def __init__(self, port: int = 8000, host: str = '0.0.0.0'):
@@ -109,14 +144,16 @@ class MetricsServer:
         Initialize metrics server.
         
         Args:
-            port: Port to listen on (default: 8000)
+            port: Port to listen on (default: 8000); 0 lets the OS pick a free
+                one, which port and get_url() report once started
             host: Host to bind to (default: 0.0.0.0 for all interfaces)
         """
         self.port = port
         self.host = host
-        self.server: Optional[HTTPServer] = None
+        self.server: Optional[ThreadingHTTPServer] = None
         self.thread: Optional[threading.Thread] = None
         self._running = False
+        self._ready = threading.Event()  # Set once the server thread is serving
     
     def start(self):
         """Start the metrics server in a background thread"""
@@ -125,7 +162,11 @@ class MetricsServer:
             return
         
         try:
-            self.server = HTTPServer((self.host, self.port), MetricsHandler)
+            self._ready.clear()
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            if not self.port:
+                self.port = self.server.server_address[1]
+            self.server.metrics_cache = _MetricsCache()
             self._running = True
             
             # Start server in daemon thread so it doesn't block shutdown
@@ -149,7 +190,8 @@ class MetricsServer:
         """Run the HTTP server (called in background thread)"""
         try:
             logger.debug("Metrics server thread started")
-            self.server.serve_forever()
+            self._ready.set()
+            self.server.serve_forever(poll_interval=SHUTDOWN_POLL_INTERVAL)
         except Exception as e:
             logger.error(f"Metrics server error: {e}")
         finally:
@@ -172,6 +214,18 @@ class MetricsServer:
         
         logger.info("Metrics server stopped")
     
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        """
+        Block until the server thread is serving requests.
+        
+        Args:
+            timeout: Maximum seconds to wait
+        
+        Returns:
+            True if the server is ready, False if the wait timed out
+        """
+        return self._ready.wait(timeout)
+    
     def is_running(self) -> bool:
         """Check if server is running"""
         return self._running
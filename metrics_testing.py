@@ -0,0 +1,33 @@
+"""
+Helpers for reading Prometheus metric values in tests
+
+Keeps every access to prometheus_client internals (_value, _metrics) in one
+place, so a change in the client library only needs fixing here.
+
+Author: Kevin McAllorum (kevin_mcallorum@linux.com)
+GitHub: github.com/kmcallorum
+License: MIT
+"""
+from typing import Dict, List, Tuple
+
+
+def counter_value(metric, **labels) -> float:
+    """
+    Current value of a counter or gauge.
+
+    Pass the labels to look the child up, or pass an already-bound child
+    (or an unlabelled metric) with no labels.
+    """
+    if labels:
+        metric = metric.labels(**labels)
+    return metric._value.get()
+
+
+def counter_values(metric) -> Dict[Tuple[str, ...], float]:
+    """Values of every child of a labelled counter or gauge, keyed by label values"""
+    return {key: child._value.get() for key, child in list(metric._metrics.items())}
+
+
+def label_values(metric) -> List[Tuple[str, ...]]:
+    """Label-value tuples of every child of a labelled metric (any type)"""
+    return list(metric._metrics)
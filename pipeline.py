@@ -26,6 +26,12 @@ except ImportError:
     METRICS_AVAILABLE = False
     logger.debug("Prometheus metrics not available (prometheus_client not installed)")
 
+# Records handed to sink.insert_many() per call in single-threaded mode
+SINK_BATCH_SIZE = 1024
+
+# Batches the single-threaded reader may get ahead of the sink
+PREFETCH_BATCHES = 4
+
 
 class DataPipeline:
     """
@@ -36,7 +42,9 @@ class DataPipeline:
     def __init__(self, source: DataSource, sink: DataSink, num_threads: int = 5,
                  error_analyzer: Optional[ErrorAnalyzer] = None,
                  enable_metrics: bool = True,
-                 pipeline_id: str = "default"):
+                 pipeline_id: str = "default",
+                 queue_size: int = 256,
+                 queue_batch_size: int = 64):
         """
         Args:
             source: DataSource implementation
@@ -45,6 +53,8 @@ class DataPipeline:
             error_analyzer: Optional ErrorAnalyzer for AI-powered troubleshooting
             enable_metrics: Enable Prometheus metrics collection (default: True)
             pipeline_id: Unique identifier for this pipeline instance (for metrics)
+            queue_size: Max number of batches buffered between reader and workers
+            queue_batch_size: Records per queue item in multi-threaded mode
         """
         self.source = source
         self.sink = sink
@@ -53,12 +63,20 @@ class DataPipeline:
         self.total_processed = 0
         self.enable_metrics = enable_metrics and METRICS_AVAILABLE
         self.pipeline_id = pipeline_id
+        self.queue_size = queue_size
+        self.queue_batch_size = max(1, queue_batch_size)
+        
+        # Sinks with insert_many() get whole batches instead of one record at a time
+        self.sink_batches = callable(getattr(type(sink), "insert_many", None))
         
         # Determine source and sink types for metrics labels
         self.source_type = type(source).__name__.replace('Source', '').lower()
         self.sink_type = type(sink).__name__.replace('Sink', '').lower()
         
+        # Per-record metric children, looked up once per pipeline
+        self._bound_metrics = None
         if self.enable_metrics:
+            self._bound_metrics = metrics.bind_labels(self.source_type, self.sink_type)
             logger.debug(f"Metrics enabled for pipeline: {self.pipeline_id}")
             # Set pipeline state to stopped initially
             metrics.pipeline_state.labels(pipeline_id=self.pipeline_id).set(0)
@@ -149,15 +167,16 @@ class DataPipeline:
     
     def _run_single_threaded(self, query_params: Optional[Dict[str, Any]]):
         """Single-threaded execution (safer for file-based sinks)"""
+        if self.sink_batches:
+            self._run_single_threaded_batched(query_params)
+            return
+        
         try:
             for record_id, content in self.source.fetch_records(query_params):
                 try:
                     # Time the insert operation
                     if self.enable_metrics:
-                        with metrics.time_operation(
-                            metrics.insert_duration_seconds,
-                            sink_type=self.sink_type
-                        ):
+                        with self._bound_metrics.insert_duration.time():
                             self.sink.insert_record(record_id, content)
                     else:
                         self.sink.insert_record(record_id, content)
@@ -166,10 +185,7 @@ class DataPipeline:
                     
                     # Track individual record metrics
                     if self.enable_metrics:
-                        metrics.records_processed_total.labels(
-                            source_type=self.source_type,
-                            sink_type=self.sink_type
-                        ).inc()
+                        self._bound_metrics.processed.inc()
                     
                     if self.total_processed % 100 == 0:
                         logger.info(f"Processed {self.total_processed} records")
@@ -189,9 +205,92 @@ class DataPipeline:
             })
             raise  # Re-raise source errors as they're fatal
     
+    def _run_single_threaded_batched(self, query_params: Optional[Dict[str, Any]]):
+        """
+        Single-threaded execution for sinks that implement insert_many()
+        
+        The source is read on a helper thread into a small bounded queue, so
+        fetching the next batch overlaps with the sink writing this one. The
+        sink itself is only ever called from this thread.
+        """
+        batches = Queue(maxsize=PREFETCH_BATCHES)
+        source_errors = []
+        
+        def read_source():
+            batch = []
+            try:
+                for record in self.source.fetch_records(query_params):
+                    batch.append(record)
+                    if len(batch) >= SINK_BATCH_SIZE:
+                        batches.put(batch)
+                        batch = []
+            except Exception as e:
+                source_errors.append(e)
+            # Keep whatever was read before the source failed
+            if batch:
+                batches.put(batch)
+            batches.put(None)
+        
+        reader = threading.Thread(target=read_source, name="Reader", daemon=True)
+        reader.start()
+        for batch in iter(batches.get, None):
+            self._insert_batch(batch)
+        reader.join()
+        
+        if source_errors:
+            self._handle_error(source_errors[0], {
+                "operation": "source_fetch",
+                "total_processed": self.total_processed
+            })
+            raise source_errors[0]  # Re-raise source errors as they're fatal
+    
+    def _insert_batch(self, batch: list):
+        """Hand one batch to sink.insert_many() and update progress"""
+        if self._sink_insert_many(batch) is None:
+            return
+        
+        before = self.total_processed
+        self.total_processed += len(batch)
+        
+        if self.total_processed // 100 > before // 100:
+            logger.info(f"Processed {self.total_processed} records")
+    
+    def _sink_insert_many(self, batch: list) -> Optional[int]:
+        """
+        Call sink.insert_many() with metrics and error handling
+        
+        Returns:
+            Number of records inserted, or None if the sink raised
+        """
+        start = time.time()
+        try:
+            inserted = self.sink.insert_many(batch)
+        except Exception as e:
+            self._handle_error(e, {
+                "operation": "sink_insert_many",
+                "batch_size": len(batch),
+                "total_processed": self.total_processed
+            })
+            return None
+        
+        if self.enable_metrics:
+            # One sample per batch; insert_duration_seconds stays per record
+            self._bound_metrics.insert_batch_duration.observe(time.time() - start)
+            self._bound_metrics.processed.inc(len(batch))
+        
+        return inserted
+    
     def _run_multi_threaded(self, query_params: Optional[Dict[str, Any]]):
-        """Multi-threaded execution (for thread-safe sinks like MySQL)"""
-        queue = Queue()
+        """
+        Multi-threaded execution (for thread-safe sinks like MySQL)
+
+        The source is read on the calling thread and handed to the workers in
+        batches of ``queue_batch_size`` records through a bounded queue, so the
+        reader never runs more than ``queue_size`` batches ahead of the sink and
+        queue locking is paid once per batch instead of once per record. Sinks
+        with insert_many() receive each queued batch in a single call.
+        """
+        queue = Queue(maxsize=self.queue_size)
         threads = []
         
         # Update active workers gauge
@@ -211,15 +310,20 @@ class DataPipeline:
         # Feed queue from source
         batch_start = time.time()
         batch_count = 0
+        pending = []
         
         for record_id, content in self.source.fetch_records(query_params):
-            queue.put((record_id, content))
+            pending.append((record_id, content))
             self.total_processed += 1
             batch_count += 1
             
-            # Update queue depth gauge
-            if self.enable_metrics:
-                metrics.queue_depth.labels(pipeline_id=self.pipeline_id).set(queue.qsize())
+            if len(pending) >= self.queue_batch_size:
+                queue.put(pending)
+                pending = []
+                
+                # Update queue depth gauge
+                if self.enable_metrics:
+                    metrics.queue_depth.labels(pipeline_id=self.pipeline_id).set(queue.qsize())
             
             if self.total_processed % 100 == 0:
                 logger.info(f"Queued {self.total_processed} records")
@@ -236,6 +340,9 @@ class DataPipeline:
                     batch_start = time.time()
                     batch_count = 0
         
+        if pending:
+            queue.put(pending)
+        
         # Wait for queue to empty and stop workers
         queue.join()
         for _ in threads:
@@ -249,43 +356,54 @@ class DataPipeline:
             metrics.queue_depth.labels(pipeline_id=self.pipeline_id).set(0)
     
     def _insert_worker(self, queue: Queue):
-        """Worker thread that processes items from queue"""
+        """Worker thread that processes batches of records from queue"""
         worker_stats = {"processed": 0, "inserted": 0, "skipped": 0}
         
         while True:
-            item = queue.get()
-            if item is None:  # Poison pill
+            batch = queue.get()
+            if batch is None:  # Poison pill
                 break
             
-            record_id, content = item
-            
-            # Time the insert operation
-            if self.enable_metrics:
-                with metrics.time_operation(
-                    metrics.insert_duration_seconds,
-                    sink_type=self.sink_type
-                ):
-                    inserted = self.sink.insert_record(record_id, content)
-            else:
-                inserted = self.sink.insert_record(record_id, content)
-            
-            worker_stats["processed"] += 1
-            if inserted:
-                worker_stats["inserted"] += 1
-            else:
-                worker_stats["skipped"] += 1
-            
-            # Track individual record metrics
-            if self.enable_metrics:
-                metrics.records_processed_total.labels(
-                    source_type=self.source_type,
-                    sink_type=self.sink_type
-                ).inc()
-            
-            if worker_stats["processed"] % 100 == 0:
-                logger.debug(f"{threading.current_thread().name} - {worker_stats}")
-            
-            queue.task_done()
+            try:
+                if self.sink_batches:
+                    # One insert_many() per queued batch, e.g. one multi-row INSERT for MySQL
+                    inserted = self._sink_insert_many(batch) or 0
+                    worker_stats["processed"] += len(batch)
+                    worker_stats["inserted"] += inserted
+                    worker_stats["skipped"] += len(batch) - inserted
+                    continue
+                
+                for record_id, content in batch:
+                    try:
+                        # Time the insert operation
+                        if self.enable_metrics:
+                            with self._bound_metrics.insert_duration.time():
+                                inserted = self.sink.insert_record(record_id, content)
+                        else:
+                            inserted = self.sink.insert_record(record_id, content)
+                    except Exception as e:
+                        # A dead worker would leave queue.join() waiting forever
+                        self._handle_error(e, {
+                            "operation": "sink_insert",
+                            "record_id": record_id,
+                            "total_processed": self.total_processed
+                        })
+                        continue
+                    
+                    worker_stats["processed"] += 1
+                    if inserted:
+                        worker_stats["inserted"] += 1
+                    else:
+                        worker_stats["skipped"] += 1
+                    
+                    # Track individual record metrics
+                    if self.enable_metrics:
+                        self._bound_metrics.processed.inc()
+                    
+                    if worker_stats["processed"] % 100 == 0:
+                        logger.debug(f"{threading.current_thread().name} - {worker_stats}")
+            finally:
+                queue.task_done()
         
         logger.info(f"{threading.current_thread().name} finished: {worker_stats}")
     
@@ -294,6 +412,14 @@ class DataPipeline:
         self.source.close()
         self.sink.close()
     
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - cleans up even if run() raised"""
+        self.cleanup()
+    
     def _handle_error(self, error: Exception, context: Dict[str, Any]):
         """
         Handle an error with optional AI analysis
@@ -307,12 +433,7 @@ class DataPipeline:
         
         # Track error metrics
         if self.enable_metrics:
-            error_type = type(error).__name__
-            metrics.records_failed_total.labels(
-                source_type=self.source_type,
-                sink_type=self.sink_type,
-                error_type=error_type
-            ).inc()
+            self._bound_metrics.failed(type(error).__name__).inc()
         
         # Get AI suggestions if analyzer is enabled
         if self.error_analyzer.is_enabled():
@@ -43,7 +43,9 @@ def create_source(args):
             batch_size=args.batch_size,
             es_user=args.es_user,
             es_pass=args.es_pass,
-            api_key=args.api_key
+            api_key=args.api_key,
+            slices=args.es_slices,
+            streaming=args.es_stream
         )
     elif args.source_type == "csv":
         return CSVSource(
@@ -69,7 +71,9 @@ def create_sink(args):
             user=args.db_user,
             password=args.db_pass,
             database=args.db_name,
-            table=args.db_table
+            table=args.db_table,
+            pool_size=args.threads,  # One pooled connection per worker thread
+            local_infile=args.db_load_data
         )
     elif args.sink_type == "file":
         return FileSink(filepath=args.output_file)
@@ -108,7 +112,8 @@ def build_query_params(args):
     return params if params else None
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
+    """Build the CLI argument parser"""
     parser = argparse.ArgumentParser(
         description="Data pipeline with pluggable source and sink implementations + Prometheus metrics"
     )
@@ -127,6 +132,10 @@ def main():
     parser.add_argument("--es_pass", help="Elasticsearch password")
     parser.add_argument("--api_key", help="Elasticsearch API Key")
     parser.add_argument("--batch_size", type=int, default=1000)
+    parser.add_argument("--es_slices", type=int, default=1,
+                       help="Fetch with this many parallel sliced scrolls (up to the index's shard count)")
+    parser.add_argument("--es_stream", action="store_true",
+                       help="Parse Elasticsearch responses hit by hit with ijson to bound memory on large batches")
     
     # CSV source args
     parser.add_argument("--csv_file", help="Path to CSV file")
@@ -139,6 +148,8 @@ def main():
     parser.add_argument("--db_pass", help="MySQL password")
     parser.add_argument("--db_name", help="MySQL database")
     parser.add_argument("--db_table", help="MySQL table")
+    parser.add_argument("--db_load_data", action="store_true",
+                       help="Load batches with LOAD DATA LOCAL INFILE (server needs local_infile=ON)")
     
     # File sink args
     parser.add_argument("--output_file", help="Output file path for file/jsonl sink")
@@ -171,8 +182,21 @@ def main():
     parser.add_argument('--jsonl_id_field', default='id')
     parser.add_argument('--jsonl_content_field', default='content')
     
-    args = parser.parse_args()
-    
+    return parser
+
+
+# Built once at import; parse_args() keeps no state between calls
+_PARSER = build_parser()
+
+
+def main(argv=None):
+    """Parse the command line (sys.argv by default) and run the pipeline"""
+    args = _PARSER.parse_args(argv)
+    run_with_args(args)
+
+
+def run_with_args(args):
+    """Run the pipeline for already-parsed CLI arguments"""
     # Check if metrics are requested but not available
     if args.metrics_port and not METRICS_AVAILABLE:
         logger.error("Metrics requested but prometheus_client not installed!")
@@ -9,26 +9,137 @@ import requests
 import json
 import mysql.connector
 import logging
-from typing import Iterator, Tuple, Dict, Any, Optional
+from itertools import chain, islice
+from operator import itemgetter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Iterable, Iterator, List, Tuple, Dict, Any, Optional
 from data_interfaces import DataSource, DataSink
 import threading
+import queue
+import os
+import shutil
+import tempfile
 import mysql.connector.pooling
+from array import array
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# How long Elasticsearch keeps a point-in-time alive between page requests
+PIT_KEEP_ALIVE = "1m"
+
+# (connect, read) timeouts in seconds for every Elasticsearch request
+ES_TIMEOUT = (3, 30)
+
+# Optional orjson support for encoding request bodies and decoding responses
+try:
+    import orjson
+    ORJSON_AVAILABLE = True  # pragma: no cover
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _encode_body(body: Any) -> bytes:
+    """Serialize an Elasticsearch request body to bytes, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(body)  # pragma: no cover
+    return json.dumps(body).encode()
+
+
+def _decode_body(content: bytes) -> Dict[str, Any]:
+    """Parse an Elasticsearch response body, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(content)  # pragma: no cover
+    return json.loads(content)
+
+
+# Optional ijson support for streaming hits out of large responses
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    IJSON_AVAILABLE = False
+
+
+_hit_id = itemgetter("_id")
+
+
+def _hit_json(hit: Dict[str, Any]) -> str:
+    """
+    Serialize a hit for storage, minus the sort values Elasticsearch adds
+    for paging - they belong to the request, not the document
+    """
+    hit.pop("sort", None)
+    return json.dumps(hit)
+
+
+def _hit_records(hits: list) -> Iterator[Tuple[str, str]]:
+    """(id, raw hit JSON) pairs for a page of hits, with the per-hit work done by map()"""
+    return zip(map(_hit_id, hits), map(_hit_json, hits))
+
+
+def _stream_hits(events, response) -> Iterator[Dict[str, Any]]:
+    """Build hits one at a time from ijson events positioned inside hits.hits"""
+    try:
+        builder = None
+        for prefix, event, value in events:
+            if prefix == "hits.hits" and event == "end_array":
+                break
+            if builder is None:
+                builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            if prefix == "hits.hits.item" and event == "end_map":
+                yield builder.value
+                builder = None
+        # Read the tail of the body so the connection goes back to the pool
+        for _ in events:
+            pass
+    finally:
+        response.close()
+
 
 class ElasticsearchSource(DataSource):
     """Production Elasticsearch data source"""
     
+    # Attributes live in fixed slots: cheaper lookups on the per-page paths,
+    # and a misspelt assignment raises instead of adding a new attribute
+    __slots__ = ("es_url", "batch_size", "es_user", "es_pass", "api_key", "use_pit",
+                 "streaming", "slices", "pit_id", "index_url", "base_url", "headers",
+                 "auth", "session", "scroll_ids")
+    
     def __init__(self, es_url: str, batch_size: int = 1000, 
                  es_user: Optional[str] = None, es_pass: Optional[str] = None,
-                 api_key: Optional[str] = None):
+                 api_key: Optional[str] = None, use_pit: bool = True,
+                 streaming: bool = False, slices: int = 1):
+        """
+        Args:
+            es_url: Search URL of the index, e.g. http://host:9200/index/_search
+            batch_size: Hits fetched per request
+            use_pit: Page with a point-in-time + search_after (falls back to
+                     scroll automatically on clusters older than 7.10)
+            streaming: Parse hits incrementally with ijson, so memory holds one
+                       hit rather than a whole batch (needs ijson installed)
+            slices: Split the scroll into this many sliced scrolls, fetched in
+                    parallel threads (scales up to the index's shard count)
+        """
         self.es_url = es_url
         self.batch_size = batch_size
         self.es_user = es_user
         self.es_pass = es_pass
         self.api_key = api_key
+        self.use_pit = use_pit
+        self.streaming = streaming
+        self.slices = max(1, slices)
+        if streaming and not IJSON_AVAILABLE:  # pragma: no cover
+            logger.warning("ijson not installed - parsing whole Elasticsearch responses instead of streaming")
+            self.streaming = False
+        self.pit_id = None
+        self.scroll_ids = set()  # Open scroll contexts, cleared when their fetch ends
+        
+        # http://host:9200/index/_search -> http://host:9200/index, http://host:9200
+        self.index_url = es_url.split('/_search')[0]
+        self.base_url = self.index_url.rsplit('/', 1)[0]
         
         # Setup auth
         self.headers = {"Content-Type": "application/json"}
@@ -39,159 +150,690 @@ class ElasticsearchSource(DataSource):
             self.auth = (es_user, es_pass)
         else:
             raise ValueError("Either api_key or both es_user and es_pass must be provided")
+        
+        # One session for the whole fetch keeps connections alive between batches
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.headers.update(self.headers)
+        # Search responses are large and compress well; requests inflates them transparently
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = HTTPAdapter(
+            pool_maxsize=max(16, 2 * self.slices),  # Room for every slice thread's connection
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=["POST", "DELETE"],  # Searches are read-only, safe to resend
+                raise_on_status=False  # Return the last response so status checks still see it
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
     def fetch_records(self, query_params: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, str]]:
-        """Fetch records from Elasticsearch using scroll API"""
+        """
+        Fetch records from Elasticsearch.
+        
+        Uses a point-in-time with search_after when the cluster supports it,
+        otherwise the scroll API. A terminate_after in query_params stops the
+        fetch once that many records have been yielded.
+        """
         query = self._build_query(query_params)
 
         # Create log file with current date
         date_str = datetime.now().strftime("%Y-%m-%d")
         log_filename = f"elasticSearchData-{date_str}.txt"
 
-        # Initial scroll request
+        if self.slices > 1:
+            records = self._fetch_sliced(query, log_filename)
+        elif self.use_pit and self._open_pit():
+            records = self._fetch_search_after(query, log_filename)
+        else:
+            records = self._fetch_scroll(query, log_filename)
+
+        limit = query_params.get("terminate_after") if query_params else None
+        if limit:
+            total_fetched = yield from self._take(records, limit)
+        else:
+            total_fetched = yield from records
+
+        logger.info(f"Elasticsearch fetch completed. Total records: {total_fetched}")
+        if self.slices > 1:
+            # Each slice wrote and completed its own -sliceN log
+            logger.info(f"Complete raw data saved to: {log_filename.replace('.txt', '-slice*.txt')}")
+        else:
+            self._finish_log(log_filename, total_fetched)
+            logger.info(f"Complete raw data saved to: {log_filename}")
+    
+    def fetch_records_sliced(self, query_params: Optional[Dict[str, Any]] = None) -> List[Iterator[Tuple[str, str]]]:
+        """
+        One record iterator per slice, each scrolling its own slice of the index.
+
+        The iterators are independent, so separate workers can consume them in
+        parallel. Each slice logs its raw responses to its own file.
+        """
+        query = self._build_query(query_params)
+        log_filename = f"elasticSearchData-{datetime.now().strftime('%Y-%m-%d')}.txt"
+        if self.slices == 1:
+            return [self._fetch_scroll(query, log_filename)]
+        return [self._fetch_scroll(query, log_filename.replace(".txt", f"-slice{i}.txt"), slice_id=i)
+                for i in range(self.slices)]
+
+    @staticmethod
+    def _take(records: Iterator[Tuple[str, str]], limit: int):
+        """Yield the first limit records, then close the fetch early; returns the count"""
+        count = 0
+        try:
+            for record in records:
+                yield record
+                count += 1
+                if count >= limit:
+                    break
+        finally:
+            records.close()  # Releases the PIT or scroll context
+        return count
+
+    def _fetch_sliced(self, query: Dict[str, Any], log_filename: str):
+        """Scroll every slice in its own thread and merge their pages; returns the hit count"""
+        pages = queue.Queue(maxsize=2 * self.slices)  # Bounded - slices wait for the consumer
+        stop = threading.Event()
+
+        def offer(item) -> bool:
+            """Queue an item unless the consumer has gone away"""
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scroll_slice(slice_id: int):
+            slice_log = log_filename.replace(".txt", f"-slice{slice_id}.txt")
+            records = self._fetch_scroll(query, slice_log, slice_id=slice_id)
+            fetched = 0
+            try:
+                for page in iter(lambda: list(islice(records, self.batch_size)), []):
+                    if not offer(page):
+                        return
+                    fetched += len(page)
+                self._finish_log(slice_log, fetched)
+            except Exception as e:
+                offer(e)
+            finally:
+                offer(None)  # This slice is done
+
+        threads = [threading.Thread(target=scroll_slice, args=(i,), name=f"es-slice-{i}", daemon=True)
+                   for i in range(self.slices)]
+        for thread in threads:
+            thread.start()
+
+        total_fetched = 0
+        running = len(threads)
+        try:
+            while running:
+                page = pages.get()
+                if page is None:
+                    running -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    total_fetched += len(page)
+                    yield from page
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        return total_fetched
+
+    def _fetch_search_after(self, query: Dict[str, Any], log_filename: str):
+        """
+        Page through the open point-in-time with search_after; returns the hit count.
+
+        Falls back to scroll if the cluster rejects the first search.
+        """
+        # Only the PIT id and search_after change between pages, so the query
+        # is serialized once and each body is that prefix (minus its closing
+        # brace) plus the two page-specific keys. The export never reads
+        # hits.total, so shards needn't count every match - scroll rejects
+        # track_total_hits: false, so only this path sends it
+        static_body = _encode_body({"size": self.batch_size, **query, "track_total_hits": False,
+                                    "sort": [{"_shard_doc": "asc"}]})[:-1]
+        search_after = b""
+        logger.info(f"Starting Elasticsearch point-in-time search from {self.es_url}")
+        logger.info(f"Raw ElasticSearch data will be logged to: {log_filename}")
+
+        total_fetched = 0
+        batch_num = 0
+        try:
+            while True:
+                # PIT searches go to /_search without an index - the PIT has it
+                pit = _encode_body({"id": self.pit_id, "keep_alive": PIT_KEEP_ALIVE})
+                response = self.session.post(
+                    f"{self.base_url}/_search",
+                    data=b"".join((static_body, b',"pit":', pit, search_after, b"}")),
+                    timeout=ES_TIMEOUT,
+                    stream=self.streaming
+                )
+
+                if response.status_code == 400 and batch_num == 0:
+                    # 7.10 and 7.11 open a PIT but can't sort on _shard_doc (7.12+)
+                    logger.warning(f"Point-in-time search rejected ({response.status_code}), using scroll API")
+                    self._close_pit()
+                    return (yield from self._fetch_scroll(query, log_filename))
+
+                if response.status_code != 200:
+                    if batch_num == 0:
+                        raise Exception(f"Initial search failed: {response.status_code}, {response.text}")
+                    logger.error(f"Search request failed: {response.status_code}, {response.text}")
+                    break
+
+                data, hits = self._read_page(response)
+
+                # The PIT id may change between requests - always send the latest
+                self.pit_id = data.get("pit_id", self.pit_id)
+
+                if batch_num == 0:
+                    self._start_log(log_filename, query, "INITIAL SEARCH RESPONSE", data)
+                elif hits:  # Always true for a streamed page - its size isn't known yet
+                    self._append_log(log_filename, f"SEARCH_AFTER BATCH {batch_num}", data)
+                batch_num += 1
+
+                fetched, last_sort = yield from self._page_records(hits)
+
+                total_fetched += fetched
+                if fetched:
+                    logger.info(f"Fetched {fetched} records. Total so far: {total_fetched}")
+
+                # A short page is the last one - no need to ask for an empty page
+                if fetched < self.batch_size:
+                    break
+                search_after = b',"search_after":' + _encode_body(last_sort)
+        finally:
+            self._close_pit()
+
+        return total_fetched
+    
+    def _fetch_scroll(self, query: Dict[str, Any], log_filename: str, slice_id: Optional[int] = None):
+        """Page through the results (or one slice of them) with the scroll API; returns the hit count"""
+        # Initial scroll request - _doc order is the cheapest for a full scan
         params = {"scroll": "10m", "size": self.batch_size}
+        body = {**query, "sort": ["_doc"]}
+        if slice_id is not None:
+            body["slice"] = {"id": slice_id, "max": self.slices}
         logger.info(f"Starting Elasticsearch scroll from {self.es_url}")
         logger.info(f"Raw ElasticSearch data will be logged to: {log_filename}")
 
-        response = requests.post(
+        response = self.session.post(
             self.es_url,
-            auth=self.auth,
-            headers=self.headers,
             params=params,
-            data=json.dumps(query)
+            data=_encode_body(body),
+            timeout=ES_TIMEOUT,
+            stream=self.streaming
         )
 
         if response.status_code != 200:
             raise Exception(f"Initial scroll failed: {response.status_code}, {response.text}")
 
-        data = response.json()
+        data, hits = self._read_page(response)
 
         # Write initial response to log file
-        with open(log_filename, 'w') as log_file:
-            log_file.write("=== ELASTICSEARCH DATA DUMP ===\n")
-            log_file.write(f"Timestamp: {datetime.now().isoformat()}\n")
-            log_file.write(f"URL: {self.es_url}\n")
-            log_file.write(f"Query: {json.dumps(query, indent=2)}\n")
-            log_file.write("=" * 50 + "\n\n")
-            log_file.write("=== INITIAL SCROLL RESPONSE ===\n")
-            log_file.write(json.dumps(data, indent=2))
-            log_file.write("\n\n")
+        self._start_log(log_filename, query, "INITIAL SCROLL RESPONSE", data)
 
         scroll_id = data.get("_scroll_id")
-        hits = data.get("hits", {}).get("hits", [])
+        self.scroll_ids.add(scroll_id)
         total_fetched = 0
+
+        # The scroll id rarely changes between batches, so only re-encode when it does
+        scroll_body_id = scroll_id
+        scroll_body = _encode_body({"scroll": "10m", "scroll_id": scroll_id})
         
         # Process hits
         batch_num = 1
-        while hits:
-            for hit in hits:
-                record_id = hit["_id"]
-                content = json.dumps(hit)
-                yield (record_id, content)
-
-            total_fetched += len(hits)
-            logger.info(f"Fetched {len(hits)} records. Total so far: {total_fetched}")
-
-            # Get next batch
-            base_url = self.es_url.split('/_search')[0].rsplit('/', 1)[0]
-            response = requests.post(
-                f"{base_url}/_search/scroll",
-                auth=self.auth,
-                headers=self.headers,
-                data=json.dumps({"scroll": "10m", "scroll_id": scroll_id})
-            )
+        try:
+            while True:
+                fetched, _ = yield from self._page_records(hits)
+                total_fetched += fetched
+                if fetched:
+                    logger.info(f"Fetched {fetched} records. Total so far: {total_fetched}")
 
-            if response.status_code != 200:
-                logger.error(f"Scroll request failed: {response.status_code}, {response.text}")
-                break
+                # A short page is the last one - no need to ask for an empty page
+                if fetched < self.batch_size:
+                    break
 
-            data = response.json()
+                # Get next batch
+                if scroll_id != scroll_body_id:
+                    scroll_body_id = scroll_id
+                    scroll_body = _encode_body({"scroll": "10m", "scroll_id": scroll_id})
+                response = self.session.post(
+                    f"{self.base_url}/_search/scroll",
+                    data=scroll_body,
+                    timeout=ES_TIMEOUT,
+                    stream=self.streaming
+                )
 
-            # Append scroll response to log file
-            if data.get("hits", {}).get("hits", []):
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"=== SCROLL BATCH {batch_num} ===\n")
-                    log_file.write(json.dumps(data, indent=2))
-                    log_file.write("\n\n")
-                batch_num += 1
+                if response.status_code != 200:
+                    logger.error(f"Scroll request failed: {response.status_code}, {response.text}")
+                    break
+
+                data, hits = self._read_page(response)
+
+                # Append scroll response to log file (always, for a streamed page)
+                if hits:
+                    self._append_log(log_filename, f"SCROLL BATCH {batch_num}", data)
+                    batch_num += 1
+
+                next_id = data.get("_scroll_id")
+                if next_id != scroll_id:
+                    self.scroll_ids.discard(scroll_id)
+                    self.scroll_ids.add(next_id)
+                    scroll_id = next_id
+        finally:
+            # Scroll contexts pin segments until they time out - free it now
+            self._clear_scroll(scroll_id)
+
+        return total_fetched
+    
+    def _read_page(self, response) -> Tuple[Dict[str, Any], Iterable[Dict[str, Any]]]:
+        """
+        Split a search response into (the response without its hits, the hits).
+        
+        Buffered, the hits are a list. Streaming, they are a generator that
+        builds one hit at a time, and the dict holds what Elasticsearch writes
+        before hits.hits - ids, took, _shards and hits.total.
+        """
+        if not self.streaming:
+            data = _decode_body(response.content)
+            return data, data.get("hits", {}).get("hits", [])
+
+        response.raw.decode_content = True  # Let urllib3 inflate gzip as ijson reads
+        events = ijson.parse(response.raw, use_float=True)
+        builder = ijson.ObjectBuilder()
+        for prefix, event, value in events:
+            if prefix == "hits.hits" and event == "start_array":
+                return builder.value, _stream_hits(events, response)
+            builder.event(event, value)
+        response.close()
+        return builder.value, []
+    
+    def _page_records(self, hits: Iterable[Dict[str, Any]]):
+        """Yield (id, raw hit JSON) for a page of hits; returns (record count, last hit's sort values)"""
+        if isinstance(hits, list):
+            last_sort = hits[-1].get("sort") if hits else None
+            yield from _hit_records(hits)
+            return len(hits), last_sort
+
+        count, last_sort = 0, None
+        for hit in hits:
+            count += 1
+            last_sort = hit.get("sort")
+            yield (hit["_id"], _hit_json(hit))
+        return count, last_sort
+    
+    def _open_pit(self) -> bool:
+        """Open a point-in-time on the index; False if the cluster has no PIT (pre-7.10)"""
+        response = self.session.post(
+            f"{self.index_url}/_pit",
+            params={"keep_alive": PIT_KEEP_ALIVE},
+            timeout=ES_TIMEOUT
+        )
+
+        if response.status_code != 200:
+            logger.warning(f"Point-in-time not available ({response.status_code}), using scroll API")
+            return False
 
-            scroll_id = data.get("_scroll_id")
-            hits = data.get("hits", {}).get("hits", [])
+        self.pit_id = _decode_body(response.content)["id"]
+        return True
+    
+    def _close_pit(self):
+        """Release the point-in-time, if one is open"""
+        if self.pit_id is None:
+            return
 
-        # Write completion message
+        try:
+            self.session.delete(
+                f"{self.base_url}/_pit",
+                data=json.dumps({"id": self.pit_id}),
+                timeout=ES_TIMEOUT
+            )
+        except requests.RequestException as e:
+            # It expires on its own after keep_alive - not worth failing the run
+            logger.warning(f"Could not close point-in-time: {e}")
+        self.pit_id = None
+    
+    def _clear_scroll(self, scroll_id: Optional[str]):
+        """Release a scroll context, unless it was never opened or is already released"""
+        if scroll_id not in self.scroll_ids:
+            return
+        self.scroll_ids.discard(scroll_id)
+        if scroll_id is None:
+            return
+
+        try:
+            self.session.delete(
+                f"{self.base_url}/_search/scroll",
+                data=_encode_body({"scroll_id": [scroll_id]}),
+                timeout=ES_TIMEOUT
+            )
+        except requests.RequestException as e:
+            # It expires on its own after the scroll timeout
+            logger.warning(f"Could not clear scroll: {e}")
+    
+    def _start_log(self, log_filename: str, query: Dict[str, Any], title: str, data: Dict[str, Any]):
+        """Start the raw data log with a header and the first response"""
+        with open(log_filename, 'w') as log_file:
+            log_file.write("=== ELASTICSEARCH DATA DUMP ===\n")
+            log_file.write(f"Timestamp: {datetime.now().isoformat()}\n")
+            log_file.write(f"URL: {self.es_url}\n")
+            log_file.write(f"Query: {json.dumps(query, indent=2)}\n")
+            log_file.write("=" * 50 + "\n\n")
+            log_file.write(f"=== {title} ===\n")
+            log_file.write(json.dumps(data, indent=2))
+            log_file.write("\n\n")
+    
+    def _finish_log(self, log_filename: str, total_fetched: int):
+        """Close off a raw data log with the fetch's record count"""
         with open(log_filename, 'a') as log_file:
             log_file.write("=== FETCH COMPLETED ===\n")
             log_file.write(f"Total records fetched: {total_fetched}\n")
             log_file.write(f"Completion time: {datetime.now().isoformat()}\n")
-
-        logger.info(f"Elasticsearch fetch completed. Total records: {total_fetched}")
-        logger.info(f"Complete raw data saved to: {log_filename}")
+    
+    def _append_log(self, log_filename: str, title: str, data: Dict[str, Any]):
+        """Append one later response to the raw data log"""
+        with open(log_filename, 'a') as log_file:
+            log_file.write(f"=== {title} ===\n")
+            log_file.write(json.dumps(data, indent=2))
+            log_file.write("\n\n")
     
     def _build_query(self, query_params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
-        """Build Elasticsearch query from parameters"""
+        """
+        Build the Elasticsearch search body from parameters.
+
+        terminate_after is not copied into the body: Elasticsearch applies it
+        per shard and per request, so on a paged fetch it would cut the first
+        page short and end the export there. fetch_records enforces it as a
+        total record limit instead.
+        """
         if not query_params or query_params.get("match_all"):
-            return {"query": {"match_all": {}}}
-        
-        gte = query_params.get("gte")
-        lte = query_params.get("lte")
-        
-        if not gte or not lte:
-            raise ValueError("gte and lte required unless match_all is True")
-        
-        return {
-            "query": {
-                "range": {
-                    "@timestamp": {
-                        "gte": gte,
-                        "lte": lte,
-                        "format": "strict_date_optional_time"
+            query = {"match_all": {}}
+        else:
+            gte = query_params.get("gte")
+            lte = query_params.get("lte")
+            
+            if not gte or not lte:
+                raise ValueError("gte and lte required unless match_all is True")
+            
+            # Filter context: a full scan needs no relevance scores, and ES can cache the filter
+            query = {
+                "constant_score": {
+                    "filter": {
+                        "range": {
+                            "@timestamp": {
+                                "gte": gte,
+                                "lte": lte,
+                                "format": "strict_date_optional_time"
+                            }
+                        }
                     }
                 }
             }
-        }
+        
+        return {"query": query}
     
     def close(self):
-        """No cleanup needed for ES source"""
+        """Release the point-in-time or scrolls of a fetch abandoned mid-way, then the session"""
+        self._close_pit()
+        for scroll_id in list(self.scroll_ids):
+            self._clear_scroll(scroll_id)
+        self.session.close()
+
+
+
+
+
+
+
+# LOAD DATA's default ESCAPED BY '\\' sequences for the characters that would
+# otherwise end a field or line
+_INFILE_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+# A prepared statement takes at most 65535 placeholders
+MAX_PREPARED_PARAMS = 65535
 
+# MySQLSink._counts slots, in order
+_STAT_NAMES = ("inserted", "skipped", "errors")
 
 
+class _PooledInsert:
+    """A pooled connection, its prepared insert cursors and its uncommitted rows"""
 
+    __slots__ = ("conn", "prepared", "batch", "pending", "unsaved", "batches")
 
+    def __init__(self, conn):
+        self.conn = conn
+        self.prepared = conn.cursor(prepared=True)
+        self.batch = None  # Prepared full-batch INSERT, opened on first use
+        self.pending = 0  # Rows written since the last commit
+        self.unsaved = 0  # Of those, rows counted as inserted
+        self.batches = 0  # Multi-row batches among them
+
+    def close_cursors(self):
+        """Close the prepared cursors, deallocating their statements"""
+        self.prepared.close()
+        if self.batch is not None:
+            self.batch.close()
 
 
 class MySQLSink(DataSink):
     """Production MySQL data sink with TRUE thread-safety"""
 
-    def __init__(self, host: str, user: str, password: str, database: str, table: str):
+    # Fixed attribute slots, as on ElasticsearchSource
+    __slots__ = ("host", "user", "password", "database", "table", "batch_size",
+                 "commit_every", "infile_dir", "pool_size", "pool", "_counts", "stats_lock",
+                 "insert_sql", "load_sql", "_idle", "buffer_rows", "_buffer", "_buffer_lock",
+                 "max_statement_bytes", "_values_sql", "commit_every_batches",
+                 "bulk_threshold", "upsert")
+
+    def __init__(self, host: str, user: str, password: str, database: str, table: str,
+                 batch_size: int = 1000, pool_size: int = 10, commit_every: int = 1000,
+                 commit_every_batches: int = 10,
+                 local_infile: bool = False, buffer_rows: int = 0,
+                 max_statement_bytes: int = 8 * 1024 * 1024, bulk_threshold: int = 0,
+                 upsert: bool = False):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
         self.table = table
+        self.batch_size = batch_size  # Rows per multi-row INSERT in insert_many()
+        # ...and roughly the most data per INSERT - keep it under the server's max_allowed_packet
+        self.max_statement_bytes = max_statement_bytes
+        # Rows per transaction on each connection - every commit is a log flush
+        self.commit_every = max(1, commit_every)
+        # ...or every commit_every_batches insert_many() batches, whatever their size
+        self.commit_every_batches = max(1, commit_every_batches)
+
+        # buffer_rows > 0 makes insert_record() queue rows and write them with
+        # insert_many() once that many are buffered (or on flush/commit/close).
+        # Off by default: DataPipeline already batches through insert_many()
+        self.buffer_rows = max(0, buffer_rows)
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
 
-        # CREATE CONNECTION POOL (thread-safe!)
+        # local_infile=True loads insert_many() batches with LOAD DATA LOCAL
+        # INFILE (the server needs local_infile=ON). Only files in a private
+        # directory may be sent, so the server can't ask for any other file
+        self.infile_dir = tempfile.mkdtemp(prefix="mysqlsink-") if local_infile else None
+        infile_options = {"allow_local_infile_in_path": self.infile_dir} if local_infile else {}
+        # ...for insert_many() batches of at least bulk_threshold rows; smaller
+        # ones, where the file round-trip costs more than it saves, still INSERT
+        self.bulk_threshold = max(0, bulk_threshold)
+
+        # CREATE CONNECTION POOL (thread-safe!) - one connection per worker
+        # thread lets inserts commit in parallel instead of waiting on a
+        # shared connection. mysql-connector caps a pool at CNX_POOL_MAXSIZE;
+        # past that, workers take turns (see _checkout)
+        if pool_size > mysql.connector.pooling.CNX_POOL_MAXSIZE:
+            logger.warning(f"pool_size {pool_size} exceeds mysql-connector's maximum - "
+                           f"using {mysql.connector.pooling.CNX_POOL_MAXSIZE}")
+            pool_size = mysql.connector.pooling.CNX_POOL_MAXSIZE
+        self.pool_size = pool_size
         self.pool = mysql.connector.pooling.MySQLConnectionPool(
             pool_name="pipeline_pool",
-            pool_size=10,  # Adjust based on num_threads
+            pool_size=pool_size,
             host=host,
             user=user,
             password=password,
-            database=database
+            database=database,
+            autocommit=False,
+            **infile_options
         )
 
-        # Thread-safe stats with lock
-        self.stats = {"inserted": 0, "skipped": 0, "errors": 0}
+        # Thread-safe stats with lock, updated once per record or batch via _count().
+        # Plain machine-word slots indexed by _STAT_NAMES position - no per-row
+        # dict hashing; get_stats() builds the dict on demand
+        self._counts = array("q", [0] * len(_STAT_NAMES))
         self.stats_lock = threading.Lock()
 
-        # Prepare insert statement
-        self.insert_sql = f"INSERT IGNORE INTO {table} (id, content) VALUES (%s, %s)"
-        logger.info(f"MySQLSink initialized with connection pool (size: 10)")  # ← NEW MESSAGE
+        # Prepare insert statement. Existing ids are kept (INSERT IGNORE), or
+        # with upsert=True their content is replaced by the new record's and
+        # batch stats count every written row as inserted
+        self.upsert = upsert
+        self._values_sql = {}  # Multi-row INSERTs by row count, see _insert_values_sql()
+        self.insert_sql = self._insert_values_sql(1)
+        self.load_sql = (f"LOAD DATA LOCAL INFILE %s {'REPLACE' if upsert else 'IGNORE'} "
+                         f"INTO TABLE {table} CHARACTER SET utf8mb4 (id, content)")
+
+        # Idle _PooledInserts. One is checked out by one thread at a time and
+        # kept across inserts, so MySQL parses insert_sql once per connection
+        # instead of once per record
+        self._idle = queue.SimpleQueue()
+        logger.info(f"MySQLSink initialized with connection pool (size: {pool_size})")
+
+    def _count(self, inserted: int = 0, skipped: int = 0, errors: int = 0):
+        """Add deltas to the stats in one locked update"""
+        counts = self._counts
+        with self.stats_lock:
+            counts[0] += inserted
+            counts[1] += skipped
+            counts[2] += errors
+
+    def _checkout(self) -> _PooledInsert:
+        """Take an idle connection, or open one from the pool, or wait for one"""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                return _PooledInsert(self.pool.get_connection())
+            except mysql.connector.errors.PoolError:
+                # Every pooled connection is checked out - more threads than
+                # connections. Wait for one to come back idle or to the pool
+                try:
+                    return self._idle.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+
+    def _drain_idle(self) -> list:
+        """Take every idle connection"""
+        slots = []
+        while True:
+            try:
+                slots.append(self._idle.get_nowait())
+            except queue.Empty:
+                return slots
+
+    def _commit(self, slot: _PooledInsert) -> bool:
+        """Commit a connection's pending rows; if that fails they count as errors"""
+        if not slot.pending:
+            return True
+        try:
+            slot.conn.commit()
+            return True
+        except Exception as e:
+            self._count(inserted=-slot.unsaved, errors=slot.unsaved)
+            logger.error(f"Error committing {slot.pending} records: {e}")
+            return False
+        finally:
+            slot.pending = slot.unsaved = slot.batches = 0
+
+    def _release(self, slot: _PooledInsert):
+        """Commit what's pending, close the prepared cursor and hand the connection back to the pool"""
+        try:
+            self._commit(slot)
+            slot.close_cursors()
+        finally:
+            slot.conn.close()  # Returns to pool, which resets the session
+
+    def _discard(self, slot: _PooledInsert, cursor=None):
+        """
+        Roll back and release a connection (and close a one-off cursor on it)
+        after a failed write.
+
+        MySQL may already have rolled back the whole transaction (deadlock,
+        lock wait timeout), so the connection's uncommitted rows are never
+        committed here - they move from inserted to errors. The connection
+        may be broken, so a failing rollback or close is logged, not raised.
+        """
+        if slot.unsaved:
+            self._count(inserted=-slot.unsaved, errors=slot.unsaved)
+            logger.error(f"Rolled back {slot.unsaved} uncommitted records after a failed write")
+        slot.pending = slot.unsaved = slot.batches = 0
+        try:
+            try:
+                if cursor is not None:
+                    cursor.close()
+                slot.conn.rollback()
+                slot.close_cursors()
+            finally:
+                slot.conn.close()  # Returns to pool, which resets the session
+        except Exception as e:
+            logger.error(f"Error releasing connection after a failed write: {e}")
+
+    def _written(self, slot: _PooledInsert, rows: int, inserted: int, batch: bool = False,
+                 commit: bool = False) -> bool:
+        """
+        Count rows written on a connection. Single records commit every
+        commit_every rows, batches every commit_every_batches batches, and
+        commit=True commits right away
+        """
+        self._count(inserted=inserted, skipped=rows - inserted)
+
+        slot.pending += rows
+        slot.unsaved += inserted
+        if batch:
+            slot.batches += 1
+            due = slot.batches >= self.commit_every_batches
+        else:
+            due = slot.pending >= self.commit_every
+        committed = not (due or commit) or self._commit(slot)
+        self._idle.put(slot)
+        return committed
 
     def insert_record(self, record_id: str, content: Any) -> bool:
-        """Thread-safe insert using pooled connection"""
-        # Get connection from pool (different for each thread)
-        conn = self.pool.get_connection()
-        cursor = conn.cursor()
+        """
+        Thread-safe insert using a pooled connection's prepared statement.
+
+        content may be a dict, a JSON str, or JSON already encoded as UTF-8
+        bytes - bytes are sent to MySQL as-is, without a decode/re-encode.
+
+        With buffer_rows set the record is only queued and True is returned;
+        duplicates and errors show up in get_stats() once the buffer is written.
+        """
+        if self.buffer_rows:
+            return self._buffer_record(record_id, content)
+        return self._insert_one(record_id, content)
+
+    def _insert_one(self, record_id: str, content: Any, commit: bool = False) -> bool:
+        """
+        Write one record with the prepared single-row INSERT and update stats;
+        commit=True commits it at once instead of every commit_every rows
+        """
+        slot = self._checkout()
+        cursor = slot.prepared  # Already bound to insert_sql's parameter layout
 
         try:
             # Convert dict to JSON string if needed
@@ -199,36 +841,211 @@ class MySQLSink(DataSink):
                 content = json.dumps(content)
 
             cursor.execute(self.insert_sql, (record_id, content))
-            conn.commit()
-
-            # Update stats with lock (thread-safe)
-            with self.stats_lock:
-                if cursor.rowcount > 0:
-                    self.stats["inserted"] += 1
-                    return True
-                else:
-                    self.stats["skipped"] += 1
-                    return False
+            inserted = cursor.rowcount > 0
 
         except Exception as e:
-            with self.stats_lock:
-                self.stats["errors"] += 1
+            self._discard(slot)  # Not reused - the connection may be broken
+            self._count(errors=1)
             logger.error(f"Error inserting {record_id}: {e}")
             return False
 
-        finally:
+        return self._written(slot, 1, int(inserted), commit=commit) and inserted
+
+    def _buffer_record(self, record_id: str, content: Any) -> bool:
+        """Queue one record, writing the buffer once it holds buffer_rows"""
+        with self._buffer_lock:
+            self._buffer.append((record_id, content))
+            if len(self._buffer) < self.buffer_rows:
+                return True
+            rows, self._buffer = self._buffer, []
+        self.insert_many(rows)
+        return True
+
+    def flush(self) -> int:
+        """
+        Write the rows buffered by insert_record().
+
+        Returns:
+            int: Number of records inserted
+        """
+        with self._buffer_lock:
+            rows, self._buffer = self._buffer, []
+        return self.insert_many(rows) if rows else 0
+
+    def insert_many(self, records: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Insert records with one multi-row INSERT per batch_size rows.
+
+        Each chunk is a single INSERT IGNORE ... VALUES (...), (...) statement:
+        one round-trip and one parse instead of one per record. Chunks are
+        also cut at max_statement_bytes. A chunk whose statement fails is
+        retried record by record, so the same rows count as errors as with
+        insert_record. Records repeating an id earlier in the call are merged
+        client-side and counted as skipped without reaching MySQL - the first
+        record is kept, or the last one with upsert=True.
+
+        With local_infile=True a call with at least bulk_threshold records
+        is a single bulk_load() instead.
+
+        Returns:
+            int: Number of records inserted
+        """
+        if self.infile_dir and not self.bulk_threshold:
+            return self.bulk_load(records)
+
+        unique = {}
+        total = 0
+        for record_id, content in records:
+            total += 1
+            if not self.upsert and record_id in unique:
+                continue  # INSERT IGNORE would drop it too
+            unique[record_id] = json.dumps(content) if isinstance(content, dict) else content
+        rows = list(unique.items())
+        if total > len(rows):
+            self._count(skipped=total - len(rows))
+
+        if self.infile_dir and len(rows) >= self.bulk_threshold:
+            return self.bulk_load(rows)
+
+        inserted = 0
+        for chunk in self._chunks(rows):
+            inserted += self._insert_chunk(chunk)
+        return inserted
+
+    def _chunks(self, rows: list) -> Iterator[list]:
+        """Split rows into chunks of at most batch_size rows and (about) max_statement_bytes"""
+        chunk, size = [], 0
+        for record_id, content in rows:
+            # content is usually str or bytes, but may be anything the driver
+            # converts (None is NULL) - estimate those from their str() form
+            content_size = len(content) if isinstance(content, (str, bytes)) else len(str(content))
+            row_size = len(record_id) + content_size + 8  # Quotes, comma and parentheses
+            if chunk and (len(chunk) >= self.batch_size or size + row_size > self.max_statement_bytes):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append((record_id, content))
+            size += row_size
+        if chunk:
+            yield chunk
+
+    def _insert_values_sql(self, rows: int) -> str:
+        """INSERT IGNORE (or upsert) with rows VALUES tuples, built once per row count"""
+        sql = self._values_sql.get(rows)
+        if sql is None:
+            if self.upsert:
+                sql = (f"INSERT INTO {self.table} (id, content) VALUES "
+                       + ", ".join(["(%s, %s)"] * rows)
+                       + " ON DUPLICATE KEY UPDATE content = VALUES(content)")
+            else:
+                sql = (f"INSERT IGNORE INTO {self.table} (id, content) VALUES "
+                       + ", ".join(["(%s, %s)"] * rows))
+            self._values_sql[rows] = sql
+        return sql
+
+    def _insert_chunk(self, rows: list) -> int:
+        """Write one chunk as a multi-row INSERT on a pooled connection and update stats"""
+        slot = self._checkout()
+        # Full batches - the common case - reuse one prepared statement per
+        # connection. Other sizes get a plain cursor, since preparing each
+        # size would pile up server-side statements
+        prepare = len(rows) == self.batch_size and 2 * len(rows) <= MAX_PREPARED_PARAMS
+        if prepare:
+            if slot.batch is None:
+                slot.batch = slot.conn.cursor(prepared=True)
+            cursor = slot.batch
+        else:
+            cursor = slot.conn.cursor()
+
+        try:
+            cursor.execute(self._insert_values_sql(len(rows)), tuple(chain.from_iterable(rows)))
+            # INSERT IGNORE: rows not counted as affected were duplicates. An
+            # upsert writes every row (its rowcount counts updates twice)
+            inserted = len(rows) if self.upsert else max(cursor.rowcount, 0)
+
+        except Exception as e:
+            self._discard(slot, None if prepare else cursor)
+            if len(rows) == 1:
+                self._count(errors=1)
+                logger.error(f"Error inserting {rows[0][0]}: {e}")
+                return 0
+            # One bad row fails the whole statement - retry the rows one at a
+            # time so only the ones that really fail count as errors. Each is
+            # committed alone, so a later bad row can't roll back good ones
+            logger.warning(f"Error inserting batch of {len(rows)} records, retrying one by one: {e}")
+            return sum(self._insert_one(record_id, content, commit=True) for record_id, content in rows)
+
+        if not prepare:
             cursor.close()
-            conn.close()  # Returns to pool, doesn't actually close
+        return inserted if self._written(slot, len(rows), inserted, batch=True) else 0
+
+    def bulk_load(self, records: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Insert records with one LOAD DATA LOCAL INFILE statement.
+
+        The rows are written to a tab-separated file and MySQL's bulk loader
+        reads them, skipping per-row statement handling. Duplicates are
+        ignored as with INSERT IGNORE. Needs local_infile=True.
+
+        Returns:
+            int: Number of records inserted
+        """
+        if not self.infile_dir:
+            raise ValueError("bulk_load() needs MySQLSink(local_infile=True)")
+
+        fd, path = tempfile.mkstemp(suffix=".tsv", dir=self.infile_dir)
+        try:
+            rows = 0
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                for record_id, content in records:
+                    if content is None:
+                        content = "\\N"  # LOAD DATA's NULL, so left unescaped
+                    else:
+                        if isinstance(content, dict):
+                            content = json.dumps(content)
+                        elif isinstance(content, bytes):
+                            content = content.decode("utf-8")  # The file is written as text
+                        elif not isinstance(content, str):
+                            content = str(content)
+                        content = content.translate(_INFILE_ESCAPES)
+                    f.write(f"{str(record_id).translate(_INFILE_ESCAPES)}\t{content}\n")
+                    rows += 1
+            if not rows:
+                return 0
+
+            slot = self._checkout()
+            cursor = slot.conn.cursor()
+            try:
+                cursor.execute(self.load_sql, (path,))
+                inserted = rows if self.upsert else max(cursor.rowcount, 0)
+            except Exception as e:
+                self._discard(slot, cursor)
+                self._count(errors=rows)
+                logger.error(f"Error bulk loading {rows} records: {e}")
+                return 0
+
+            cursor.close()
+            return inserted if self._written(slot, rows, inserted, batch=True) else 0
+        finally:
+            os.remove(path)
 
     def commit(self):
-        """No-op with per-record commits"""
-        logger.info(f"Stats at commit: {self.stats}")
+        """Write buffered rows and commit rows still pending on idle connections"""
+        self.flush()
+        for slot in self._drain_idle():
+            self._commit(slot)
+            self._idle.put(slot)
+        logger.info(f"Stats at commit: {self.get_stats()}")
 
     def close(self):
-        """Close connection pool"""
-        logger.info(f"MySQLSink closed. Final stats: {self.stats}")
+        """Write buffered rows, commit, and return held connections to the pool"""
+        self.flush()
+        for slot in self._drain_idle():
+            self._release(slot)
+        if self.infile_dir:
+            shutil.rmtree(self.infile_dir, ignore_errors=True)
+        logger.info(f"MySQLSink closed. Final stats: {self.get_stats()}")
 
     def get_stats(self) -> Dict[str, int]:
         """Thread-safe stats"""
         with self.stats_lock:
-            return self.stats.copy()
+            return dict(zip(_STAT_NAMES, self._counts))
@@ -8,6 +8,8 @@ Author: Kevin McAllorum
 import pytest
 from unittest.mock import Mock, patch
 import signal
+import sys
+from pipeline_cli import main
 
 
 class TestCLIErrorPaths:
@@ -18,8 +20,6 @@ class TestCLIErrorPaths:
     @patch('pipeline_cli.FileSink')
     def test_cli_pipeline_failure(self, mock_sink, mock_source, mock_pipeline):
         """Test CLI when pipeline.run() raises exception"""
-        from pipeline_cli import main
-        
         # Setup mocks
         mock_source_instance = Mock()
         mock_source.return_value = mock_source_instance
@@ -53,8 +53,6 @@ class TestCLIErrorPaths:
     @patch('pipeline_cli.FileSink')
     def test_cli_with_keyboard_interrupt(self, mock_sink, mock_source, mock_pipeline, mock_server):
         """Test CLI handles KeyboardInterrupt gracefully"""
-        from pipeline_cli import main
-        
         # Setup mocks
         mock_source_instance = Mock()
         mock_source.return_value = mock_source_instance
@@ -97,8 +95,6 @@ class TestCLIErrorPaths:
     @patch('pipeline_cli.FileSink')
     def test_cli_metrics_server_keeps_running(self, mock_sink, mock_source, mock_pipeline, mock_server):
         """Test CLI keeps metrics server running after pipeline completes"""
-        from pipeline_cli import main
-        
         # Setup mocks
         mock_source_instance = Mock()
         mock_source.return_value = mock_source_instance
@@ -142,8 +138,6 @@ class TestCLIErrorPaths:
     @patch('pipeline_cli.FileSink')
     def test_cli_signal_handler(self, mock_sink, mock_source, mock_pipeline, mock_server):
         """Test CLI signal handler for graceful shutdown"""
-        from pipeline_cli import main
-        
         # Setup mocks
         mock_source_instance = Mock()
         mock_source.return_value = mock_source_instance
@@ -193,8 +187,6 @@ class TestCLIErrorPaths:
     @patch('pipeline_cli.FileSink')
     def test_cli_with_all_query_params(self, mock_sink, mock_source, mock_pipeline):
         """Test CLI with all query parameters"""
-        from pipeline_cli import main
-        
         # Setup mocks
         mock_source_instance = Mock()
         mock_source.return_value = mock_source_instance
@@ -238,57 +230,48 @@ class TestCLIErrorPaths:
 class TestPipelineMetricsUnavailable:
     """Test pipeline behavior when metrics are unavailable"""
     
-    def test_pipeline_metrics_unavailable(self):
+    def test_pipeline_metrics_unavailable(self, tmp_path, monkeypatch):
         """Test pipeline when prometheus_client not installed"""
-        import tempfile
         import csv
-        import os
+        import importlib.util
+        import pipeline
         from test_impl import CSVSource, FileSink
         
         # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = str(tmp_path / "in.csv")
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "data"])
             writer.writeheader()
             writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.txt', delete=False).name
-        
-        try:
-            # Temporarily hide metrics module
-            with patch.dict('sys.modules', {'metrics': None}):
-                # Re-import pipeline to trigger metrics unavailable path
-                import importlib
-                import pipeline as pipeline_module
-                importlib.reload(pipeline_module)
-
-                source = CSVSource(csv_path)
-                sink = FileSink(output_path)
-
-                # Create pipeline with metrics enabled (but unavailable)
-                pipeline = pipeline_module.DataPipeline(
-                    source, 
-                    sink, 
-                    num_threads=1,
-                    enable_metrics=True,
-                    pipeline_id="test"
-                )
-                
-                # Should still work without metrics
-                stats = pipeline.run()
-                pipeline.cleanup()
-                
-                assert stats["inserted"] >= 1
-                
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-            
-            # Restore normal import - reload to restore metrics
-            importlib.reload(pipeline_module)
-
+        output_path = str(tmp_path / "out.txt")
+        
+        # Hide the metrics module and load a disposable copy of pipeline to
+        # trigger the metrics unavailable path; the cached pipeline module
+        # is never touched
+        monkeypatch.setitem(sys.modules, 'metrics', None)
+        spec = importlib.util.spec_from_file_location("pipeline_probe", pipeline.__file__)
+        probe = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(probe)
+        assert probe.METRICS_AVAILABLE is False
+        
+        source = CSVSource(csv_path)
+        sink = FileSink(output_path)
+        
+        # Create pipeline with metrics enabled (but unavailable)
+        data_pipeline = probe.DataPipeline(
+            source, 
+            sink, 
+            num_threads=1,
+            enable_metrics=True,
+            pipeline_id="test"
+        )
+        
+        # Should still work without metrics
+        stats = data_pipeline.run()
+        data_pipeline.cleanup()
+        
+        assert stats["inserted"] >= 1
 
 if __name__ == "__main__":  # pragma: no cover
     pytest.main([__file__, "-v"])
@@ -172,73 +172,57 @@ class TestClaudeErrorAnalyzer:
 class TestErrorAnalyzerIntegration:
     """Integration tests with pipeline"""
     
-    def test_noop_analyzer_in_pipeline(self):
+    def test_noop_analyzer_in_pipeline(self, tmp_path):
         """Test that NoOp analyzer doesn't break pipeline"""
         from pipeline import DataPipeline
         from test_impl import CSVSource, FileSink
-        import tempfile
         import csv
         
         # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = str(tmp_path / "in.csv")
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "data"])
             writer.writeheader()
             writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
         
         # Create output path
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            analyzer = NoOpErrorAnalyzer()
-            
-            pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=analyzer)
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] == 1
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        output_path = str(tmp_path / "out.jsonl")
+        
+        source = CSVSource(csv_path)
+        sink = FileSink(output_path)
+        analyzer = NoOpErrorAnalyzer()
+        
+        pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=analyzer)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert stats["inserted"] == 1
     
-    def test_simple_analyzer_in_pipeline(self):
+    def test_simple_analyzer_in_pipeline(self, tmp_path):
         """Test that Simple analyzer works in pipeline"""
         from pipeline import DataPipeline
         from test_impl import CSVSource, FileSink
-        import tempfile
         import csv
         
         # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = str(tmp_path / "in.csv")
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "data"])
             writer.writeheader()
             writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            analyzer = SimpleErrorAnalyzer()
-            
-            pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=analyzer)
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] == 1
-            assert analyzer.is_enabled() is True
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        
+        output_path = str(tmp_path / "out.jsonl")
+        
+        source = CSVSource(csv_path)
+        sink = FileSink(output_path)
+        analyzer = SimpleErrorAnalyzer()
+        
+        pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=analyzer)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert stats["inserted"] == 1
+        assert analyzer.is_enabled() is True
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -6,11 +6,8 @@ These tests target very specific edge cases and error paths.
 Author: Kevin McAllorum
 """
 import pytest
-import tempfile
 import csv
-import os
 import signal
-import time
 from unittest.mock import Mock, patch
 
 
@@ -22,8 +19,8 @@ class TestMetricsServerErrorPaths:
         from metrics_server import MetricsServer
         import urllib.request
         
-        with MetricsServer(port=9600) as server:
-            time.sleep(0.2)
+        with MetricsServer(port=0) as server:
+            assert server.wait_ready()
             
             try:
                 # Just hit the endpoint to ensure it works
@@ -36,7 +33,7 @@ class TestMetricsServerErrorPaths:
         """Test error in server run thread"""
         from metrics_server import MetricsServer
         
-        server = MetricsServer(port=9601)
+        server = MetricsServer(port=0)
         
         # Mock the server to raise an error
         with patch.object(server, 'server', Mock()):
@@ -53,8 +50,8 @@ class TestMetricsServerErrorPaths:
         from metrics_server import MetricsServer
         import urllib.request
         
-        with MetricsServer(port=9602) as server:
-            time.sleep(0.2)
+        with MetricsServer(port=0) as server:
+            assert server.wait_ready()
             
             try:
                 # Request unknown endpoint
@@ -162,7 +159,7 @@ class TestPipelineCLIEdgeCases:
 class TestPipelineMetricsEdgeCases:
     """Target missing line in pipeline.py"""
     
-    def test_pipeline_single_threaded_with_metrics_and_errors(self):
+    def test_pipeline_single_threaded_with_metrics_and_errors(self, tmp_path):
         """Test single-threaded pipeline with metrics and error in sink"""
         from test_impl import CSVSource
         from pipeline import DataPipeline
@@ -197,127 +194,100 @@ class TestPipelineMetricsEdgeCases:
                 return self.stats
         
         # Create test CSV with multiple records
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            for i in range(5):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
+        csv_path = str(tmp_path / "in.csv")
+        with open(csv_path, 'w', newline='') as f:
+            f.write("id,data\n" + "".join(f"{i},test{i}\n" for i in range(5)))
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.txt', delete=False).name
+        output_path = str(tmp_path / "out.txt")
         
-        try:
-            source = CSVSource(csv_path)
-            sink = FlakyFileSink(output_path)
-            
-            # Single-threaded with metrics and error analyzer
-            pipeline = DataPipeline(
-                source, 
-                sink, 
-                num_threads=1,
-                enable_metrics=True,
-                error_analyzer=SimpleErrorAnalyzer(),
-                pipeline_id="flaky-test"
-            )
-            
-            # Should handle error gracefully
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            # Should have inserted 4 records (all except #3 which failed)
-            assert stats["inserted"] >= 3
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        source = CSVSource(csv_path)
+        sink = FlakyFileSink(output_path)
+        
+        # Single-threaded with metrics and error analyzer
+        pipeline = DataPipeline(
+            source, 
+            sink, 
+            num_threads=1,
+            enable_metrics=True,
+            error_analyzer=SimpleErrorAnalyzer(),
+            pipeline_id="flaky-test"
+        )
+        
+        # Should handle error gracefully
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        # Should have inserted 4 records (all except #3 which failed)
+        assert stats["inserted"] >= 3
     
-    def test_pipeline_batch_metrics_edge_case(self):
+    def test_pipeline_batch_metrics_edge_case(self, tmp_path):
         """Test batch metrics recording at exact boundaries"""
         from test_impl import CSVSource, JSONLSink
         from pipeline import DataPipeline
         
         # Create CSV with exactly 100 records (batch boundary)
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            for i in range(100):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
+        csv_path = str(tmp_path / "in.csv")
+        with open(csv_path, 'w', newline='') as f:
+            f.write("id,data\n" + "".join(f"{i},test{i}\n" for i in range(100)))
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        output_path = str(tmp_path / "out.jsonl")
         
-        try:
-            source = CSVSource(csv_path)
-            sink = JSONLSink(output_path)
-            
-            # Multi-threaded with metrics
-            pipeline = DataPipeline(
-                source, 
-                sink, 
-                num_threads=2,
-                enable_metrics=True,
-                pipeline_id="batch-boundary"
-            )
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] == 100
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        source = CSVSource(csv_path)
+        sink = JSONLSink(output_path)
+        
+        # Multi-threaded with metrics
+        pipeline = DataPipeline(
+            source, 
+            sink, 
+            num_threads=2,
+            enable_metrics=True,
+            pipeline_id="batch-boundary"
+        )
+        
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert stats["inserted"] == 100
 
 
 class TestMetricsAvailabilityPaths:
     """Test paths when metrics are/aren't available"""
     
-    def test_pipeline_metrics_logging(self):
+    def test_pipeline_metrics_logging(self, tmp_path):
         """Test debug logging when metrics are enabled/disabled"""
         from test_impl import CSVSource, FileSink
         
         # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = str(tmp_path / "in.csv")
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "data"])
             writer.writeheader()
             writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.txt', delete=False).name
+        output_path = str(tmp_path / "out.txt")
         
-        try:
-            # Import after metrics might be available
-            from pipeline import DataPipeline, METRICS_AVAILABLE
-            
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            
-            # Check both paths
-            pipeline = DataPipeline(
-                source,
-                sink,
-                num_threads=1,
-                enable_metrics=METRICS_AVAILABLE,
-                pipeline_id="logging-test"
-            )
-            
-            # Verify initialization
-            assert pipeline.enable_metrics == METRICS_AVAILABLE
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] >= 1
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        # Import after metrics might be available
+        from pipeline import DataPipeline, METRICS_AVAILABLE
+        
+        source = CSVSource(csv_path)
+        sink = FileSink(output_path)
+        
+        # Check both paths
+        pipeline = DataPipeline(
+            source,
+            sink,
+            num_threads=1,
+            enable_metrics=METRICS_AVAILABLE,
+            pipeline_id="logging-test"
+        )
+        
+        # Verify initialization
+        assert pipeline.enable_metrics == METRICS_AVAILABLE
+        
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert stats["inserted"] >= 1
 
 
 if __name__ == "__main__":  # pragma: no cover
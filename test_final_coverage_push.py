@@ -11,9 +11,7 @@ Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 """
 import pytest
 import json
-import tempfile
 import csv
-import os
 from error_analyzer import SimpleErrorAnalyzer
 from test_impl import CSVSource, FileSink, JSONLSink
 from pipeline import DataPipeline
@@ -116,128 +114,99 @@ class TestErrorAnalyzerAllBranches:
 class TestTestImplEdgeCases:
     """Hit remaining branches in test_impl.py"""
     
-    def test_csv_source_with_missing_id_column(self):
+    def test_csv_source_with_missing_id_column(self, tmp_path):
         """Test CSV with rows missing ID column"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = tmp_path / "in.csv"
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "data"])
             writer.writeheader()
             writer.writerow({"id": "1", "data": "has_id"})
             writer.writerow({"data": "missing_id"})  # Missing ID!
             writer.writerow({"id": "2", "data": "has_id"})
-            csv_path = f.name
         
-        try:
-            source = CSVSource(csv_path, id_column="id")
-            records = list(source.fetch_records())
-            
-            # Should skip row without ID
-            assert len(records) == 2
-            assert records[0][0] == "1"
-            assert records[1][0] == "2"
-            
-            source.close()
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
+        source = CSVSource(csv_path, id_column="id")
+        records = list(source.fetch_records())
+        
+        # Should skip row without ID
+        assert len(records) == 2
+        assert records[0][0] == "1"
+        assert records[1][0] == "2"
+        
+        source.close()
     
-    def test_csv_source_with_non_json_content(self):
+    def test_csv_source_with_non_json_content(self, tmp_path):
         """Test CSV where content is not JSON"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = tmp_path / "in.csv"
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "content", "extra"])
             writer.writeheader()
             writer.writerow({"id": "1", "content": "plain text", "extra": "data"})
-            csv_path = f.name
         
-        try:
-            source = CSVSource(csv_path, id_column="id", content_column="content")
-            records = list(source.fetch_records())
-            
-            # Should convert entire row to JSON when content isn't JSON
-            assert len(records) == 1
-            record_id, content = records[0]
-            assert record_id == "1"
-            
-            # Content should be full row as JSON
-            parsed = json.loads(content)
-            assert "id" in parsed
-            assert "content" in parsed
-            assert "extra" in parsed
-            
-            source.close()
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
+        source = CSVSource(csv_path, id_column="id", content_column="content")
+        records = list(source.fetch_records())
+        
+        # Should convert entire row to JSON when content isn't JSON
+        assert len(records) == 1
+        record_id, content = records[0]
+        assert record_id == "1"
+        
+        # Content should be full row as JSON
+        parsed = json.loads(content)
+        assert "id" in parsed
+        assert "content" in parsed
+        assert "extra" in parsed
+        
+        source.close()
     
-    def test_file_sink_with_non_json_content_string(self):
+    def test_file_sink_with_non_json_content_string(self, tmp_path):
         """Test FileSink with plain text content"""
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        output_path = tmp_path / "out.jsonl"
+        sink = FileSink(output_path)
         
-        try:
-            sink = FileSink(output_path)
-            
-            # Insert with plain text (not valid JSON)
-            result = sink.insert_record("1", "plain text content")
-            assert result is True
-            
-            sink.commit()
-            sink.close()
-            
-            # Verify file was written
-            assert os.path.exists(output_path)
-            
-            with open(output_path, 'r') as f:
-                line = f.readline()
-                record = json.loads(line)
-                assert record["id"] == "1"
-                assert record["content"] == "plain text content"
+        # Insert with plain text (not valid JSON)
+        result = sink.insert_record("1", "plain text content")
+        assert result is True
         
-        finally:
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        sink.commit()
+        sink.close()
+        
+        # Verify file was written
+        with open(output_path, 'r') as f:
+            line = f.readline()
+            record = json.loads(line)
+            assert record["id"] == "1"
+            assert record["content"] == "plain text content"
     
-    def test_jsonl_sink_with_non_json_content(self):
+    def test_jsonl_sink_with_non_json_content(self, tmp_path):
         """Test JSONLSink with non-JSON content"""
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        output_path = tmp_path / "out.jsonl"
+        sink = JSONLSink(output_path)
         
-        try:
-            sink = JSONLSink(output_path)
-            
-            # Insert with plain text
-            result = sink.insert_record("1", "not json")
-            assert result is True
-            
-            sink.commit()
-            sink.close()
-            
-            with open(output_path, 'r') as f:
-                line = f.readline()
-                record = json.loads(line)
-                assert record["id"] == "1"
-                assert record["raw"] == "not json"
+        # Insert with plain text
+        result = sink.insert_record("1", "not json")
+        assert result is True
         
-        finally:
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        sink.commit()
+        sink.close()
+        
+        with open(output_path, 'r') as f:
+            line = f.readline()
+            record = json.loads(line)
+            assert record["id"] == "1"
+            assert record["raw"] == "not json"
     
-    def test_file_sink_logging_every_100_records(self):
+    def test_file_sink_logging_every_100_records(self, tmp_path):
         """Test FileSink progress logging at 100 record intervals"""
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        sink = FileSink(tmp_path / "out.jsonl")
         
-        try:
-            sink = FileSink(output_path)
-            
-            # Insert 150 records to trigger logging at 100
-            for i in range(150):
-                sink.insert_record(str(i), f'{{"data": "test{i}"}}')
-            
-            stats = sink.get_stats()
-            assert stats["inserted"] == 150
-            
-            sink.close()
+        # Insert 150 records to trigger logging at 100
+        for i in range(150):
+            sink.insert_record(str(i), f'{{"data": "test{i}"}}')
         
-        finally:
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        stats = sink.get_stats()
+        assert stats["inserted"] == 150
+        
+        sink.close()
 
 
 class TestPipelineCliEdgeCases:
@@ -264,35 +233,22 @@ class TestPipelineCliEdgeCases:
 class TestPipelineLoggingEdgeCase:
     """Hit remaining logging edge case in pipeline.py"""
     
-    def test_single_threaded_with_large_batch_logging(self):
+    def test_single_threaded_with_large_batch_logging(self, tmp_path):
         """Test single-threaded logging at 100 record intervals"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            # Create 150 records to trigger logging at 100
-            for i in range(150):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
+        csv_path = tmp_path / "in.csv"
+        # Create 150 records to trigger logging at 100
+        csv_path.write_text("id,data\n" + "".join(f"{i},test{i}\n" for i in range(150)))
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        source = CSVSource(csv_path)
+        sink = FileSink(tmp_path / "out.jsonl")
         
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            
-            pipeline = DataPipeline(source, sink, num_threads=1)
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            # Should have processed all records
-            assert stats["inserted"] == 150
-            assert pipeline.total_processed == 150
+        pipeline = DataPipeline(source, sink, num_threads=1)
+        stats = pipeline.run()
+        pipeline.cleanup()
         
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        # Should have processed all records
+        assert stats["inserted"] == 150
+        assert pipeline.total_processed == 150
 
 
 if __name__ == "__main__":  # pragma: no cover
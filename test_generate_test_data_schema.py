@@ -6,6 +6,7 @@ Author: Mac McAllorum
 import pytest
 import json
 import csv
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -302,7 +303,6 @@ class TestListSchemas:
             json.dump(schema, f)
         
         # Change to temp directory
-        import os
         original_dir = os.getcwd()
         os.chdir(tmp_path)
         
@@ -319,7 +319,6 @@ class TestListSchemas:
     
     def test_list_schemas_no_directory(self, tmp_path, capsys):
         """Test listing when no schemas directory"""
-        import os
         original_dir = os.getcwd()
         os.chdir(tmp_path)
         
@@ -336,7 +335,6 @@ class TestListSchemas:
         schemas_dir = tmp_path / "schemas"
         schemas_dir.mkdir()
         
-        import os
         original_dir = os.getcwd()
         os.chdir(tmp_path)
         
@@ -376,7 +374,6 @@ class TestMainFunction:
     
     def test_main_list_flag(self, setup_test_env):
         """Test main with --list flag"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -394,7 +391,6 @@ class TestMainFunction:
     
     def test_main_generate_jsonl(self, setup_test_env):
         """Test generating JSONL output"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -414,7 +410,6 @@ class TestMainFunction:
     
     def test_main_generate_csv(self, setup_test_env):
         """Test generating CSV output"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -434,7 +429,6 @@ class TestMainFunction:
     
     def test_main_custom_output(self, setup_test_env):
         """Test with custom output filename"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -453,7 +447,6 @@ class TestMainFunction:
     
     def test_main_custom_base_id(self, setup_test_env):
         """Test with custom base ID"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -477,7 +470,6 @@ class TestMainFunction:
     
     def test_main_missing_schema_arg(self, setup_test_env):
         """Test error when --schema not provided"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -495,7 +487,6 @@ class TestMainFunction:
     
     def test_main_nonexistent_schema(self, setup_test_env):
         """Test error for nonexistent schema"""
-        import os
         original_dir = os.getcwd()
         os.chdir(setup_test_env)
         
@@ -218,7 +218,26 @@ class TestJSONLSourceEdgeCases:
             assert source.records_read == 2
         finally:
             os.unlink(temp_file)
-    
+
+    def test_array_and_malformed_object_lines(self):
+        """Test that array lines are read whole and brace-wrapped garbage is skipped"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.jsonl', delete=False) as f:
+            f.write('[{"id": "x"}]\n')  # Valid JSON array, kept as content
+            f.write('{"id": "2", oops}\n')  # Looks like an object, fails to parse
+            f.write('{"id": "3", "content": {"valid": true}}\n')
+            temp_file = f.name
+
+        try:
+            source = JSONLSource(temp_file)
+            records = list(source.fetch_records())
+
+            # Arrays have no id field, so they get a line-number ID and the
+            # whole array as content
+            assert records == [("line_1", [{"id": "x"}]), ("3", {"valid": True})]
+            assert source.records_read == 2
+        finally:
+            os.unlink(temp_file)
+
     def test_file_not_found(self):
         """Test FileNotFoundError is raised for non-existent file"""
         source = JSONLSource('/nonexistent/path/file.jsonl')
@@ -7,7 +7,63 @@ Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 """
 import pytest
 import time
+from prometheus_client import generate_latest
+from prometheus_client.metrics import MetricWrapperBase
 import metrics
+from metrics_testing import counter_value, counter_values, label_values
+
+# Every labelled metric the module defines
+LABELLED_METRICS = [
+    value for value in vars(metrics).values()
+    if isinstance(value, MetricWrapperBase) and value._labelnames
+]
+
+# Counters the record_* helpers write to
+HELPER_COUNTERS = (
+    metrics.records_processed_total,
+    metrics.records_inserted_total,
+    metrics.records_skipped_total,
+    metrics.records_failed_total,
+    metrics.ai_analysis_requests_total,
+)
+
+
+@pytest.fixture(autouse=True)
+def drop_new_label_children():
+    """
+    Remove label children a test created, so each test's one-off label values
+    don't pile up as permanent children for the rest of the session.
+    """
+    before = {metric: set(label_values(metric)) for metric in LABELLED_METRICS}
+    yield
+    for metric, keys in before.items():
+        for key in set(label_values(metric)) - keys:
+            metric.remove(*key)
+    # Cached children may point at removed ones
+    metrics._labels_child.cache_clear()
+    metrics.bind_labels.cache_clear()
+
+
+def _sample_value(collector, sample_name, labels):
+    """
+    Read a single sample straight from one collector.
+    
+    Only walks the given metric family instead of rendering the whole
+    registry with generate_latest(). Returns 0.0 if the sample doesn't exist.
+    """
+    for family in collector.collect():
+        for sample in family.samples:
+            if sample.name == sample_name and all(
+                sample.labels.get(key) == value for key, value in labels.items()
+            ):
+                return sample.value
+    return 0.0
+
+
+@pytest.fixture(scope="module")
+def summary():
+    """Metrics summary, built once for the module"""
+    return metrics.get_metrics_summary()
 
 
 class TestMetricsInitialization:
@@ -20,9 +76,8 @@ class TestMetricsInitialization:
         assert hasattr(metrics, 'records_inserted_total')
         assert hasattr(metrics, 'records_skipped_total')
     
-    def test_pipeline_info_initialized(self):
+    def test_pipeline_info_initialized(self, summary):
         """Test that pipeline info is set on module load"""
-        summary = metrics.get_metrics_summary()
         assert summary["metrics_registered"] is True
         assert len(summary["counters"]) > 0
         assert len(summary["gauges"]) > 0
@@ -34,41 +89,63 @@ class TestCounters:
     
     def test_records_processed_counter(self):
         """Test records_processed_total counter"""
-        initial = metrics.records_processed_total.labels(
-            source_type="test",
-            sink_type="test"
-        )._value.get()
+        child = metrics.records_processed_total.labels(source_type="test", sink_type="test")
+        initial = counter_value(child)
         
-        metrics.records_processed_total.labels(
-            source_type="test",
-            sink_type="test"
-        ).inc()
+        child.inc()
         
-        final = metrics.records_processed_total.labels(
-            source_type="test",
-            sink_type="test"
-        )._value.get()
-        
-        assert final == initial + 1
+        assert counter_value(child) == initial + 1
     
     def test_ai_analysis_counter(self):
         """Test AI analysis request counter"""
-        initial = metrics.ai_analysis_requests_total.labels(
-            analyzer_type="SimpleErrorAnalyzer",
-            status="success"
-        )._value.get()
-        
-        metrics.ai_analysis_requests_total.labels(
+        child = metrics.ai_analysis_requests_total.labels(
             analyzer_type="SimpleErrorAnalyzer",
             status="success"
-        ).inc()
+        )
+        initial = counter_value(child)
         
-        final = metrics.ai_analysis_requests_total.labels(
-            analyzer_type="SimpleErrorAnalyzer",
-            status="success"
-        )._value.get()
+        child.inc()
         
-        assert final == initial + 1
+        assert counter_value(child) == initial + 1
+    
+    def test_counter_value_by_labels_or_child(self):
+        """Test counter_value reads the same child by labels or when pre-bound"""
+        child = metrics.records_processed_total.labels(source_type="test", sink_type="test")
+        child.inc(3)
+        
+        assert counter_value(metrics.records_processed_total,
+                             source_type="test", sink_type="test") == counter_value(child)
+        assert counter_values(metrics.records_processed_total)[("test", "test")] == counter_value(child)
+    
+    def test_labels_cached_returns_same_child(self):
+        """Test _labels_cached memoizes the labels() lookup"""
+        child = metrics._labels_cached(metrics.records_processed_total,
+                                       source_type="test", sink_type="test")
+        
+        assert child is metrics._labels_cached(metrics.records_processed_total,
+                                               source_type="test", sink_type="test")
+        assert child is metrics.records_processed_total.labels(source_type="test",
+                                                               sink_type="test")
+    
+    def test_bind_labels_prebinds_children(self):
+        """Test bind_labels returns one cached BoundMetrics per source/sink pair"""
+        bound = metrics.bind_labels("test_bound", "test_bound")
+        
+        assert bound is metrics.bind_labels("test_bound", "test_bound")
+        assert bound.processed is metrics.records_processed_total.labels(
+            source_type="test_bound", sink_type="test_bound")
+        assert bound.insert_duration is metrics.insert_duration_seconds.labels(
+            sink_type="test_bound")
+        assert bound.insert_batch_duration is metrics.insert_batch_duration_seconds.labels(
+            sink_type="test_bound")
+        
+        initial = counter_value(bound.inserted)
+        bound.record_success()
+        assert counter_value(bound.inserted) == initial + 1
+    
+    def test_label_children_dropped_between_tests(self):
+        """Test the autouse fixture removed children created by earlier tests"""
+        assert ("test_bound", "test_bound") not in counter_values(metrics.records_processed_total)
 
 
 class TestGauges:
@@ -76,26 +153,26 @@ class TestGauges:
     
     def test_active_workers_gauge(self):
         """Test active_workers gauge"""
-        metrics.active_workers.labels(pipeline_id="test").set(5)
-        value = metrics.active_workers.labels(pipeline_id="test")._value.get()
-        assert value == 5
+        child = metrics.active_workers.labels(pipeline_id="test")
         
-        metrics.active_workers.labels(pipeline_id="test").set(0)
-        value = metrics.active_workers.labels(pipeline_id="test")._value.get()
-        assert value == 0
+        child.set(5)
+        assert counter_value(child) == 5
+        
+        child.set(0)
+        assert counter_value(child) == 0
     
     def test_queue_depth_gauge(self):
         """Test queue_depth gauge"""
-        metrics.queue_depth.labels(pipeline_id="test").set(100)
-        value = metrics.queue_depth.labels(pipeline_id="test")._value.get()
-        assert value == 100
+        child = metrics.queue_depth.labels(pipeline_id="test")
+        child.set(100)
+        assert counter_value(child) == 100
     
     def test_pipeline_state_gauge(self):
         """Test pipeline_state gauge"""
         # 0 = stopped, 1 = running, 2 = error
-        metrics.pipeline_state.labels(pipeline_id="test").set(1)
-        value = metrics.pipeline_state.labels(pipeline_id="test")._value.get()
-        assert value == 1
+        child = metrics.pipeline_state.labels(pipeline_id="test")
+        child.set(1)
+        assert counter_value(child) == 1
 
 
 class TestHistograms:
@@ -103,35 +180,65 @@ class TestHistograms:
     
     def test_fetch_duration_histogram(self):
         """Test fetch_duration_seconds histogram"""
+        labels = {"source_type": "test_hist"}
+        initial = _sample_value(metrics.fetch_duration_seconds,
+                                "pipeline_fetch_duration_seconds_count", labels)
+        
         # Record observation
         metrics.fetch_duration_seconds.labels(source_type="test_hist").observe(0.5)
         
-        # Histograms don't expose count directly in labels, but we can verify
-        # by trying to collect the metric
-        from prometheus_client import generate_latest
-        output = generate_latest().decode('utf-8')
-        assert 'pipeline_fetch_duration_seconds' in output
+        final = _sample_value(metrics.fetch_duration_seconds,
+                              "pipeline_fetch_duration_seconds_count", labels)
+        assert final == initial + 1
     
     def test_insert_duration_histogram(self):
         """Test insert_duration_seconds histogram"""
+        labels = {"sink_type": "test_hist"}
+        initial = _sample_value(metrics.insert_duration_seconds,
+                                "pipeline_insert_duration_seconds_count", labels)
+        
         metrics.insert_duration_seconds.labels(sink_type="test_hist").observe(0.1)
         
-        from prometheus_client import generate_latest
-        output = generate_latest().decode('utf-8')
-        assert 'pipeline_insert_duration_seconds' in output
+        final = _sample_value(metrics.insert_duration_seconds,
+                              "pipeline_insert_duration_seconds_count", labels)
+        assert final == initial + 1
     
     def test_batch_size_histogram(self):
         """Test batch_size histogram"""
+        labels = {"source_type": "test_hist"}
+        initial = _sample_value(metrics.batch_size, "pipeline_batch_size_sum", labels)
+        
         metrics.batch_size.labels(source_type="test_hist").observe(1000)
         
-        from prometheus_client import generate_latest
-        output = generate_latest().decode('utf-8')
-        assert 'pipeline_batch_size' in output
+        final = _sample_value(metrics.batch_size, "pipeline_batch_size_sum", labels)
+        assert final == initial + 1000
+    
+    def test_histograms_exposed_in_text_format(self):
+        """Test that all histograms render in the Prometheus exposition format"""
+        # One render, scanned as bytes - the names are ASCII, so no decode
+        raw = generate_latest()
+        assert b'pipeline_fetch_duration_seconds' in raw
+        assert b'pipeline_insert_duration_seconds' in raw
+        assert b'pipeline_batch_size' in raw
 
 
 class TestHelperFunctions:
     """Test helper functions"""
     
+    @pytest.fixture
+    def counter_delta(self):
+        """
+        Snapshot every helper counter in one sweep; returns
+        delta(counter, *labels) giving the change since the snapshot.
+        """
+        snapshot = {counter: counter_values(counter) for counter in HELPER_COUNTERS}
+        
+        def delta(counter, *labels):
+            current = counter_values(counter).get(labels, 0.0)
+            return current - snapshot[counter].get(labels, 0.0)
+        
+        return delta
+    
     def test_time_operation_context_manager(self):
         """Test time_operation context manager"""
         with metrics.time_operation(
@@ -140,10 +247,10 @@ class TestHelperFunctions:
         ):
             time.sleep(0.01)
         
-        # Verify timing was recorded by checking metrics output
-        from prometheus_client import generate_latest
-        output = generate_latest().decode('utf-8')
-        assert 'sink_type="test_cm"' in output
+        # Verify timing was recorded
+        assert _sample_value(metrics.insert_duration_seconds,
+                             "pipeline_insert_duration_seconds_count",
+                             {"sink_type": "test_cm"}) >= 1
     
     def test_time_operation_with_exception(self):
         """Test time_operation still records time even with exception"""
@@ -157,106 +264,43 @@ class TestHelperFunctions:
             pass
         
         # Timing should still be recorded
-        from prometheus_client import generate_latest
-        output = generate_latest().decode('utf-8')
-        assert 'sink_type="test_exception"' in output
+        assert _sample_value(metrics.insert_duration_seconds,
+                             "pipeline_insert_duration_seconds_count",
+                             {"sink_type": "test_exception"}) >= 1
     
-    def test_record_success(self):
+    def test_record_success(self, counter_delta):
         """Test record_success helper"""
-        initial_processed = metrics.records_processed_total.labels(
-            source_type="test_success",
-            sink_type="test_success"
-        )._value.get()
-        
-        initial_inserted = metrics.records_inserted_total.labels(
-            source_type="test_success",
-            sink_type="test_success"
-        )._value.get()
-        
         metrics.record_success("test_success", "test_success")
         
-        final_processed = metrics.records_processed_total.labels(
-            source_type="test_success",
-            sink_type="test_success"
-        )._value.get()
-        
-        final_inserted = metrics.records_inserted_total.labels(
-            source_type="test_success",
-            sink_type="test_success"
-        )._value.get()
-        
-        assert final_processed == initial_processed + 1
-        assert final_inserted == initial_inserted + 1
+        assert counter_delta(metrics.records_processed_total, "test_success", "test_success") == 1
+        assert counter_delta(metrics.records_inserted_total, "test_success", "test_success") == 1
     
-    def test_record_skip(self):
+    def test_record_skip(self, counter_delta):
         """Test record_skip helper"""
-        initial = metrics.records_skipped_total.labels(
-            source_type="test_skip",
-            sink_type="test_skip",
-            reason="duplicate"
-        )._value.get()
-        
         metrics.record_skip("test_skip", "test_skip", "duplicate")
         
-        final = metrics.records_skipped_total.labels(
-            source_type="test_skip",
-            sink_type="test_skip",
-            reason="duplicate"
-        )._value.get()
-        
-        assert final == initial + 1
+        assert counter_delta(metrics.records_skipped_total, "test_skip", "test_skip", "duplicate") == 1
     
-    def test_record_failure(self):
+    def test_record_failure(self, counter_delta):
         """Test record_failure helper"""
         error = ValueError("Test error")
         
-        initial = metrics.records_failed_total.labels(
-            source_type="test_failure",
-            sink_type="test_failure",
-            error_type="ValueError"
-        )._value.get()
-        
         metrics.record_failure("test_failure", "test_failure", error)
         
-        final = metrics.records_failed_total.labels(
-            source_type="test_failure",
-            sink_type="test_failure",
-            error_type="ValueError"
-        )._value.get()
-        
-        assert final == initial + 1
+        assert counter_delta(metrics.records_failed_total,
+                             "test_failure", "test_failure", "ValueError") == 1
     
-    def test_record_ai_analysis_success(self):
+    def test_record_ai_analysis_success(self, counter_delta):
         """Test record_ai_analysis helper with success"""
-        initial = metrics.ai_analysis_requests_total.labels(
-            analyzer_type="TestAnalyzer",
-            status="success"
-        )._value.get()
-        
         metrics.record_ai_analysis("TestAnalyzer", True)
         
-        final = metrics.ai_analysis_requests_total.labels(
-            analyzer_type="TestAnalyzer",
-            status="success"
-        )._value.get()
-        
-        assert final == initial + 1
+        assert counter_delta(metrics.ai_analysis_requests_total, "TestAnalyzer", "success") == 1
     
-    def test_record_ai_analysis_failure(self):
+    def test_record_ai_analysis_failure(self, counter_delta):
         """Test record_ai_analysis helper with failure"""
-        initial = metrics.ai_analysis_requests_total.labels(
-            analyzer_type="TestAnalyzer",
-            status="failure"
-        )._value.get()
-        
         metrics.record_ai_analysis("TestAnalyzer", False)
         
-        final = metrics.ai_analysis_requests_total.labels(
-            analyzer_type="TestAnalyzer",
-            status="failure"
-        )._value.get()
-        
-        assert final == initial + 1
+        assert counter_delta(metrics.ai_analysis_requests_total, "TestAnalyzer", "failure") == 1
     
     def test_set_pipeline_info(self):
         """Test set_pipeline_info function"""
@@ -265,13 +309,15 @@ class TestHelperFunctions:
             author="Test Author",
             custom="custom_value"
         )
-        # If it doesn't raise an exception, it works
-        assert True
+        
+        assert _sample_value(metrics.pipeline_info, "pipeline_info_info", {"custom": "custom_value"}) == 1
     
-    def test_get_metrics_summary(self):
+    def test_get_metrics_summary(self, summary):
         """Test get_metrics_summary function"""
-        summary = metrics.get_metrics_summary()
-        
+        assert metrics.get_metrics_summary() == summary
+        # Each call builds a fresh dict, so a caller's edits don't leak
+        metrics.get_metrics_summary()["counters"].append("mutated")
+        assert metrics.get_metrics_summary() == summary
         assert isinstance(summary, dict)
         assert "metrics_registered" in summary
         assert "counters" in summary
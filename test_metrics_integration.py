@@ -6,333 +6,213 @@ Covers the instrumented code paths to achieve 100% coverage.
 Author: Kevin McAllorum
 """
 import pytest
-import tempfile
-import csv
-import os
-import time
-from unittest.mock import Mock, patch
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, Mock, patch
+import metrics
+from data_interfaces import DataSink
+from metrics_server import MetricsServer
+from metrics_testing import label_values
+from pipeline import DataPipeline
+from pipeline_cli import main
+from test_impl import CSVSource, FileSink, JSONLSink
+
+
+# Pre-serialized CSV inputs - tests only need a valid file on disk
+_CSV_1ROW = b"id,data\n1,test\n"
+_CSV_10ROW = b"id,data\n" + b"".join(f"{i},test{i}\n".encode() for i in range(10))
+
+
+@pytest.fixture(scope="class")
+def metrics_csv_files(tmp_path_factory):
+    """
+    CSV inputs shared by the whole class: (csv_path_1row, csv_path_10row, output_dir)
+    
+    Everything lives in one pytest-managed temporary directory, so there is
+    no per-test cleanup.
+    """
+    base = tmp_path_factory.mktemp("metrics_csv")
+    
+    csv_path_1row = base / "one_row.csv"
+    csv_path_1row.write_bytes(_CSV_1ROW)
+    
+    csv_path_10row = base / "ten_rows.csv"
+    csv_path_10row.write_bytes(_CSV_10ROW)
+    
+    output_dir = base / "output"
+    output_dir.mkdir()
+    
+    return str(csv_path_1row), str(csv_path_10row), output_dir
+
+
+class FailingSink(DataSink):
+    """Sink whose every insert fails"""
+    
+    def __init__(self):
+        self.stats = {"inserted": 0, "skipped": 0, "errors": 0}
+    
+    def insert_record(self, record_id, content):
+        raise ValueError("Simulated insert error")
+    
+    def commit(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    def get_stats(self):
+        return self.stats
 
 
 class TestPipelineWithMetrics:
     """Test DataPipeline with metrics enabled"""
     
-    def test_pipeline_with_metrics_enabled(self):
-        """Test pipeline runs with metrics enabled"""
-        from test_impl import CSVSource, FileSink
-        from pipeline import DataPipeline
-        
-        # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.txt', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            
-            # Create pipeline with metrics enabled
-            pipeline = DataPipeline(
-                source, 
-                sink, 
-                num_threads=1,
-                enable_metrics=True,
-                pipeline_id="test-metrics"
-            )
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] >= 1
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-    
-    def test_pipeline_with_metrics_disabled(self):
-        """Test pipeline runs with metrics explicitly disabled"""
-        from test_impl import CSVSource, FileSink
-        from pipeline import DataPipeline
-        
-        # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.txt', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            
-            # Create pipeline with metrics disabled
-            pipeline = DataPipeline(
-                source, 
-                sink, 
-                num_threads=1,
-                enable_metrics=False,
-                pipeline_id="test-no-metrics"
-            )
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] >= 1
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+    @pytest.mark.parametrize("enable_metrics", [True, False])
+    def test_pipeline_with_metrics(self, metrics_csv_files, enable_metrics):
+        """Test pipeline runs with metrics enabled and explicitly disabled"""
+        csv_path, _, output_dir = metrics_csv_files
+        snapshot = len(label_values(metrics.records_processed_total))
+        
+        source = CSVSource(csv_path)
+        # Sink opens in 'w' mode, truncating any previous run's output
+        sink = FileSink(str(output_dir / "output.txt"))
+        
+        pipeline = DataPipeline(
+            source, 
+            sink, 
+            num_threads=1,
+            enable_metrics=enable_metrics,
+            pipeline_id="test-metrics" if enable_metrics else "test-no-metrics"
+        )
+        
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert stats["inserted"] >= 1
+        assert (pipeline._bound_metrics is not None) == enable_metrics
+        if not enable_metrics:
+            # Instrumentation was skipped entirely - no new label children
+            assert len(label_values(metrics.records_processed_total)) == snapshot
     
-    def test_pipeline_multithreaded_with_metrics(self):
+    def test_pipeline_multithreaded_with_metrics(self, metrics_csv_files):
         """Test multi-threaded pipeline with metrics"""
-        from test_impl import CSVSource, JSONLSink
-        from pipeline import DataPipeline
-        
-        # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            for i in range(10):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = JSONLSink(output_path)
-            
-            # Multi-threaded with metrics
-            pipeline = DataPipeline(
-                source, 
-                sink, 
-                num_threads=2,
-                enable_metrics=True,
-                pipeline_id="test-mt-metrics"
-            )
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            assert stats["inserted"] == 10
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        _, csv_path, output_dir = metrics_csv_files
+        
+        source = CSVSource(csv_path)
+        sink = JSONLSink(str(output_dir / "output.jsonl"))
+        
+        # Multi-threaded with metrics
+        pipeline = DataPipeline(
+            source, 
+            sink, 
+            num_threads=2,
+            enable_metrics=True,
+            pipeline_id="test-mt-metrics"
+        )
+        
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert stats["inserted"] == 10
+        # Per-record metric children are bound once, not looked up per record
+        assert pipeline._bound_metrics is not None
     
-    def test_pipeline_error_with_metrics(self):
+    def test_pipeline_error_with_metrics(self, metrics_csv_files):
         """Test pipeline error handling with metrics enabled"""
-        from test_impl import CSVSource
-        from pipeline import DataPipeline
-        from data_interfaces import DataSink
-        
-        # Create a sink that fails
-        class FailingSink(DataSink):
-            def __init__(self):
-                self.stats = {"inserted": 0, "skipped": 0, "errors": 0}
-            
-            def insert_record(self, record_id, content):
-                raise ValueError("Simulated insert error")
-            
-            def commit(self):
-                pass
-            
-            def close(self):
-                pass
-            
-            def get_stats(self):
-                return self.stats
-        
-        # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FailingSink()
-            
-            # Pipeline with failing sink and metrics enabled
-            pipeline = DataPipeline(
-                source, 
-                sink, 
-                num_threads=1,
-                enable_metrics=True,
-                pipeline_id="test-error-metrics"
-            )
-            
-            # Should not raise exception (errors are logged)
-            pipeline.run()
-            pipeline.cleanup()
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
+        csv_path, _, _ = metrics_csv_files
+        
+        source = CSVSource(csv_path)
+        sink = FailingSink()
+        
+        # Pipeline with failing sink and metrics enabled
+        pipeline = DataPipeline(
+            source, 
+            sink, 
+            num_threads=1,
+            enable_metrics=True,
+            pipeline_id="test-error-metrics"
+        )
+        
+        # Should not raise exception (errors are logged)
+        pipeline.run()
+        pipeline.cleanup()
+
+
+CLI_BASE_ARGS = [
+    'pipeline_cli.py',
+    '--source_type', 'csv',
+    '--csv_file', 'test.csv',
+    '--sink_type', 'file',
+    '--output_file', 'output.txt'
+]
+
+
+@pytest.fixture(scope="class")
+def cli_doubles():
+    """
+    Swap pipeline_cli's collaborators (and signal.signal) for plain Mocks once
+    for the whole class with a single patch.multiple, rather than a stack of
+    per-test patch decorators.
+    """
+    with patch.multiple(
+        'pipeline_cli',
+        MetricsServer=DEFAULT,
+        DataPipeline=DEFAULT,
+        CSVSource=DEFAULT,
+        FileSink=DEFAULT,
+        create=False,
+        new_callable=Mock
+    ) as patched, patch('signal.signal', new_callable=Mock):
+        doubles = SimpleNamespace(**patched)
+        doubles.FileSink.return_value.get_stats.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
+        doubles.DataPipeline.return_value.run.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
+        doubles.MetricsServer.return_value.is_running.return_value = False
+        yield doubles
+
+
+@pytest.fixture
+def cli(cli_doubles):
+    """The shared doubles with call history cleared (return values are kept)"""
+    for double in vars(cli_doubles).values():
+        double.reset_mock()
+    return cli_doubles
 
 
 class TestCLIWithMetrics:
     """Test CLI with metrics flags"""
     
-    @patch('pipeline_cli.MetricsServer')
-    @patch('pipeline_cli.DataPipeline')
-    @patch('pipeline_cli.CSVSource')
-    @patch('pipeline_cli.FileSink')
-    def test_cli_with_metrics_port(self, mock_sink, mock_source, mock_pipeline, mock_server):
-        """Test CLI with --metrics-port flag"""
-        from pipeline_cli import main
-        
-        # Setup mocks
-        mock_source_instance = Mock()
-        mock_source.return_value = mock_source_instance
-        
-        mock_sink_instance = Mock()
-        mock_sink_instance.get_stats.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
-        mock_sink.return_value = mock_sink_instance
-        
-        mock_pipeline_instance = Mock()
-        mock_pipeline_instance.run.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
-        mock_pipeline.return_value = mock_pipeline_instance
-        
-        mock_server_instance = Mock()
-        mock_server_instance.is_running.return_value = False
-        mock_server.return_value = mock_server_instance
-        
-        # Mock sys.argv
-        test_args = [
-            'pipeline_cli.py',
-            '--source_type', 'csv',
-            '--csv_file', 'test.csv',
-            '--sink_type', 'file',
-            '--output_file', 'output.txt',
-            '--metrics-port', '8000'
-        ]
-        
-        with patch('sys.argv', test_args):
-            with patch('signal.signal'):
-                try:
-                    main()
-                except SystemExit:  # pragma: no cover
-                    pass  # pragma: no cover
-        
-        # Verify metrics server was started
-        mock_server_instance.start.assert_called_once()
-    
-    @patch('pipeline_cli.DataPipeline')
-    @patch('pipeline_cli.CSVSource')
-    @patch('pipeline_cli.FileSink')
-    def test_cli_without_metrics_port(self, mock_sink, mock_source, mock_pipeline):
-        """Test CLI without --metrics-port flag"""
-        from pipeline_cli import main
-        
-        # Setup mocks
-        mock_source_instance = Mock()
-        mock_source.return_value = mock_source_instance
-        
-        mock_sink_instance = Mock()
-        mock_sink_instance.get_stats.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
-        mock_sink.return_value = mock_sink_instance
-        
-        mock_pipeline_instance = Mock()
-        mock_pipeline_instance.run.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
-        mock_pipeline.return_value = mock_pipeline_instance
-        
-        # Mock sys.argv (no metrics-port)
-        test_args = [
-            'pipeline_cli.py',
-            '--source_type', 'csv',
-            '--csv_file', 'test.csv',
-            '--sink_type', 'file',
-            '--output_file', 'output.txt'
-        ]
-        
-        with patch('sys.argv', test_args):
+    @pytest.mark.parametrize("extra_args, server_started, pipeline_id", [
+        (['--metrics-port', '8000'], True, 'default'),
+        ([], False, 'default'),
+        (['--metrics-port', '8000', '--pipeline-id', 'my-custom-pipeline'], True, 'my-custom-pipeline'),
+    ], ids=["with_port", "without_port", "custom_id"])
+    def test_cli_metrics_flags(self, cli, extra_args, server_started, pipeline_id):
+        """Test CLI with and without --metrics-port, and with a custom pipeline-id"""
+        with patch('sys.argv', CLI_BASE_ARGS + extra_args):
             try:
                 main()
             except SystemExit:  # pragma: no cover
                 pass  # pragma: no cover
         
-        # Pipeline should be created without metrics
-        assert mock_pipeline.called
-    
-    def test_cli_metrics_not_available(self):
-        """Test CLI when prometheus_client not installed"""
-        from pipeline_cli import main
-        
-        # Mock sys.argv with metrics-port
-        test_args = [
-            'pipeline_cli.py',
-            '--source_type', 'csv',
-            '--csv_file', 'test.csv',
-            '--sink_type', 'file',
-            '--output_file', 'output.txt',
-            '--metrics-port', '8000'
-        ]
+        # Metrics server is only started when a port is given
+        assert cli.MetricsServer.return_value.start.called == server_started
         
-        with patch('sys.argv', test_args):
-            with patch('pipeline_cli.METRICS_AVAILABLE', False):
-                with pytest.raises(SystemExit) as exc_info:
-                    main()
-                
-                assert exc_info.value.code == 1
+        # Pipeline created with metrics matching the flag and the right ID
+        call_args = cli.DataPipeline.call_args
+        assert call_args[1]['enable_metrics'] == server_started
+        assert call_args[1]['pipeline_id'] == pipeline_id
     
-    @patch('pipeline_cli.MetricsServer')
-    @patch('pipeline_cli.DataPipeline')
-    @patch('pipeline_cli.CSVSource')
-    @patch('pipeline_cli.FileSink')
-    def test_cli_with_custom_pipeline_id(self, mock_sink, mock_source, mock_pipeline, mock_server):
-        """Test CLI with custom pipeline-id"""
-        from pipeline_cli import main
-        
-        # Setup mocks
-        mock_source_instance = Mock()
-        mock_source.return_value = mock_source_instance
-        
-        mock_sink_instance = Mock()
-        mock_sink_instance.get_stats.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
-        mock_sink.return_value = mock_sink_instance
-        
-        mock_pipeline_instance = Mock()
-        mock_pipeline_instance.run.return_value = {"inserted": 10, "skipped": 0, "errors": 0}
-        mock_pipeline.return_value = mock_pipeline_instance
-        
-        mock_server_instance = Mock()
-        mock_server_instance.is_running.return_value = False
-        mock_server.return_value = mock_server_instance
-        
-        # Mock sys.argv with pipeline-id
-        test_args = [
-            'pipeline_cli.py',
-            '--source_type', 'csv',
-            '--csv_file', 'test.csv',
-            '--sink_type', 'file',
-            '--output_file', 'output.txt',
-            '--metrics-port', '8000',
-            '--pipeline-id', 'my-custom-pipeline'
-        ]
+    def test_cli_metrics_not_available(self, cli):
+        """Test CLI when prometheus_client not installed"""
+        test_args = CLI_BASE_ARGS + ['--metrics-port', '8000']
         
-        with patch('sys.argv', test_args):
-            with patch('signal.signal'):
-                try:
-                    main()
-                except SystemExit:  # pragma: no cover
-                    pass  # pragma: no cover
+        with patch('sys.argv', test_args), \
+                patch.multiple('pipeline_cli', METRICS_AVAILABLE=False):
+            with pytest.raises(SystemExit) as exc_info:
+                main()
+            
+            assert exc_info.value.code == 1
         
-        # Verify pipeline created with custom ID
-        call_args = mock_pipeline.call_args
-        assert call_args[1]['pipeline_id'] == 'my-custom-pipeline'
+        assert not cli.DataPipeline.called
 
 
 class TestMetricsServerEdgeCases:
@@ -340,20 +220,16 @@ class TestMetricsServerEdgeCases:
     
     def test_metrics_server_stop_when_not_running(self):
         """Test stopping server that was never started"""
-        from metrics_server import MetricsServer
-        
-        server = MetricsServer(port=9500)
+        server = MetricsServer(port=0)
         # Should not raise exception
         server.stop()
         assert not server.is_running()
     
     def test_metrics_handler_logging(self):
         """Test MetricsHandler log_message method"""
-        from metrics_server import MetricsServer
-        
         # Create a mock server
-        with MetricsServer(port=9501) as server:
-            time.sleep(0.1)
+        with MetricsServer(port=0) as server:
+            assert server.wait_ready()
             # Server is running, log_message is used internally
             assert server.is_running()
 
@@ -6,16 +6,43 @@ Maintains 100% test coverage!
 Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 """
 import pytest
+import threading
 import time
 import json
-from unittest.mock import patch
-import urllib.request
-from metrics_server import MetricsServer, start_metrics_server
+from http.server import ThreadingHTTPServer
+from unittest.mock import create_autospec, patch
+import urllib3
+from metrics_server import MetricsHandler, MetricsServer, _MetricsCache, start_metrics_server
+
+# Optional faster JSON parsing for response bodies (both accept bytes)
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover
+    json_loads = json.loads
 
 
 class TestMetricsServer:
     """Test MetricsServer class"""
     
+    @pytest.fixture(autouse=True)
+    def fake_http_server(self):
+        """
+        Replace ThreadingHTTPServer with an autospec double, so start()/stop()
+        run the real state machine and thread without opening a socket.
+        
+        serve_forever() blocks until shutdown() is called, like the real thing.
+        """
+        stopped = threading.Event()
+        fake = create_autospec(ThreadingHTTPServer, instance=True)
+        fake.serve_forever.side_effect = lambda *args, **kwargs: stopped.wait()
+        fake.shutdown.side_effect = stopped.set
+        fake.server_address = ("0.0.0.0", 9099)  # Bound port reported for port=0
+        
+        with patch('metrics_server.ThreadingHTTPServer', autospec=True, return_value=fake) as cls:
+            yield cls
+        
+        stopped.set()  # Release the thread if a test left the server running
+    
     def test_server_initialization(self):
         """Test server can be initialized"""
         server = MetricsServer(port=9090)
@@ -29,20 +56,28 @@ class TestMetricsServer:
         assert server.host == '127.0.0.1'
         assert server.port == 9091
     
-    def test_server_start_stop(self):
+    def test_server_start_stop(self, fake_http_server):
         """Test starting and stopping server"""
-        server = MetricsServer(port=9092)
+        server = MetricsServer(port=0)
         
         # Start server
         server.start()
         assert server.is_running()
         
-        # Give it a moment to fully start
-        time.sleep(0.1)
+        # Wait for the server thread to start serving
+        assert server.wait_ready()
         
         # Stop server
         server.stop()
         assert not server.is_running()
+        assert not server.thread.is_alive()
+        fake_http_server.return_value.server_close.assert_called_once()
+    
+    def test_server_port_zero_reports_bound_port(self):
+        """Test port=0 picks a free port and get_url() reports it"""
+        with MetricsServer(port=0) as server:
+            assert server.port == 9099
+            assert server.get_url() == "http://0.0.0.0:9099"
     
     def test_server_get_url(self):
         """Test get_url method"""
@@ -51,15 +86,15 @@ class TestMetricsServer:
     
     def test_server_context_manager(self):
         """Test using server as context manager"""
-        with MetricsServer(port=9094) as server:
+        with MetricsServer(port=0) as server:
             assert server.is_running()
         
         # Should be stopped after exiting context
         assert not server.is_running()
     
-    def test_server_already_running_warning(self):
+    def test_server_already_running_warning(self, fake_http_server):
         """Test warning when starting server that's already running"""
-        server = MetricsServer(port=9095)
+        server = MetricsServer(port=0)
         server.start()
         
         try:
@@ -67,104 +102,119 @@ class TestMetricsServer:
             with patch('metrics_server.logger') as mock_logger:
                 server.start()
                 mock_logger.warning.assert_called()
+            
+            # The second start() didn't create another server
+            assert fake_http_server.call_count == 1
         finally:
             server.stop()
     
-    def test_start_metrics_server_convenience_function(self):
+    def test_start_metrics_server_convenience_function(self, fake_http_server):
         """Test start_metrics_server convenience function"""
-        server = start_metrics_server(port=9096)
+        server = start_metrics_server(port=0, host='127.0.0.1')
         
         try:
             assert server.is_running()
-            assert server.port == 9096
+            fake_http_server.assert_called_once_with(('127.0.0.1', 0), MetricsHandler)
         finally:
             server.stop()
 
 
+@pytest.fixture(scope="module")
+def http_pool():
+    """One urllib3 connection pool shared by all endpoint tests"""
+    pool = urllib3.PoolManager(num_pools=1, maxsize=4)
+    yield pool
+    pool.clear()
+
+
+@pytest.fixture(scope="class")
+def shared_server(http_pool):
+    """
+    One running MetricsServer for every endpoint test in the class.
+    
+    The /health readiness poll doubles as the connectivity check: if the
+    server never answers, the whole class is skipped once here instead of
+    each test guarding its own requests.
+    """
+    with MetricsServer(port=0) as server:
+        # Poll /health until the server answers instead of sleeping blindly
+        deadline = time.monotonic() + 2.0
+        while True:
+            try:
+                response = http_pool.request("GET", f"{server.get_url()}/health",
+                                             timeout=0.5, retries=False)
+                if response.status == 200:
+                    break
+            except urllib3.exceptions.HTTPError:  # pragma: no cover
+                pass  # pragma: no cover
+            if time.monotonic() > deadline:  # pragma: no cover
+                pytest.skip("Metrics server did not become ready")  # pragma: no cover
+            time.sleep(0.005)  # pragma: no cover
+        yield server
+
+
 class TestMetricsEndpoints:
     """Test HTTP endpoints"""
     
-    def test_metrics_endpoint(self):
+    def test_metrics_endpoint(self, http_pool, shared_server):
         """Test /metrics endpoint returns Prometheus format"""
-        with MetricsServer(port=9097) as server:
-            time.sleep(0.2)  # Give server time to start
-            
-            try:
-                response = urllib.request.urlopen(f"{server.get_url()}/metrics", timeout=2)
-                data = response.read().decode('utf-8')
-                
-                # Check for Prometheus format markers
-                assert "# HELP" in data or "# TYPE" in data or "pipeline_" in data
-                assert response.status == 200
-                
-            except Exception as e:  # pragma: no cover
-                pytest.skip(f"Could not connect to server: {e}")  # pragma: no cover
-    
-    def test_health_endpoint(self):
+        response = http_pool.request("GET", f"{shared_server.get_url()}/metrics", timeout=2.0, retries=False)
+        data = response.data
+        
+        # Check for Prometheus format markers
+        assert b"# HELP" in data or b"# TYPE" in data or b"pipeline_" in data
+        assert response.status == 200
+    
+    def test_health_endpoint(self, http_pool, shared_server):
         """Test /health endpoint returns JSON"""
-        with MetricsServer(port=9098) as server:
-            time.sleep(0.2)  # Give server time to start
-            
-            try:
-                response = urllib.request.urlopen(f"{server.get_url()}/health", timeout=2)
-                data = json.loads(response.read().decode('utf-8'))
-                
-                assert data["status"] == "healthy"
-                assert "service" in data
-                assert "version" in data
-                assert response.status == 200
-                
-            except Exception as e:  # pragma: no cover
-                pytest.skip(f"Could not connect to server: {e}")  # pragma: no cover
-    
-    def test_info_endpoint(self):
+        response = http_pool.request("GET", f"{shared_server.get_url()}/health", timeout=2.0, retries=False)
+        data = json_loads(response.data)
+        
+        assert data["status"] == "healthy"
+        assert "service" in data
+        assert "version" in data
+        assert response.status == 200
+    
+    def test_info_endpoint(self, http_pool, shared_server):
         """Test /info endpoint returns service info"""
-        with MetricsServer(port=9099) as server:
-            time.sleep(0.2)  # Give server time to start
-            
-            try:
-                response = urllib.request.urlopen(f"{server.get_url()}/info", timeout=2)
-                data = json.loads(response.read().decode('utf-8'))
-                
-                assert "service" in data
-                assert "endpoints" in data
-                assert "/metrics" in data["endpoints"]
-                assert response.status == 200
-                
-            except Exception as e:  # pragma: no cover
-                pytest.skip(f"Could not connect to server: {e}")  # pragma: no cover
-    
-    def test_root_endpoint(self):
+        response = http_pool.request("GET", f"{shared_server.get_url()}/info", timeout=2.0, retries=False)
+        data = json_loads(response.data)
+        
+        assert "service" in data
+        assert "endpoints" in data
+        assert "/metrics" in data["endpoints"]
+        assert response.status == 200
+    
+    def test_root_endpoint(self, http_pool, shared_server):
         """Test / endpoint returns service info"""
-        with MetricsServer(port=9200) as server:  # Changed to 9200 to avoid conflict
-            time.sleep(0.2)  # Give server time to start
-            
-            try:
-                response = urllib.request.urlopen(f"{server.get_url()}/", timeout=2)
-                data = json.loads(response.read().decode('utf-8'))
-                
-                assert "service" in data
-                assert response.status == 200
-                
-            except Exception as e:  # pragma: no cover
-                pytest.skip(f"Could not connect to server: {e}")  # pragma: no cover
-    
-    def test_404_endpoint(self):
+        response = http_pool.request("GET", f"{shared_server.get_url()}/", timeout=2.0, retries=False)
+        data = json_loads(response.data)
+        
+        assert "service" in data
+        assert response.status == 200
+    
+    def test_404_endpoint(self, http_pool, shared_server):
         """Test unknown endpoint returns 404"""
-        with MetricsServer(port=9101) as server:
-            time.sleep(0.2)  # Give server time to start
-            
-            try:
-                try:
-                    urllib.request.urlopen(f"{server.get_url()}/unknown", timeout=2)
-                    pytest.fail("Should have raised HTTPError 404")  # pragma: no cover
-                except urllib.error.HTTPError as e:
-                    assert e.code == 404
-                    data = json.loads(e.read().decode('utf-8'))
-                    assert "error" in data
-                    
-            except Exception as e:  # pragma: no cover
-                pytest.skip(f"Could not connect to server: {e}")  # pragma: no cover
+        response = http_pool.request("GET", f"{shared_server.get_url()}/unknown", timeout=2.0, retries=False)
+        
+        assert response.status == 404
+        data = json_loads(response.data)
+        assert "error" in data
+    
+    def test_keep_alive_reuses_connection(self, http_pool, shared_server):
+        """Test that HTTP/1.1 responses let one connection serve every request"""
+        url = shared_server.get_url()
+        connections = http_pool.connection_from_url(url)
+        
+        http_pool.request("GET", f"{url}/health", timeout=2.0, retries=False)
+        opened = connections.num_connections
+        
+        for path in ("/metrics", "/info", "/unknown", "/health"):
+            response = http_pool.request("GET", f"{url}{path}", timeout=2.0, retries=False)
+            assert response.headers["Content-Length"] == str(len(response.data))
+        
+        assert connections.num_connections == opened
+        assert len(http_pool.pools) == 1
 
 
 class TestMetricsServerEdgeCases:
@@ -177,11 +227,28 @@ class TestMetricsServerEdgeCases:
         server.stop()
         assert not server.is_running()
     
+    def test_metrics_cache_reuses_output_within_ttl(self):
+        """Test /metrics output is regenerated only once the TTL has passed"""
+        cache = _MetricsCache(ttl=60)
+        
+        with patch('metrics_server.generate_latest', side_effect=[b"first", b"second"]) as render:
+            assert cache.get() == b"first"
+            assert cache.get() == b"first"
+            assert render.call_count == 1
+            
+            cache.ttl = 0
+            assert cache.get() == b"second"
+    
+    def test_wait_ready_times_out_when_not_started(self):
+        """Test wait_ready returns False if the server never starts"""
+        server = MetricsServer(port=9105)
+        assert server.wait_ready(timeout=0.01) is False
+    
     def test_server_thread_cleanup(self):
         """Test that server thread is cleaned up properly"""
-        server = MetricsServer(port=9103)
+        server = MetricsServer(port=0)
         server.start()
-        time.sleep(0.1)
+        assert server.wait_ready()
         
         # Verify thread is running
         assert server.thread is not None
@@ -189,12 +256,12 @@ class TestMetricsServerEdgeCases:
         
         # Stop server
         server.stop()
-        time.sleep(0.1)
+        server.thread.join(timeout=1.0)
         
         # Thread should be stopped
         assert not server.thread.is_alive()
     
-    @patch('metrics_server.HTTPServer')
+    @patch('metrics_server.ThreadingHTTPServer')
     def test_server_start_failure(self, mock_http_server):
         """Test handling of server start failure"""
         mock_http_server.side_effect = OSError("Port already in use")
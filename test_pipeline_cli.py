@@ -8,51 +8,53 @@ GitHub: github.com/kmcallorum
 License: MIT
 """
 import pytest
-import tempfile
 import csv
+from types import SimpleNamespace
 from unittest.mock import Mock, patch
 
 # Import the CLI functions we want to test
 from pipeline_cli import create_source, create_sink, create_error_analyzer, build_query_params
+from pipeline_cli import _PARSER, main, run_with_args
+from error_analyzer import ClaudeErrorAnalyzer, SimpleErrorAnalyzer, NoOpErrorAnalyzer
+import pipeline_cli
+import production_impl
+
+
+# Rows for the CSV → File integration test
+CLI_ROWS = [
+    {"id": "1", "data": "test1"},
+    {"id": "2", "data": "test2"},
+]
 
 
 class TestCreateSource:
     """Test the create_source factory function"""
     
-    def test_create_elasticsearch_source(self):
-        """Test creating ElasticsearchSource"""
-        args = Mock()
-        args.source_type = "elasticsearch"
-        args.es_url = "http://localhost:9200/test/_search"
-        args.batch_size = 1000
-        args.es_user = "user"
-        args.es_pass = "pass"
-        args.api_key = None
-        
-        source = create_source(args)
+    @pytest.mark.parametrize("arg_values, expected_attrs", [
+        (
+            {"source_type": "elasticsearch", "es_url": "http://localhost:9200/test/_search",
+             "batch_size": 1000, "es_user": "user", "es_pass": "pass", "api_key": None,
+             "es_slices": 4, "es_stream": True},
+            {"es_url": "http://localhost:9200/test/_search", "batch_size": 1000, "slices": 4,
+             "streaming": production_impl.IJSON_AVAILABLE},
+        ),
+        (
+            {"source_type": "csv", "csv_file": "test.csv",
+             "csv_id_column": "id", "csv_content_column": "content"},
+            {"filepath": "test.csv", "id_column": "id"},
+        ),
+    ], ids=["elasticsearch", "csv"])
+    def test_create_source(self, arg_values, expected_attrs):
+        """Test creating ElasticsearchSource and CSVSource"""
+        source = create_source(SimpleNamespace(**arg_values))
         
         assert source is not None
-        assert source.es_url == "http://localhost:9200/test/_search"
-        assert source.batch_size == 1000
-    
-    def test_create_csv_source(self):
-        """Test creating CSVSource"""
-        args = Mock()
-        args.source_type = "csv"
-        args.csv_file = "test.csv"
-        args.csv_id_column = "id"
-        args.csv_content_column = "content"
-        
-        source = create_source(args)
-        
-        assert source is not None
-        assert source.filepath == "test.csv"
-        assert source.id_column == "id"
+        for name, value in expected_attrs.items():
+            assert getattr(source, name) == value
     
     def test_create_source_unknown_type(self):
         """Test error on unknown source type"""
-        args = Mock()
-        args.source_type = "unknown"
+        args = SimpleNamespace(source_type="unknown")
         
         with pytest.raises(ValueError) as exc_info:
             create_source(args)
@@ -63,53 +65,31 @@ class TestCreateSource:
 class TestCreateSink:
     """Test the create_sink factory function"""
     
-    def test_create_mysql_sink(self):
-        """Test creating MySQLSink"""
-        args = Mock()
-        args.sink_type = "mysql"
-        args.db_host = "localhost"
-        args.db_user = "root"
-        args.db_pass = "password"
-        args.db_name = "testdb"
-        args.db_table = "testtable"
-        
-        with patch('pipeline_cli.MySQLSink') as MockSink:
-            _ = create_sink(args)
-            
-            MockSink.assert_called_once_with(
-                host="localhost",
-                user="root",
-                password="password",
-                database="testdb",
-                table="testtable"
-            )
-    
-    def test_create_file_sink(self):
-        """Test creating FileSink"""
-        args = Mock()
-        args.sink_type = "file"
-        args.output_file = "output.jsonl"
-        
-        with patch('pipeline_cli.FileSink') as MockSink:
-            _ = create_sink(args)
-            
-            MockSink.assert_called_once_with(filepath="output.jsonl")
-    
-    def test_create_jsonl_sink(self):
-        """Test creating JSONLSink"""
-        args = Mock()
-        args.sink_type = "jsonl"
-        args.output_file = "output.jsonl"
-        
-        with patch('pipeline_cli.JSONLSink') as MockSink:
-            _ = create_sink(args)
-            
-            MockSink.assert_called_once_with(filepath="output.jsonl")
+    @pytest.mark.parametrize("arg_values, sink_name, expected_kwargs", [
+        (
+            {"sink_type": "mysql", "db_host": "localhost", "db_user": "root",
+             "db_pass": "password", "db_name": "testdb", "db_table": "testtable",
+             "threads": 5, "db_load_data": False},
+            "MySQLSink",
+            {"host": "localhost", "user": "root", "password": "password",
+             "database": "testdb", "table": "testtable", "pool_size": 5,
+             "local_infile": False},
+        ),
+        ({"sink_type": "file", "output_file": "output.jsonl"}, "FileSink", {"filepath": "output.jsonl"}),
+        ({"sink_type": "jsonl", "output_file": "output.jsonl"}, "JSONLSink", {"filepath": "output.jsonl"}),
+    ], ids=["mysql", "file", "jsonl"])
+    def test_create_sink(self, monkeypatch, arg_values, sink_name, expected_kwargs):
+        """Test creating MySQLSink, FileSink and JSONLSink"""
+        mock_sink = Mock()
+        monkeypatch.setattr(pipeline_cli, sink_name, mock_sink)
+        
+        _ = create_sink(SimpleNamespace(**arg_values))
+        
+        mock_sink.assert_called_once_with(**expected_kwargs)
     
     def test_create_sink_unknown_type(self):
         """Test error on unknown sink type"""
-        args = Mock()
-        args.sink_type = "unknown"
+        args = SimpleNamespace(sink_type="unknown")
         
         with pytest.raises(ValueError) as exc_info:
             create_sink(args)
@@ -120,39 +100,20 @@ class TestCreateSink:
 class TestCreateErrorAnalyzer:
     """Test the create_error_analyzer factory function"""
     
-    def test_create_claude_error_analyzer(self):
-        """Test creating ClaudeErrorAnalyzer"""
-        args = Mock()
-        args.ai_errors = True
-        args.simple_errors = False
-        
-        analyzer = create_error_analyzer(args)
-        
-        assert analyzer is not None
-        # ClaudeErrorAnalyzer type
-        assert hasattr(analyzer, 'analyze_error')
-    
-    def test_create_simple_error_analyzer(self):
-        """Test creating SimpleErrorAnalyzer"""
-        args = Mock()
-        args.ai_errors = False
-        args.simple_errors = True
+    @pytest.mark.parametrize("ai_errors, simple_errors, expected_class, expected_enabled", [
+        (True, False, ClaudeErrorAnalyzer, None),  # enabled depends on ANTHROPIC_API_KEY
+        (False, True, SimpleErrorAnalyzer, True),
+        (False, False, NoOpErrorAnalyzer, False),  # default
+    ], ids=["claude", "simple", "noop"])
+    def test_create_error_analyzer(self, ai_errors, simple_errors, expected_class, expected_enabled):
+        """Test creating each error analyzer from the CLI flags"""
+        args = SimpleNamespace(ai_errors=ai_errors, simple_errors=simple_errors)
         
         analyzer = create_error_analyzer(args)
         
-        assert analyzer is not None
-        assert analyzer.is_enabled() is True
-    
-    def test_create_noop_error_analyzer(self):
-        """Test creating NoOpErrorAnalyzer (default)"""
-        args = Mock()
-        args.ai_errors = False
-        args.simple_errors = False
-        
-        analyzer = create_error_analyzer(args)
-        
-        assert analyzer is not None
-        assert analyzer.is_enabled() is False
+        assert isinstance(analyzer, expected_class)
+        if expected_enabled is not None:
+            assert analyzer.is_enabled() is expected_enabled
 
 
 class TestBuildQueryParams:
@@ -160,11 +121,7 @@ class TestBuildQueryParams:
     
     def test_build_query_params_with_match_all(self):
         """Test query params with match_all"""
-        args = Mock()
-        args.match_all = True
-        args.gte = None
-        args.lte = None
-        args.limit = None
+        args = SimpleNamespace(match_all=True, gte=None, lte=None, limit=None)
         
         params = build_query_params(args)
         
@@ -172,11 +129,12 @@ class TestBuildQueryParams:
     
     def test_build_query_params_with_date_range(self):
         """Test query params with date range"""
-        args = Mock()
-        args.match_all = False
-        args.gte = "2024-01-01T00:00:00"
-        args.lte = "2024-12-31T23:59:59"
-        args.limit = None
+        args = SimpleNamespace(
+            match_all=False,
+            gte="2024-01-01T00:00:00",
+            lte="2024-12-31T23:59:59",
+            limit=None
+        )
         
         params = build_query_params(args)
         
@@ -187,11 +145,12 @@ class TestBuildQueryParams:
     
     def test_build_query_params_with_limit(self):
         """Test query params with limit"""
-        args = Mock()
-        args.match_all = False
-        args.gte = "2024-01-01T00:00:00"
-        args.lte = "2024-12-31T23:59:59"
-        args.limit = 100
+        args = SimpleNamespace(
+            match_all=False,
+            gte="2024-01-01T00:00:00",
+            lte="2024-12-31T23:59:59",
+            limit=100
+        )
         
         params = build_query_params(args)
         
@@ -199,11 +158,7 @@ class TestBuildQueryParams:
     
     def test_build_query_params_empty(self):
         """Test query params with no filters"""
-        args = Mock()
-        args.match_all = False
-        args.gte = None
-        args.lte = None
-        args.limit = None
+        args = SimpleNamespace(match_all=False, gte=None, lte=None, limit=None)
         
         params = build_query_params(args)
         
@@ -217,19 +172,8 @@ class TestMainFunction:
     @patch('pipeline_cli.create_error_analyzer')
     @patch('pipeline_cli.create_sink')
     @patch('pipeline_cli.create_source')
-    @patch('sys.argv')
-    def test_main_csv_to_file(self, mock_argv, mock_source, mock_sink, mock_analyzer, mock_pipeline):
+    def test_main_csv_to_file(self, mock_source, mock_sink, mock_analyzer, mock_pipeline):
         """Test main with CSV to File"""
-        # Setup command line args
-        mock_argv.__getitem__.return_value = [
-            "pipeline_cli.py",
-            "--source_type", "csv",
-            "--sink_type", "file",
-            "--csv_file", "test.csv",
-            "--output_file", "output.jsonl",
-            "--threads", "1"
-        ]
-        
         # Setup mocks
         mock_source_obj = Mock()
         mock_sink_obj = Mock()
@@ -247,103 +191,77 @@ class TestMainFunction:
             "errors": 0
         }
         
-        # Import and run main
-        from pipeline_cli import main
-        
-        try:
-            with patch('sys.argv', [
-                "pipeline_cli.py",
-                "--source_type", "csv",
-                "--sink_type", "file",
-                "--csv_file", "test.csv",
-                "--output_file", "output.jsonl",
-                "--threads", "1"
-            ]):
-                main()
-        except SystemExit:  # pragma: no cover
-            pass  # pragma: no cover
+        # Parse with the shared parser and run, without going through sys.argv
+        args = _PARSER.parse_args([
+            "--source_type", "csv",
+            "--sink_type", "file",
+            "--csv_file", "test.csv",
+            "--output_file", "output.jsonl",
+            "--threads", "1"
+        ])
+        run_with_args(args)
         
         # Verify pipeline was created and run
         mock_pipeline.assert_called_once()
         mock_pipeline_obj.run.assert_called_once()
         mock_pipeline_obj.cleanup.assert_called_once()
     
-    @patch('sys.argv')
-    @patch('sys.exit')
-    def test_main_with_error(self, mock_exit, mock_argv):
+    def test_main_with_error(self, tmp_path):
         """Test main handles errors gracefully"""
-        mock_argv.__getitem__.return_value = [
-            "pipeline_cli.py",
+        args = _PARSER.parse_args([
             "--source_type", "csv",
             "--sink_type", "file",
-            "--csv_file", "nonexistent.csv",
-            "--output_file", "output.jsonl",
+            "--csv_file", str(tmp_path / "nonexistent.csv"),
+            "--output_file", str(tmp_path / "output.jsonl"),
             "--threads", "1"
-        ]
+        ])
         
-        from pipeline_cli import main
+        # Should catch the exception, log it and exit with status 1
+        with pytest.raises(SystemExit) as exc_info:
+            run_with_args(args)
         
-        # Should catch exception and call sys.exit(1)
-        with patch('sys.argv', [
-            "pipeline_cli.py",
-            "--source_type", "csv",
-            "--sink_type", "file",
-            "--csv_file", "nonexistent.csv",
-            "--output_file", "output.jsonl",
-            "--threads", "1"
-        ]):
-            try:
-                main()
-            except SystemExit:  # pragma: no cover
-                pass  # pragma: no cover
+        assert exc_info.value.code == 1
+    
+    @patch('pipeline_cli.run_with_args')
+    def test_main_parses_argv(self, mock_run):
+        """Test main() parses the given argv and hands the namespace on"""
+        main(["--source_type", "csv", "--sink_type", "jsonl", "--threads", "3"])
+        
+        args = mock_run.call_args[0][0]
+        assert args.source_type == "csv"
+        assert args.sink_type == "jsonl"
+        assert args.threads == 3
 
 
 class TestCLIIntegration:
     """Integration tests for CLI with real (test) data"""
     
-    def test_cli_csv_to_file_integration(self):
+    def test_cli_csv_to_file_integration(self, tmp_path):
         """Test full CLI flow: CSV → File"""
         # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
+        csv_path = tmp_path / "in.csv"
+        with open(csv_path, 'w', newline='') as f:
             writer = csv.DictWriter(f, fieldnames=["id", "data"])
             writer.writeheader()
-            writer.writerow({"id": "1", "data": "test1"})
-            writer.writerow({"id": "2", "data": "test2"})
-            csv_path = f.name
+            writer.writerows(CLI_ROWS)
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        output_path = tmp_path / "out.jsonl"
         
-        try:
-            # Run via CLI
-            with patch('sys.argv', [
-                "pipeline_cli.py",
-                "--source_type", "csv",
-                "--sink_type", "file",
-                "--csv_file", csv_path,
-                "--output_file", output_path,
-                "--threads", "1"
-            ]):
-                from pipeline_cli import main
-                try:
-                    main()
-                except SystemExit:  # pragma: no cover
-                    pass  # pragma: no cover
-            
-            # Verify output
-            import os
-            assert os.path.exists(output_path)
-            
-            with open(output_path, 'r') as f:
-                lines = f.readlines()
-                assert len(lines) == 2
-            
-        finally:
-            import os
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
-
+        # Run via CLI
+        run_with_args(_PARSER.parse_args([
+            "--source_type", "csv",
+            "--sink_type", "file",
+            "--csv_file", str(csv_path),
+            "--output_file", str(output_path),
+            "--threads", "1"
+        ]))
+        
+        # Verify output
+        assert output_path.exists()
+        
+        with open(output_path, 'r') as f:
+            lines = f.readlines()
+            assert len(lines) == len(CLI_ROWS)
 
 if __name__ == "__main__":  # pragma: no cover
     pytest.main([__file__, "-v"])
@@ -9,31 +9,81 @@ These tests specifically target uncovered lines:
 Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 """
 import pytest
-import tempfile
-import csv
-import os
+import queue
+import threading
 from unittest.mock import Mock
-from pipeline import DataPipeline
-from test_impl import CSVSource, FileSink
+from data_interfaces import DataSink, DataSource
+from pipeline import DataPipeline, SINK_BATCH_SIZE
+from test_impl import CSVSource, FileSink, JSONLSink
 from error_analyzer import SimpleErrorAnalyzer
 
 
+def _write_csv(path, rows):
+    """Write an id,data CSV from (id, data) tuples in a single write"""
+    with open(path, 'w', newline='') as f:
+        f.write("id,data\n" + "".join(f"{record_id},{data}\n" for record_id, data in rows))
+
+
+def _ok_source(records=()):
+    """Mock source, restricted to the DataSource interface, yielding records"""
+    source = Mock(spec=DataSource)
+    source.fetch_records.return_value = iter(records)
+    return source
+
+
+def _ok_sink(stats=None):
+    """Mock sink, restricted to the DataSink interface, reporting stats"""
+    sink = Mock(spec=DataSink)
+    sink.get_stats.return_value = stats or {"inserted": 0, "skipped": 0, "errors": 0}
+    return sink
+
+
+class _StubSink(DataSink):
+    """
+    Sink whose insert_record() plays back scripted results - returned as-is,
+    or raised if they are exceptions. A plain class rather than a Mock, since
+    insert_record() sits on the per-record path; results are popped from a
+    SimpleQueue so worker threads can share one script.
+    """
+    
+    def __init__(self, results):
+        self._results = queue.SimpleQueue()
+        for result in results:
+            self._results.put(result)
+        self._scripted = self._results.qsize()
+        self.stats = {"inserted": 0, "skipped": 0, "errors": 0}
+    
+    @property
+    def calls(self):
+        """Number of insert_record() calls so far"""
+        return self._scripted - self._results.qsize()
+    
+    def insert_record(self, record_id, content):
+        result = self._results.get_nowait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    def commit(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    def get_stats(self):
+        return self.stats
+
+
 class TestPipelineErrorHandling:
     """Test error handling in pipeline execution"""
     
     def test_source_fetch_error_single_threaded(self):
         """Test error during source fetch in single-threaded mode"""
         # Create a source that will raise an error
-        mock_source = Mock()
+        mock_source = _ok_source()
         mock_source.fetch_records.side_effect = RuntimeError("Source fetch failed")
-        mock_source.close = Mock()
-        
-        mock_sink = Mock()
-        mock_sink.commit = Mock()
-        mock_sink.close = Mock()
-        mock_sink.get_stats.return_value = {"inserted": 0, "skipped": 0, "errors": 0}
         
-        pipeline = DataPipeline(mock_source, mock_sink, num_threads=1)
+        pipeline = DataPipeline(mock_source, _ok_sink(), num_threads=1)
         
         # Should raise the error from source
         with pytest.raises(RuntimeError) as exc_info:
@@ -41,168 +91,124 @@ class TestPipelineErrorHandling:
         
         assert "Source fetch failed" in str(exc_info.value)
     
-    def test_sink_insert_error_single_threaded(self):
+    def test_sink_insert_error_single_threaded(self, csv_fixture):
         """Test error during sink insert in single-threaded mode"""
-        # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "1", "data": "test1"})
-            writer.writerow({"id": "2", "data": "test2"})
-            writer.writerow({"id": "3", "data": "test3"})
-            csv_path = f.name
-        
-        try:
-            source = CSVSource(csv_path)
-            
-            # Create a sink that fails on specific records
-            mock_sink = Mock()
-            mock_sink.commit = Mock()
-            mock_sink.close = Mock()
-            mock_sink.get_stats.return_value = {"inserted": 1, "skipped": 0, "errors": 2}
-            
-            # First insert succeeds, second and third fail
-            mock_sink.insert_record.side_effect = [
-                True,  # Success
-                RuntimeError("Insert failed"),  # Error
-                True   # Success (should continue after error)
-            ]
-            
-            analyzer = SimpleErrorAnalyzer()
-            pipeline = DataPipeline(source, mock_sink, num_threads=1, error_analyzer=analyzer)
-            
-            # Should complete despite insert errors
-            pipeline.run()
-            pipeline.cleanup()
+        csv_path = csv_fixture(3)
+        
+        source = CSVSource(csv_path)
+        
+        # Create a sink that fails on the second record
+        sink = _StubSink([
+            True,  # Success
+            RuntimeError("Insert failed"),  # Error
+            True   # Success (should continue after error)
+        ])
+        
+        analyzer = SimpleErrorAnalyzer()
+        pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=analyzer)
+        
+        # Should complete despite insert errors
+        pipeline.run()
+        pipeline.cleanup()
 
-            # Verify it attempted all records
-            assert mock_sink.insert_record.call_count == 3
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
+        # Verify it attempted all records
+        assert sink.calls == 3
     
-    def test_error_context_building(self):
+    def test_error_context_building(self, tmp_path, monkeypatch):
         """Test that error context is properly built"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "error_id", "data": "test"})
-            csv_path = f.name
-        
-        try:
-            source = CSVSource(csv_path)
-            
-            # Create a sink that will fail
-            mock_sink = Mock()
-            mock_sink.insert_record.side_effect = ValueError("Test error")
-            mock_sink.commit = Mock()
-            mock_sink.close = Mock()
-            mock_sink.get_stats.return_value = {"inserted": 0, "skipped": 0, "errors": 1}
-            
-            # Use an analyzer that we can inspect
-            analyzer = SimpleErrorAnalyzer()
-            
-            # Patch the analyzer to capture the context
-            captured_context = {}
-            original_analyze = analyzer.analyze_error
-            def capture_analyze(error, context):
-                captured_context.update(context)
-                return original_analyze(error, context)
-            
-            analyzer.analyze_error = capture_analyze
-            
-            pipeline = DataPipeline(source, mock_sink, num_threads=1, error_analyzer=analyzer)
+        csv_path = tmp_path / "in.csv"
+        _write_csv(csv_path, [("error_id", "test")])
+        
+        source = CSVSource(csv_path)
+        
+        # Create a sink that will fail
+        sink = _StubSink([ValueError("Test error")])
+        
+        # Use an analyzer that we can inspect
+        analyzer = SimpleErrorAnalyzer()
+        
+        # Wrap the analyzer so calls still run but their arguments are recorded
+        monkeypatch.setattr(analyzer, "analyze_error", Mock(wraps=analyzer.analyze_error))
 
-            pipeline.run()
-            pipeline.cleanup()
+        pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=analyzer)
+
+        pipeline.run()
+        pipeline.cleanup()
 
-            # Verify context was built correctly
-            assert "operation" in captured_context
-            assert captured_context["operation"] == "sink_insert"
-            assert "record_id" in captured_context
-            assert captured_context["record_id"] == "error_id"
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
+        # Verify context was built correctly
+        analyzer.analyze_error.assert_called_once()
+        captured_context = analyzer.analyze_error.call_args.args[1]
+        assert "operation" in captured_context
+        assert captured_context["operation"] == "sink_insert"
+        assert "record_id" in captured_context
+        assert captured_context["record_id"] == "error_id"
     
-    def test_error_analyzer_failure_non_critical(self):
+    def test_error_analyzer_failure_non_critical(self, csv_fixture):
         """Test that error analyzer failures don't break pipeline"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "1", "data": "test"})
-            csv_path = f.name
-        
-        try:
-            source = CSVSource(csv_path)
-            
-            # Create a sink that will fail
-            mock_sink = Mock()
-            mock_sink.insert_record.side_effect = ValueError("Sink error")
-            mock_sink.commit = Mock()
-            mock_sink.close = Mock()
-            mock_sink.get_stats.return_value = {"inserted": 0, "skipped": 0, "errors": 1}
-            
-            # Create an analyzer that itself fails
-            mock_analyzer = Mock()
-            mock_analyzer.is_enabled.return_value = True
-            mock_analyzer.analyze_error.side_effect = Exception("Analyzer crashed!")
-            
-            pipeline = DataPipeline(source, mock_sink, num_threads=1, error_analyzer=mock_analyzer)
+        csv_path = csv_fixture(1)
+        
+        source = CSVSource(csv_path)
+        
+        # Create a sink that will fail
+        sink = _StubSink([ValueError("Sink error")])
+        
+        # Create an analyzer that itself fails
+        mock_analyzer = Mock()
+        mock_analyzer.is_enabled.return_value = True
+        mock_analyzer.analyze_error.side_effect = Exception("Analyzer crashed!")
+        
+        pipeline = DataPipeline(source, sink, num_threads=1, error_analyzer=mock_analyzer)
 
-            # Pipeline should complete despite analyzer failure
-            pipeline.run()
-            pipeline.cleanup()
+        # Pipeline should complete despite analyzer failure
+        pipeline.run()
+        pipeline.cleanup()
 
-            # Verify analyzer was called but didn't break pipeline
-            assert mock_analyzer.analyze_error.called
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
+        # Verify analyzer was called but didn't break pipeline
+        assert mock_analyzer.analyze_error.called
 
 
 class TestPipelineMultiThreadedErrorHandling:
     """Test error handling in multi-threaded mode"""
     
-    def test_worker_handles_insert_errors(self):
+    def test_worker_handles_insert_errors(self, csv_fixture, tmp_path):
         """Test that worker threads handle insert errors gracefully"""
         # NOTE: This test is simplified to avoid threading issues with mocked exceptions
         # The actual multi-threading is tested in test_pipeline_multithreaded.py
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            for i in range(10):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
-        
-        try:
-            # Use real implementations to avoid mock/threading issues
-            from test_impl import JSONLSink
-            
-            source = CSVSource(csv_path)
-            sink = JSONLSink(output_path)
-            
-            # Test with multi-threading (real sink, no errors)
-            pipeline = DataPipeline(source, sink, num_threads=3)
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            # Should complete successfully
-            assert stats["inserted"] == 10
-            assert stats["errors"] == 0
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        csv_path = csv_fixture(10)
+        
+        output_path = str(tmp_path / "out.jsonl")
+        
+        # Use real implementations to avoid mock/threading issues
+        from test_impl import JSONLSink
+        
+        source = CSVSource(csv_path)
+        sink = JSONLSink(output_path)
+        
+        # Test with multi-threading (real sink, no errors)
+        pipeline = DataPipeline(source, sink, num_threads=3)
+        
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        # Should complete successfully
+        assert stats["inserted"] == 10
+        assert stats["errors"] == 0
+    
+    def test_worker_continues_after_failed_inserts(self):
+        """Test that workers keep draining the queue when inserts fail"""
+        # A False return is counted as skipped (exceptions are caught per
+        # record by _insert_worker via _handle_error); either way the worker
+        # calls task_done() in a finally so run() never hangs on join()
+        records = [(str(i), "{}") for i in range(12)]
+        sink = _StubSink([True, False, True] * 4)
+        
+        pipeline = DataPipeline(_ok_source(records), sink, num_threads=3)
+        pipeline.run()
+        pipeline.cleanup()
+        
+        assert sink.calls == 12
+        assert pipeline.total_processed == 12
 
 
 class TestPipelineCleanup:
@@ -210,14 +216,8 @@ class TestPipelineCleanup:
     
     def test_cleanup_called_properly(self):
         """Test that cleanup closes source and sink"""
-        mock_source = Mock()
-        mock_source.fetch_records.return_value = iter([])
-        mock_source.close = Mock()
-        
-        mock_sink = Mock()
-        mock_sink.commit = Mock()
-        mock_sink.close = Mock()
-        mock_sink.get_stats.return_value = {"inserted": 0, "skipped": 0, "errors": 0}
+        mock_source = _ok_source()
+        mock_sink = _ok_sink()
         
         pipeline = DataPipeline(mock_source, mock_sink, num_threads=1)
         pipeline.run()
@@ -228,14 +228,8 @@ class TestPipelineCleanup:
     
     def test_cleanup_with_error_analyzer(self):
         """Test cleanup works with error analyzer"""
-        mock_source = Mock()
-        mock_source.fetch_records.return_value = iter([])
-        mock_source.close = Mock()
-        
-        mock_sink = Mock()
-        mock_sink.commit = Mock()
-        mock_sink.close = Mock()
-        mock_sink.get_stats.return_value = {"inserted": 0, "skipped": 0, "errors": 0}
+        mock_source = _ok_source()
+        mock_sink = _ok_sink()
         
         analyzer = SimpleErrorAnalyzer()
         
@@ -250,65 +244,123 @@ class TestPipelineCleanup:
 class TestPipelineStatistics:
     """Test statistics tracking and reporting"""
     
-    def test_total_processed_counter(self):
+    def test_total_processed_counter(self, csv_fixture, tmp_path):
         """Test that total_processed is tracked correctly"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            for i in range(100):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            
-            pipeline = DataPipeline(source, sink, num_threads=1)
-            pipeline.run()
+        csv_path = csv_fixture(16)
+        
+        output_path = str(tmp_path / "out.jsonl")
+        
+        source = CSVSource(csv_path)
+        sink = FileSink(output_path)
+        
+        pipeline = DataPipeline(source, sink, num_threads=1)
+        pipeline.run()
 
-            # Verify total_processed
-            assert pipeline.total_processed == 100
-            
-            pipeline.cleanup()
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        # Verify total_processed
+        assert pipeline.total_processed == 16
+        
+        pipeline.cleanup()
     
-    def test_stats_reported_correctly(self):
+    def test_stats_reported_correctly(self, tmp_path):
         """Test that stats are reported from sink"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            writer.writerow({"id": "1", "data": "test1"})
-            writer.writerow({"id": "1", "data": "duplicate"})  # Duplicate
-            writer.writerow({"id": "2", "data": "test2"})
-            csv_path = f.name
-        
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
-        
-        try:
-            source = CSVSource(csv_path)
-            sink = FileSink(output_path)
-            
-            pipeline = DataPipeline(source, sink, num_threads=1)
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            # Verify stats
-            assert stats["inserted"] == 2
-            assert stats["skipped"] == 1
-            assert stats["errors"] == 0
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        csv_path = tmp_path / "in.csv"
+        _write_csv(csv_path, [("1", "test1"), ("1", "duplicate"), ("2", "test2")])
+        
+        output_path = str(tmp_path / "out.jsonl")
+        
+        source = CSVSource(csv_path)
+        sink = FileSink(output_path)
+        
+        pipeline = DataPipeline(source, sink, num_threads=1)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        # Verify stats
+        assert stats["inserted"] == 2
+        assert stats["skipped"] == 1
+        assert stats["errors"] == 0
+
+
+
+class TestPipelineBatchedInsert:
+    """Test the single-threaded insert_many() path used by file sinks"""
+    
+    def test_source_error_keeps_records_read_so_far(self, tmp_path):
+        """Records read before a source failure are still written"""
+        def failing_records(query_params=None):
+            yield ("1", '{"a": 1}')
+            yield ("2", '{"a": 2}')
+            raise RuntimeError("Source died mid-stream")
+        
+        mock_source = _ok_source()
+        mock_source.fetch_records.side_effect = failing_records
+        sink = FileSink(str(tmp_path / "partial.jsonl"))
+        
+        pipeline = DataPipeline(mock_source, sink, num_threads=1)
+        with pytest.raises(RuntimeError):
+            pipeline.run()
+        
+        assert sink.get_stats()["inserted"] == 2
+        assert pipeline.total_processed == 2
+        sink.close()
+    
+    def test_source_read_overlaps_sink_writes(self, tmp_path, monkeypatch):
+        """The next batch is read from the source while the sink writes this one"""
+        second_batch_started = threading.Event()
+        
+        def records(query_params=None):
+            for i in range(2 * SINK_BATCH_SIZE):
+                if i == SINK_BATCH_SIZE:
+                    second_batch_started.set()
+                yield (str(i), "{}")
+        
+        mock_source = _ok_source()
+        mock_source.fetch_records.side_effect = records
+        sink = JSONLSink(str(tmp_path / "out.jsonl"))
+        overlapped = []
+        write = sink.insert_many
+        
+        def insert_many(batch):
+            if not overlapped:  # First batch: wait for the source to move on
+                overlapped.append(second_batch_started.wait(timeout=5))
+            return write(batch)
+        
+        monkeypatch.setattr(sink, "insert_many", insert_many)
+        
+        pipeline = DataPipeline(mock_source, sink, num_threads=1)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert overlapped == [True]
+        assert stats["inserted"] == 2 * SINK_BATCH_SIZE
+    
+    def test_insert_many_error_is_handled(self, tmp_path, monkeypatch):
+        """A failing insert_many() is reported but does not abort the run"""
+        mock_source = _ok_source([("1", "{}"), ("2", "{}")])
+        sink = JSONLSink(str(tmp_path / "out.jsonl"))
+        monkeypatch.setattr(sink, "insert_many", Mock(side_effect=OSError("Disk full")))
+        analyzer = SimpleErrorAnalyzer()
+        
+        pipeline = DataPipeline(mock_source, sink, num_threads=1, error_analyzer=analyzer)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        sink.insert_many.assert_called_once()
+        assert stats["inserted"] == 0
+        assert pipeline.total_processed == 0
+    
+    def test_insert_many_error_in_worker_is_handled(self, tmp_path, monkeypatch):
+        """A worker whose insert_many() raises keeps draining the queue"""
+        records = [(str(i), "{}") for i in range(10)]
+        sink = JSONLSink(str(tmp_path / "out.jsonl"))
+        monkeypatch.setattr(sink, "insert_many", Mock(side_effect=OSError("Disk full")))
+        
+        pipeline = DataPipeline(_ok_source(records), sink, num_threads=3, queue_batch_size=4)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        assert sink.insert_many.call_count == 3
+        assert stats["inserted"] == 0
 
 
 if __name__ == "__main__":  # pragma: no cover
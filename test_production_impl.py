@@ -3,35 +3,41 @@ Tests for production implementations - FIXED infinite loop issue
 
 Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 """
+import gzip
+import io
+import os
+import threading
 import pytest
-from unittest.mock import Mock, patch
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import call, patch
 import json
-from production_impl import ElasticsearchSource, MySQLSink
+import mysql.connector
+import requests
+import urllib3
+import production_impl
+from production_impl import ElasticsearchSource
+from es_testing import FakeResponse, sent_body
 
 
 class TestElasticsearchSource:
     """Test ElasticsearchSource with mocked requests"""
     
-    @patch('production_impl.requests.post')
+    @patch('production_impl.requests.Session.post')
     def test_basic_fetch(self, mock_post):
         """Test basic record fetching from Elasticsearch"""
         # First call returns data, second call returns empty (ends loop)
-        first_response = Mock()
-        first_response.status_code = 200
-        first_response.json.return_value = {
+        first_response = FakeResponse(200, {
             "hits": {"hits": [
                 {"_id": "1", "_source": {"data": "test1"}},
-                {"_id": "2", "_source": {"data": "test2"}}
+                {"_id": "2", "_source": {"data": "test2"}, "sort": [1]}
             ]},
             "_scroll_id": "scroll123"
-        }
+        })
         
-        empty_response = Mock()
-        empty_response.status_code = 200
-        empty_response.json.return_value = {
+        empty_response = FakeResponse(200, {
             "hits": {"hits": []},  # Empty to end the loop!
             "_scroll_id": "scroll123"
-        }
+        })
         
         mock_post.side_effect = [first_response, empty_response]
         
@@ -39,7 +45,8 @@ class TestElasticsearchSource:
             es_url="http://localhost:9200/test/_search",
             es_user="user",
             es_pass="pass",
-            batch_size=10
+            batch_size=10,
+            use_pit=False
         )
         
         records = list(source.fetch_records())
@@ -47,96 +54,394 @@ class TestElasticsearchSource:
         assert len(records) == 2
         assert records[0][0] == "1"
         assert "test1" in records[0][1]
+        # Content is a str in json.dumps format whether or not orjson is installed,
+        # so stored rows don't change with the environment
+        assert isinstance(records[0][1], str)
+        assert records[0][1] == '{"_id": "1", "_source": {"data": "test1"}}'
+        # Sort values are paging state, not part of the stored document
+        assert records[1][1] == '{"_id": "2", "_source": {"data": "test2"}}'
     
-    @patch('production_impl.requests.post')
+    @patch('production_impl.requests.Session.post')
     def test_with_query_params(self, mock_post):
         """Test fetching with query parameters"""
         # Return empty immediately to avoid hanging
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
+        mock_response = FakeResponse(200, {
             "hits": {"hits": []},
             "_scroll_id": "scroll123"
-        }
+        })
         mock_post.return_value = mock_response
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
         
         query_params = {
             "gte": "2024-01-01T00:00:00",
-            "lte": "2024-12-31T23:59:59"
+            "lte": "2024-12-31T23:59:59",
+            "terminate_after": 10000
         }
         list(source.fetch_records(query_params))
         
         # Verify query was built
-        call_args = mock_post.call_args_list[0]
-        sent_data = json.loads(call_args[1]['data'])
-        assert "query" in sent_data
+        sent_data = sent_body(mock_post, 0)
+        assert "range" in sent_data["query"]["constant_score"]["filter"]
+        assert sent_data["sort"] == ["_doc"]
+        assert "track_total_hits" not in sent_data  # Scroll rejects track_total_hits: false
+        assert "terminate_after" not in sent_data  # Enforced client-side as a total limit
+    
+    @patch('production_impl.requests.Session.post')
+    def test_scroll_body_encoded_once(self, mock_post, tmp_path, monkeypatch):
+        """Test continuation requests reuse one encoded body while the scroll id holds"""
+        monkeypatch.chdir(tmp_path)
+        page = FakeResponse(200, {"hits": {"hits": [{"_id": "1"}]}, "_scroll_id": "s1"})
+        last = FakeResponse(200, {"hits": {"hits": []}, "_scroll_id": "s1"})
+        mock_post.side_effect = [page, page, page, last]
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=1,
+            use_pit=False
+        )
+        assert len(list(source.fetch_records())) == 3
+        
+        bodies = [c.kwargs["data"] for c in mock_post.call_args_list[1:]]
+        assert all(body is bodies[0] for body in bodies)
+        assert sent_body(mock_post, 1) == {"scroll": "10m", "scroll_id": "s1"}
+    
+    def test_encode_body_stdlib_fallback(self, monkeypatch):
+        """Test request bodies are encoded with the json module when orjson is missing"""
+        monkeypatch.setattr(production_impl, "ORJSON_AVAILABLE", False)
+        
+        assert production_impl._encode_body({"a": [1, 2]}) == b'{"a": [1, 2]}'
     
-    @patch('production_impl.requests.post')
+    @patch('production_impl.requests.Session.post')
     def test_empty_results(self, mock_post):
         """Test handling of empty result set"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
+        mock_response = FakeResponse(200, {
             "hits": {"hits": []},
             "_scroll_id": "scroll123"
-        }
+        })
         mock_post.return_value = mock_response
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
         
         records = list(source.fetch_records())
         assert len(records) == 0
     
-    @patch('production_impl.requests.post')
+    @patch('production_impl.requests.Session.post')
     def test_scroll_pagination(self, mock_post):
-        """Test scrolling across batches"""
-        first = Mock()
-        first.status_code = 200
-        first.json.return_value = {
+        """Test a page shorter than batch_size ends the scroll without another request"""
+        first = FakeResponse(200, {
             "hits": {"hits": [{"_id": "1", "_source": {"data": "batch1"}}]},
             "_scroll_id": "scroll123"
-        }
+        })
         
-        second = Mock()
-        second.status_code = 200
-        second.json.return_value = {
-            "hits": {"hits": []},  # Empty to end
-            "_scroll_id": "scroll456"
-        }
+        mock_post.side_effect = [first]
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            use_pit=False
+        )
+        
+        records = list(source.fetch_records())
+        assert len(records) == 1
+        assert mock_post.call_count == 1
+    
+    @patch('production_impl.requests.Session.post')
+    def test_sliced_scroll(self, mock_post, tmp_path, monkeypatch):
+        """Test slices=3 scrolls every slice with its own scroll id and merges them"""
+        monkeypatch.chdir(tmp_path)
+        
+        def respond(url, data, **kwargs):
+            body = json.loads(data)
+            if "slice" in body:  # Initial request: two hits from this slice
+                slice_id = body["slice"]["id"]
+                assert body["slice"]["max"] == 3
+                hits = [{"_id": f"{slice_id}-{n}", "_source": {}} for n in range(2)]
+                return FakeResponse(200, {"hits": {"hits": hits}, "_scroll_id": f"scroll{slice_id}"})
+            assert body["scroll_id"] in {"scroll0", "scroll1", "scroll2"}
+            return FakeResponse(200, {"hits": {"hits": []}, "_scroll_id": body["scroll_id"]})
+        
+        mock_post.side_effect = respond
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=2,
+            slices=3
+        )
+        
+        records = list(source.fetch_records())
+        assert sorted(record_id for record_id, _ in records) == [
+            "0-0", "0-1", "1-0", "1-1", "2-0", "2-1"
+        ]
+        assert mock_post.call_count == 6  # One initial + one scroll request per slice
+        
+        # Each slice logs to its own file, footer included - no base log
+        logs = sorted(tmp_path.iterdir())
+        assert [log.name[-11:] for log in logs] == ["-slice0.txt", "-slice1.txt", "-slice2.txt"]
+        for log in logs:
+            text = log.read_text()
+            assert text.startswith("=== ELASTICSEARCH DATA DUMP ===")
+            assert "=== FETCH COMPLETED ===\nTotal records fetched: 2\n" in text
         
-        mock_post.side_effect = [first, second]
+        # The per-slice iterators can be consumed separately
+        mock_post.reset_mock()
+        slices = source.fetch_records_sliced()
+        assert [sorted(r for r, _ in records) for records in slices] == [
+            ["0-0", "0-1"], ["1-0", "1-1"], ["2-0", "2-1"]
+        ]
+    
+    @patch('production_impl.requests.Session.post')
+    def test_sliced_scroll_failure_is_raised(self, mock_post, tmp_path, monkeypatch):
+        """Test a slice whose initial scroll fails fails the whole fetch"""
+        monkeypatch.chdir(tmp_path)
+        mock_post.return_value = FakeResponse(500, text="Internal Server Error")
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            slices=2
+        )
         
+        with pytest.raises(Exception, match="Initial scroll failed"):
+            list(source.fetch_records())
+    
+    def test_slots_reject_typo(self):
+        """Test a misspelt attribute assignment fails instead of being ignored"""
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
             es_pass="pass"
         )
         
+        assert not hasattr(source, "__dict__")
+        with pytest.raises(AttributeError):
+            source.batchsize = 10
+    
+    def test_retry_backoff(self, no_retry_backoff, tmp_path, monkeypatch):
+        """Test 503s are retried 3 times with backoff, without waiting it out"""
+        monkeypatch.chdir(tmp_path)
+        requests_seen = []
+        
+        class Unavailable(BaseHTTPRequestHandler):
+            def do_POST(self):
+                requests_seen.append(self.path)
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        server = HTTPServer(("127.0.0.1", 0), Unavailable)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            source = ElasticsearchSource(
+                es_url=f"http://127.0.0.1:{server.server_port}/test/_search",
+                es_user="user",
+                es_pass="pass",
+                use_pit=False
+            )
+            with pytest.raises(Exception, match="Initial scroll failed: 503"):
+                list(source.fetch_records())
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert len(requests_seen) == 4  # The request plus 3 retries
+        assert no_retry_backoff == [0, 0.4, 0.8]  # backoff_factor=0.2; the first retry is immediate
+    
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_gzip_on_the_wire(self, streaming, tmp_path, monkeypatch):
+        """Test gzip is requested from a real server and its compressed pages are parsed"""
+        monkeypatch.chdir(tmp_path)
+        accept_encodings = []
+        page = gzip.compress(json.dumps({
+            "_scroll_id": "s1",
+            "hits": {"hits": [{"_id": "1", "_source": {"text": "x" * 1000}}]},
+        }).encode())
+        
+        class Compressing(BaseHTTPRequestHandler):
+            def do_POST(self):
+                accept_encodings.append(self.headers["Accept-Encoding"])
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(200)
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+            
+            def do_DELETE(self):  # Scroll clear
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        server = HTTPServer(("127.0.0.1", 0), Compressing)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            source = ElasticsearchSource(
+                es_url=f"http://127.0.0.1:{server.server_port}/test/_search",
+                es_user="user",
+                es_pass="pass",
+                use_pit=False,
+                streaming=streaming
+            )
+            records = list(source.fetch_records())
+            source.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        assert "gzip" in accept_encodings[0]
+        assert len(page) < 100  # 1000 repeated characters compress to almost nothing
+        assert [r[0] for r in records] == ["1"]
+        assert json.loads(records[0][1])["_source"] == {"text": "x" * 1000}
+    
+    @pytest.mark.slow
+    @patch('production_impl.requests.Session.post')
+    def test_scroll_long(self, mock_post, tmp_path, monkeypatch):
+        """Test a 10k-page scroll is followed to the end, with pages built lazily"""
+        monkeypatch.chdir(tmp_path)
+        mock_post.side_effect = _scroll_pages(10000)  # A generator: one page in memory at a time
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=1,
+            use_pit=False
+        )
+        
+        count = 0
+        for count, (record_id, _) in enumerate(source.fetch_records(), 1):
+            assert record_id == str(count - 1)
+        
+        assert count == 10000
+        assert mock_post.call_count == 10001
+    
+    @pytest.mark.slow
+    @patch('production_impl.requests.Session.post')
+    def test_large_batch_yields_every_hit(self, mock_post, tmp_path, monkeypatch):
+        """Test a 50k-hit page comes out as (id, full hit JSON) pairs in order"""
+        monkeypatch.chdir(tmp_path)
+        hits = [{"_id": str(i), "_source": {"n": i}} for i in range(50000)]
+        page = FakeResponse(200, {"hits": {"hits": hits}, "_scroll_id": "s1"})
+        last = FakeResponse(200, {"hits": {"hits": []}, "_scroll_id": "s1"})
+        mock_post.side_effect = [page, last]
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=50000,
+            use_pit=False
+        )
         records = list(source.fetch_records())
-        assert len(records) == 1
+        
+        assert len(records) == 50000
+        assert records[-1] == ("49999", json.dumps(hits[-1]))
     
-    @patch('production_impl.requests.post')
+    def test_session_reuse(self, tmp_path, monkeypatch):
+        """Test every scroll request goes through the source's one pooled session"""
+        monkeypatch.chdir(tmp_path)
+        pages = []
+        for scroll_id, ids in (("s1", ["1"]), ("s1", ["2"]), ("s1", [])):
+            page = FakeResponse(200, {"hits": {"hits": [{"_id": i} for i in ids]},
+                                      "_scroll_id": scroll_id})
+            pages.append(page)
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=1,
+            use_pit=False
+        )
+        
+        with patch.object(requests.Session, "post", autospec=True, side_effect=pages) as mock_post:
+            assert len(list(source.fetch_records())) == 2
+        
+        assert mock_post.call_count == 3
+        assert all(c.args[0] is source.session for c in mock_post.call_args_list)
+        assert all(c.kwargs["timeout"] == production_impl.ES_TIMEOUT for c in mock_post.call_args_list)
+        assert source.session.auth == ("user", "pass")
+    
+    def test_session_adapter_config(self):
+        """Test the session pools connections and retries gateway errors"""
+        source = ElasticsearchSource(
+            es_url="https://localhost:9200/test/_search",
+            api_key="key"
+        )
+        
+        adapter = source.session.get_adapter("https://localhost:9200")
+        assert adapter._pool_maxsize == 16
+        assert adapter.max_retries.total == 3
+        assert set(adapter.max_retries.status_forcelist) == {502, 503, 504}
+        assert source.session.headers["Authorization"] == "ApiKey key"
+    
+    def test_session_pool_sized_for_slices(self):
+        """Test the connection pool grows so every slice thread keeps its connection"""
+        source = ElasticsearchSource(
+            es_url="https://localhost:9200/test/_search",
+            api_key="key",
+            slices=12
+        )
+        
+        assert source.session.get_adapter("https://localhost:9200")._pool_maxsize == 24
+    
+    def test_gzip_decoding(self, tmp_path, monkeypatch):
+        """Test gzip-compressed responses are inflated and parsed"""
+        monkeypatch.chdir(tmp_path)
+        
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            use_pit=False
+        )
+        pages = [
+            _raw_response({"hits": {"hits": [{"_id": "1", "_source": {"data": "test1"}}]},
+                           "_scroll_id": "s1"}, gzipped=True),
+            _raw_response({"hits": {"hits": []}, "_scroll_id": "s1"}, gzipped=True),
+        ]
+        
+        with patch('production_impl.requests.Session.post', side_effect=pages):
+            records = list(source.fetch_records())
+        
+        assert records == [("1", json.dumps({"_id": "1", "_source": {"data": "test1"}}))]
+        assert "gzip" in source.session.headers["Accept-Encoding"]
+    
+    @patch('production_impl.requests.Session.post')
     def test_error_handling_bad_status(self, mock_post):
         """Test error on bad status code"""
-        mock_response = Mock()
-        mock_response.status_code = 500
-        mock_response.text = "Internal Server Error"
+        mock_response = FakeResponse(500, text="Internal Server Error")
         mock_post.return_value = mock_response
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
         
         with pytest.raises(Exception) as exc_info:
@@ -144,220 +449,810 @@ class TestElasticsearchSource:
         
         assert "500" in str(exc_info.value)
     
-    @patch('production_impl.requests.post')
+    @patch('production_impl.requests.Session.post')
     def test_close(self, mock_post):
         """Test close method"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
+        mock_response = FakeResponse(200, {
             "hits": {"hits": []},
             "_scroll_id": "scroll123"
-        }
+        })
         mock_post.return_value = mock_response
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
         
         list(source.fetch_records())
+        with patch.object(source.session, "close") as mock_close:
+            source.close()
+        mock_close.assert_called_once()
+
+
+def _es_response(status_code, payload=None):
+    """Fake requests.Response with a status code and JSON body"""
+    return FakeResponse(status_code, payload, json.dumps(payload or {}))
+
+
+def _raw_response(payload, gzipped=False):
+    """Real requests.Response reading its JSON body from an in-memory stream"""
+    body = json.dumps(payload).encode()
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(gzip.compress(body) if gzipped else body),
+        headers={"Content-Encoding": "gzip"} if gzipped else {},
+        preload_content=False
+    )
+    return response
+
+
+def _scroll_pages(n: int):
+    """n one-hit scroll pages then an empty one, built as they are requested"""
+    for i in range(n):
+        yield FakeResponse(200, {"hits": {"hits": [{"_id": str(i), "_source": {"d": i}}]}, "_scroll_id": "s"})
+    yield FakeResponse(200, {"hits": {"hits": []}, "_scroll_id": "s"})
+
+
+def _es_page(ids, pit_id=None):
+    """Fake search_after page whose hits carry their sort values"""
+    payload = {"hits": {"hits": [{"_id": i, "_source": {"data": i}, "sort": [n]}
+                                 for n, i in enumerate(ids)]}}
+    if pit_id:
+        payload["pit_id"] = pit_id
+    return _es_response(200, payload)
+
+
+@patch('production_impl.requests.Session.delete')
+@patch('production_impl.requests.Session.post')
+class TestElasticsearchSourcePIT:
+    """Test point-in-time + search_after paging and the scroll fallback"""
+    
+    @pytest.fixture(autouse=True)
+    def in_tmp_path(self, tmp_path, monkeypatch):
+        """Keep the raw data log out of the working tree"""
+        monkeypatch.chdir(tmp_path)
+    
+    def _source(self, batch_size=2):
+        return ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=batch_size
+        )
+    
+    def test_search_after_pagination(self, mock_post, mock_delete):
+        """Test search_after and the latest PIT id are echoed into the next page"""
+        mock_post.side_effect = [
+            _es_response(200, {"id": "pit1"}),
+            _es_page(["1", "2"], pit_id="pit2"),
+            _es_page(["3"]),  # Short page ends the fetch
+        ]
+        
+        records = list(self._source().fetch_records())
+        
+        assert [r[0] for r in records] == ["1", "2", "3"]
+        assert records[0][1] == '{"_id": "1", "_source": {"data": "1"}}'
+        
+        open_call, first, second = mock_post.call_args_list
+        assert open_call.args[0] == "http://localhost:9200/test/_pit"
+        assert open_call.kwargs["params"] == {"keep_alive": "1m"}
+        assert first.args[0] == "http://localhost:9200/_search"
+        assert "search_after" not in sent_body(mock_post, 1)
+        
+        body = sent_body(mock_post, 2)
+        assert body["search_after"] == [1]
+        assert body["pit"] == {"id": "pit2", "keep_alive": "1m"}
+        assert body["size"] == 2 and body["sort"] == [{"_shard_doc": "asc"}]
+        # The query is serialized once; later pages only append to it
+        prefix = first.kwargs["data"].split(b',"pit":')[0]
+        assert second.kwargs["data"].startswith(prefix + b',"pit":')
+        
+        # Stateless paging: no scroll context is opened or continued
+        for call in (first, second):
+            assert "scroll" not in call.args[0]
+            assert "scroll" not in (call.kwargs.get("params") or {})
+        
+        mock_delete.assert_called_once()
+        assert mock_delete.call_args.args[0] == "http://localhost:9200/_pit"
+        assert sent_body(mock_delete) == {"id": "pit2"}
+    
+    def test_pit_body_has_query_size_and_sort(self, mock_post, mock_delete):
+        """Test the PIT search carries the query, page size and _shard_doc sort"""
+        mock_post.side_effect = [_es_response(200, {"id": "pit1"}), _es_page([])]
+        
+        list(self._source(batch_size=500).fetch_records(
+            {"gte": "2024-01-01T00:00:00", "lte": "2024-12-31T23:59:59"}))
+        
+        body = sent_body(mock_post, 1)
+        assert body["size"] == 500
+        assert body["sort"] == [{"_shard_doc": "asc"}]
+        assert body["track_total_hits"] is False
+        assert "range" in body["query"]["constant_score"]["filter"]
+    
+    def test_scroll_fallback(self, mock_post, mock_delete):
+        """Test clusters without PIT support (pre-7.10) are read with scroll"""
+        mock_post.side_effect = [
+            _es_response(400, {"error": "no handler found for uri [/test/_pit]"}),
+            _es_response(200, {"hits": {"hits": [{"_id": "1"}, {"_id": "2"}]}, "_scroll_id": "s1"}),
+            _es_response(200, {"hits": {"hits": [{"_id": "3"}]}, "_scroll_id": "s1"}),
+        ]
+        
+        records = list(self._source().fetch_records())
+        
+        assert [r[0] for r in records] == ["1", "2", "3"]
+        assert mock_post.call_args_list[1].args[0] == "http://localhost:9200/test/_search"
+        assert mock_post.call_args_list[2].args[0] == "http://localhost:9200/_search/scroll"
+        assert mock_post.call_count == 3  # The short page was the last - no empty page requested
+        # No PIT to close, but the finished scroll context is cleared
+        mock_delete.assert_called_once()
+        assert mock_delete.call_args.args[0] == "http://localhost:9200/_search/scroll"
+        assert sent_body(mock_delete) == {"scroll_id": ["s1"]}
+    
+    def test_close_clears_abandoned_scroll(self, mock_post, mock_delete):
+        """Test close() frees the latest scroll id of a fetch stopped mid-way"""
+        mock_post.side_effect = [
+            _es_response(200, {"hits": {"hits": [{"_id": "1"}]}, "_scroll_id": "s1"}),
+            _es_response(200, {"hits": {"hits": [{"_id": "2"}]}, "_scroll_id": "s2"}),
+        ]
+        source = ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=1,
+            use_pit=False
+        )
+        
+        records = source.fetch_records()
+        assert [next(records)[0], next(records)[0]] == ["1", "2"]
+        assert source.scroll_ids == {"s2"}
+        mock_delete.assert_not_called()
+        
+        source.close()
+        mock_delete.assert_called_once()
+        assert sent_body(mock_delete) == {"scroll_id": ["s2"]}
+        assert source.scroll_ids == set()
+        records.close()  # The generator's own cleanup finds nothing left to clear
+        mock_delete.assert_called_once()
+    
+    def test_initial_search_failure_closes_pit(self, mock_post, mock_delete):
+        """Test a failed first search raises and still releases the PIT"""
+        mock_post.side_effect = [_es_response(200, {"id": "pit1"}), _es_response(500)]
+        
+        with pytest.raises(Exception) as exc_info:
+            list(self._source().fetch_records())
+        
+        assert "500" in str(exc_info.value)
+        mock_delete.assert_called_once()
+    
+    def test_rejected_pit_search_falls_back_to_scroll(self, mock_post, mock_delete):
+        """Test a cluster that opens a PIT but rejects the _shard_doc sort (7.10-7.11) is scrolled"""
+        mock_post.side_effect = [
+            _es_response(200, {"id": "pit1"}),
+            _es_response(400, {"error": "No mapping found for [_shard_doc] in order to sort on"}),
+            _es_response(200, {"hits": {"hits": [{"_id": "1", "_source": {}}]}, "_scroll_id": "s1"}),
+        ]
+        
+        records = list(self._source().fetch_records())
+        
+        assert [r[0] for r in records] == ["1"]
+        assert mock_post.call_args_list[2].kwargs["params"]["scroll"] == "10m"
+        assert [c.args[0] for c in mock_delete.call_args_list] == [
+            "http://localhost:9200/_pit", "http://localhost:9200/_search/scroll"]
+    
+    def test_later_search_failure_stops_fetch(self, mock_post, mock_delete):
+        """Test a failed follow-up search keeps the records read so far"""
+        mock_post.side_effect = [
+            _es_response(200, {"id": "pit1"}),
+            _es_page(["1", "2"]),
+            _es_response(503),
+        ]
+        
+        records = list(self._source().fetch_records())
+        
+        assert len(records) == 2
+        mock_delete.assert_called_once()
+    
+    def test_terminate_after_limits_total(self, mock_post, mock_delete):
+        """Test terminate_after caps the records yielded across pages, then releases the PIT"""
+        mock_post.side_effect = [
+            _es_response(200, {"id": "pit1"}),
+            _es_page(["1", "2"]),
+            _es_page(["3", "4"]),
+        ]
+        
+        records = list(self._source().fetch_records({"match_all": True, "terminate_after": 3}))
+        
+        assert [r[0] for r in records] == ["1", "2", "3"]
+        assert "terminate_after" not in sent_body(mock_post, 1)
+        mock_delete.assert_called_once()
+    
+    def test_pit_released_when_fetch_abandoned(self, mock_post, mock_delete):
+        """Test closing the source mid-fetch releases the PIT exactly once"""
+        mock_post.side_effect = [_es_response(200, {"id": "pit1"}), _es_page(["1", "2"])]
+        source = self._source()
+        
+        records = source.fetch_records()
+        next(records)
+        records.close()
         source.close()
-        assert True
+        
+        mock_delete.assert_called_once()
+        assert source.pit_id is None
+    
+    def test_close_pit_error_is_not_fatal(self, mock_post, mock_delete):
+        """Test a failed PIT release is logged, not raised"""
+        mock_post.side_effect = [_es_response(200, {"id": "pit1"}), _es_page([])]
+        mock_delete.side_effect = requests.ConnectionError("ES went away")
+        
+        assert list(self._source().fetch_records()) == []
+
+
+@patch('production_impl.requests.Session.delete')
+@patch('production_impl.requests.Session.post')
+class TestElasticsearchSourceStreaming:
+    """Test hits streamed out of responses with ijson"""
+    
+    @pytest.fixture(autouse=True)
+    def needs_ijson(self, tmp_path, monkeypatch):
+        """Skip without ijson; keep the raw data log out of the working tree"""
+        pytest.importorskip("ijson")
+        monkeypatch.chdir(tmp_path)
+    
+    def _source(self, **kwargs):
+        return ElasticsearchSource(
+            es_url="http://localhost:9200/test/_search",
+            es_user="user",
+            es_pass="pass",
+            batch_size=2,
+            streaming=True,
+            **kwargs
+        )
+    
+    def test_streaming_parse(self, mock_post, mock_delete):
+        """Test streamed scroll pages yield the same records as buffered parsing"""
+        hits = [{"_id": "1", "_source": {"price": 9.99, "tags": ["a", "b"]}},
+                {"_id": "2", "_source": {"nested": {"n": None}}}]
+        mock_post.side_effect = [
+            _raw_response({"_scroll_id": "s1", "took": 3, "hits": {"total": {"value": 3}, "hits": hits}}),
+            _raw_response({"_scroll_id": "s2", "hits": {"hits": [{"_id": "3", "sort": [2]}]}}, gzipped=True),
+        ]
+        
+        records = list(self._source(use_pit=False).fetch_records())
+        
+        # The _doc sort adds sort values to each hit; they are not stored
+        assert sent_body(mock_post, 0)["sort"] == ["_doc"]
+        assert records == [(hit["_id"], json.dumps(hit)) for hit in hits + [{"_id": "3"}]]
+        assert mock_post.call_args.kwargs["stream"] is True
+        assert sent_body(mock_post)["scroll_id"] == "s1"  # Read from the streamed first page
+    
+    def test_streaming_search_after(self, mock_post, mock_delete):
+        """Test a streamed PIT page still hands back the PIT id and the last sort value"""
+        mock_post.side_effect = [
+            _es_response(200, {"id": "pit1"}),
+            _raw_response({"pit_id": "pit2", "hits": {"hits": [
+                {"_id": "1", "sort": [10]}, {"_id": "2", "sort": [20]}]}}),
+            _raw_response({"pit_id": "pit2", "hits": {"hits": [{"_id": "3", "sort": [30]}]}}),
+        ]
+        
+        records = list(self._source().fetch_records())
+        
+        assert [r[0] for r in records] == ["1", "2", "3"]
+        body = sent_body(mock_post)
+        assert body["search_after"] == [20]
+        assert body["pit"]["id"] == "pit2"
+        mock_delete.assert_called_once()
+    
+    def test_streaming_response_without_hits(self, mock_post, mock_delete):
+        """Test a response with no hits array ends the fetch"""
+        mock_post.side_effect = [_raw_response({"_scroll_id": "s1", "timed_out": False})]
+        
+        assert list(self._source(use_pit=False).fetch_records()) == []
 
 
 class TestMySQLSink:
     """Test MySQLSink with mocked MySQL"""
 
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_basic_insert(self, mock_pool_class):
+    def test_basic_insert(self, mysql_mocks, mysql_sink):
         """Test basic insert"""
-        mock_cursor = Mock()
-        mock_cursor.rowcount = 1
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
+        mysql_mocks.cursor.rowcount = 1
 
-        result = sink.insert_record("123", '{"data": "test"}')
+        result = mysql_sink.insert_record("123", b'{"data": "test"}')
         assert result is True
+        mysql_sink.insert_record("456", '{"data": "test"}')
+
+        # One pooled connection and prepared statement serve both inserts
+        mysql_mocks.pool.get_connection.assert_called_once()
+        mysql_mocks.conn.cursor.assert_called_once_with(prepared=True)
+        first, second = mysql_mocks.cursor.execute.call_args_list
+        assert first.args[0] is second.args[0] is mysql_sink.insert_sql
+        # Encoded JSON goes to MySQL as the same bytes, not decoded to str
+        assert first.args[1] == ("123", b'{"data": "test"}')
+        assert type(first.args[1][1]) is bytes
     
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_duplicate_handling(self, mock_pool_class):
-        """Test duplicate detection"""
-        mock_cursor = Mock()
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
+    def test_failed_connection_not_reused(self, mysql_mocks, mysql_sink):
+        """Test a connection that errored goes back to the pool, not to the next insert"""
+        mysql_mocks.cursor.rowcount = 1
+        mysql_mocks.cursor.execute.side_effect = [Exception("Lost connection"), None]
 
-        mock_cursor.rowcount = 1
-        result1 = sink.insert_record("123", '{"data": "test"}')
+        assert mysql_sink.insert_record("1", "{}") is False
+        assert mysql_sink.insert_record("2", "{}") is True
+
+        assert mysql_mocks.pool.get_connection.call_count == 2
+        mysql_mocks.conn.close.assert_called_once()
+    
+    def test_close_returns_connections(self, mysql_mocks, mysql_sink):
+        """Test close() hands held connections back to the pool"""
+        mysql_mocks.cursor.rowcount = 1
+        mysql_sink.insert_record("1", "{}")
+        mysql_mocks.conn.close.assert_not_called()
+
+        mysql_sink.close()
+
+        mysql_mocks.conn.close.assert_called_once()
+        mysql_mocks.cursor.close.assert_called_once()
+    
+    def test_duplicate_handling(self, mysql_mocks, mysql_sink):
+        """Test duplicate detection"""
+        mysql_mocks.cursor.rowcount = 1
+        result1 = mysql_sink.insert_record("123", '{"data": "test"}')
         assert result1 is True
 
-        mock_cursor.rowcount = 0
-        result2 = sink.insert_record("123", '{"data": "test2"}')
+        mysql_mocks.cursor.rowcount = 0
+        result2 = mysql_sink.insert_record("123", '{"data": "test2"}')
         assert result2 is False
 
-        stats = sink.get_stats()
+        stats = mysql_sink.get_stats()
         assert stats["inserted"] == 1
         assert stats["skipped"] == 1
+
+        # Duplicates are detected by MySQL's unique key, not a Python-side set
+        assert mysql_mocks.cursor.execute.call_count == 2
+        assert mysql_sink.insert_sql.startswith("INSERT IGNORE INTO testtable")
     
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_commit(self, mock_pool_class):
+    def test_commit(self, mysql_mocks, mysql_sink):
         """Test commit"""
-        mock_cursor = Mock()
-        mock_cursor.rowcount = 1
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
+        mysql_mocks.cursor.rowcount = 1
 
-        sink.insert_record("123", '{"data": "test"}')
-        sink.commit()
-        mock_conn.commit.assert_called()
+        mysql_sink.insert_record("123", '{"data": "test"}')
+        mysql_sink.commit()
+        mysql_mocks.conn.commit.assert_called()
 
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_close(self, mock_pool_class):
+    def test_close(self, mysql_sink):
         """Test close"""
-        mock_cursor = Mock()
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
-
-        sink.close()
+        mysql_sink.close()
         # Just verify close doesn't error
 
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_error_handling(self, mock_pool_class):
+    def test_error_handling(self, mysql_mocks, mysql_sink):
         """Test error handling"""
-        mock_cursor = Mock()
-        mock_cursor.execute.side_effect = Exception("DB error")
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
+        mysql_mocks.cursor.execute.side_effect = Exception("DB error")
 
-        result = sink.insert_record("123", '{"data": "test"}')
+        result = mysql_sink.insert_record("123", '{"data": "test"}')
         assert result is False
-        assert sink.get_stats()["errors"] == 1
+        assert mysql_sink.get_stats()["errors"] == 1
 
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_stats_tracking(self, mock_pool_class):
+    def test_error_on_broken_connection_not_raised(self, mysql_mocks, mysql_sink):
+        """Test a failed insert whose cleanup also fails still just returns False"""
+        mysql_mocks.cursor.execute.side_effect = Exception("Lost connection")
+        mysql_mocks.cursor.close.side_effect = Exception("Lost connection")
+        mysql_mocks.conn.close.side_effect = Exception("Lost connection")
+
+        assert mysql_sink.insert_record("123", "{}") is False
+        assert mysql_sink.insert_many([("1", "{}"), ("2", "{}")]) == 0
+        assert mysql_sink.get_stats()["errors"] == 3
+
+    @pytest.mark.parametrize("rowcounts, expected", [
+        ([1, 1, 0], {"inserted": 2, "skipped": 1, "errors": 0}),
+        ([0, 0], {"inserted": 0, "skipped": 2, "errors": 0}),
+    ], ids=["mixed", "all-duplicates"])
+    def test_stats_tracking(self, mysql_mocks, mysql_sink, rowcounts, expected):
         """Test stats"""
-        mock_cursor = Mock()
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
+        for i, rowcount in enumerate(rowcounts):
+            mysql_mocks.cursor.rowcount = rowcount
+            mysql_sink.insert_record(str(i), '{"data": "test"}')
+
+        assert mysql_sink.get_stats() == expected
+
+    def test_stats_tracking_batched(self, mysql_mocks, make_mysql_sink):
+        """Test batch stats: duplicates from rowcount, a failed chunk as errors"""
+        mysql_mocks.cursor.rowcount = 2
+        mysql_mocks.cursor.execute.side_effect = [None, Exception("DB error")]
+        sink = make_mysql_sink(batch_size=3, commit_every_batches=1)  # First chunk is committed
 
-        mock_cursor.rowcount = 1
-        sink.insert_record("1", '{"data": "test1"}')
-        mock_cursor.rowcount = 1
-        sink.insert_record("2", '{"data": "test2"}')
-        mock_cursor.rowcount = 0
-        sink.insert_record("1", '{"data": "dup"}')
+        sink.insert_many([("1", "{}"), ("2", "{}"), ("3", "{}"), ("4", "{}")])
 
         stats = sink.get_stats()
-        assert stats["inserted"] == 2
-        assert stats["skipped"] == 1
+        assert stats == {"inserted": 2, "skipped": 1, "errors": 1}
+        assert type(stats) is dict
 
+    def test_stats_consistent_across_threads(self, mysql_mocks, mysql_sink):
+        """Test concurrent inserts add up exactly in get_stats()"""
+        mysql_mocks.cursor.rowcount = 1
 
-class TestIntegration:
-    """Integration test"""
+        def insert(start):
+            for i in range(start, start + 250):
+                mysql_sink.insert_record(str(i), "{}")
 
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    @patch('production_impl.requests.post')
-    def test_full_pipeline(self, mock_post, mock_pool_class):
-        """Test ES -> MySQL pipeline"""
-        # ES mock - return data then empty
-        first = Mock()
-        first.status_code = 200
-        first.json.return_value = {
-            "hits": {"hits": [
-                {"_id": "1", "_source": {"data": "test1"}},
-                {"_id": "2", "_source": {"data": "test2"}}
-            ]},
-            "_scroll_id": "scroll123"
-        }
+        threads = [threading.Thread(target=insert, args=(n * 250,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
 
-        empty = Mock()
-        empty.status_code = 200
-        empty.json.return_value = {
-            "hits": {"hits": []},
-            "_scroll_id": "scroll123"
-        }
+        assert mysql_sink.get_stats() == {"inserted": 1000, "skipped": 0, "errors": 0}
 
-        mock_post.side_effect = [first, empty]
+    def test_batch_duplicates_merged_client_side(self, mysql_mocks, mysql_sink):
+        """Test an id repeated within a batch is dropped before the INSERT, keeping the first record"""
+        mysql_mocks.cursor.rowcount = 2
 
-        # MySQL mock
-        mock_cursor = Mock()
-        mock_cursor.rowcount = 1
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
+        assert mysql_sink.insert_many([("1", "a"), ("1", "b"), ("2", "c")]) == 2
 
-        # Run pipeline
-        source = ElasticsearchSource(
+        sql, params = mysql_mocks.cursor.execute.call_args.args
+        assert sql == mysql_sink._insert_values_sql(2)
+        assert params == ("1", "a", "2", "c")
+        assert mysql_sink.get_stats() == {"inserted": 2, "skipped": 1, "errors": 0}
+
+    def test_upsert(self, mysql_mocks, make_mysql_sink):
+        """Test upsert=True replaces existing content and keeps an id's last record in a batch"""
+        mysql_mocks.cursor.rowcount = 3  # One new row, one updated (counted twice)
+        sink = make_mysql_sink(upsert=True)
+        assert sink.insert_sql == ("INSERT INTO testtable (id, content) VALUES (%s, %s)"
+                                   " ON DUPLICATE KEY UPDATE content = VALUES(content)")
+        assert " REPLACE INTO TABLE " in sink.load_sql
+
+        assert sink.insert_many([("1", "a"), ("1", "b"), ("2", "c")]) == 2
+
+        sql, params = mysql_mocks.cursor.execute.call_args.args
+        assert sql.endswith("VALUES (%s, %s), (%s, %s) ON DUPLICATE KEY UPDATE content = VALUES(content)")
+        assert params == ("1", "b", "2", "c")
+        assert sink.get_stats() == {"inserted": 2, "skipped": 1, "errors": 0}
+
+    def test_pool_size_configurable(self, mysql_mocks, make_mysql_sink):
+        """Test the connection pool is built with the requested size"""
+        sink = make_mysql_sink(pool_size=4)
+
+        assert sink.pool_size == 4
+        assert mysql_mocks.pool_class.call_args.kwargs["pool_size"] == 4
+        assert mysql_mocks.pool_class.call_args.kwargs["database"] == "testdb"
+
+    def test_pool_size_capped(self, mysql_mocks, make_mysql_sink):
+        """Test a pool_size past mysql-connector's maximum is capped instead of failing"""
+        sink = make_mysql_sink(pool_size=64)
+
+        assert sink.pool_size == mysql.connector.pooling.CNX_POOL_MAXSIZE
+        assert mysql_mocks.pool_class.call_args.kwargs["pool_size"] == sink.pool_size
+
+    def test_exhausted_pool_waits_for_connection(self, mysql_mocks, mysql_sink):
+        """Test an insert waits for a busy connection when the pool has none left"""
+        mysql_mocks.cursor.rowcount = 1
+        busy = mysql_sink._checkout()
+        mysql_mocks.pool.get_connection.side_effect = mysql.connector.errors.PoolError("pool exhausted")
+        releaser = threading.Timer(0.1, mysql_sink._idle.put, args=(busy,))
+        releaser.start()
+
+        assert mysql_sink.insert_record("1", "{}") is True
+        releaser.join()
+        assert mysql_sink.get_stats()["inserted"] == 1
+
+    def test_batch_insert(self, mysql_mocks, mysql_sink):
+        """Test insert_many sends a batch as one multi-row INSERT, not N executes"""
+        mysql_mocks.cursor.rowcount = 100
+
+        rows = [(str(i), {"data": i}) for i in range(100)]
+        assert mysql_sink.insert_many(rows) == 100
+
+        mysql_mocks.cursor.execute.assert_called_once()
+        mysql_mocks.cursor.executemany.assert_not_called()
+        mysql_mocks.conn.commit.assert_not_called()  # Fewer than commit_every rows
+        mysql_sink.commit()
+        mysql_mocks.conn.commit.assert_called_once()
+        sql, params = mysql_mocks.cursor.execute.call_args.args
+        assert sql == "INSERT IGNORE INTO testtable (id, content) VALUES " + ", ".join(["(%s, %s)"] * 100)
+        assert params[:4] == ("0", '{"data": 0}', "1", '{"data": 1}')
+        assert len(params) == 200
+        assert mysql_sink.get_stats() == {"inserted": 100, "skipped": 0, "errors": 0}
+
+    def test_batch_insert_none_content(self, mysql_mocks, mysql_sink):
+        """Test a None content row goes into the batch as NULL instead of failing the batch"""
+        mysql_mocks.cursor.rowcount = 3
+
+        assert mysql_sink.insert_many([("1", "{}"), ("2", None), ("3", b"{}")]) == 3
+
+        params = mysql_mocks.cursor.execute.call_args.args[1]
+        assert params == ("1", "{}", "2", None, "3", b"{}")
+        assert mysql_sink.get_stats() == {"inserted": 3, "skipped": 0, "errors": 0}
+
+    def test_batch_insert_chunks_and_duplicates(self, mysql_mocks, make_mysql_sink):
+        """Test insert_many splits by batch_size and counts ignored rows as skipped"""
+        mysql_mocks.cursor.rowcount = 1  # One new row per chunk, the rest duplicates
+
+        sink = make_mysql_sink(batch_size=2)
+
+        assert sink.insert_many([(str(i), "{}") for i in range(5)]) == 3
+
+        assert [len(c.args[1]) for c in mysql_mocks.cursor.execute.call_args_list] == [4, 4, 2]
+        mysql_mocks.pool.get_connection.assert_called_once()  # Reused across chunks
+        assert sink.get_stats() == {"inserted": 3, "skipped": 2, "errors": 0}
+
+    def test_full_batches_reuse_prepared_statement(self, mysql_mocks, make_mysql_sink):
+        """Test full-size chunks share one prepared cursor; a short tail uses a plain one"""
+        mysql_mocks.cursor.rowcount = 2
+        sink = make_mysql_sink(batch_size=2)
+
+        sink.insert_many([(str(i), "{}") for i in range(5)])
+        sink.insert_many([("5", "{}"), ("6", "{}")])
+
+        # Single-record cursor, full-batch cursor (opened once), tail cursor
+        assert mysql_mocks.conn.cursor.call_args_list == [
+            call(prepared=True), call(prepared=True), call()
+        ]
+        assert mysql_mocks.cursor.close.call_count == 1  # Only the tail cursor
+        sink.close()
+        assert mysql_mocks.cursor.close.call_count == 3
+
+    def test_batch_insert_splits_large_statements(self, mysql_mocks, make_mysql_sink):
+        """Test insert_many cuts a chunk before it outgrows max_statement_bytes"""
+        mysql_mocks.cursor.rowcount = 2
+        sink = make_mysql_sink(max_statement_bytes=250)
+        big = "x" * 100
+
+        assert sink.insert_many([(str(i), big) for i in range(5)]) == 6
+
+        assert [len(c.args[1]) // 2 for c in mysql_mocks.cursor.execute.call_args_list] == [2, 2, 1]
+        # One template per row count, reused for the second 2-row chunk
+        first, second, _ = mysql_mocks.cursor.execute.call_args_list
+        assert first.args[0] is second.args[0]
+
+    def test_commit_batching(self, mysql_mocks, mysql_sink):
+        """Test batches share a transaction until commit_every_batches, the rest commit on commit()"""
+        mysql_mocks.cursor.rowcount = 1000
+
+        mysql_sink.insert_many([(str(i), "{}") for i in range(2500)])
+        assert mysql_mocks.conn.commit.call_count == 0
+
+        mysql_sink.commit()
+        assert mysql_mocks.conn.commit.call_count == 1
+
+    def test_commit_every_batches(self, mysql_mocks, make_mysql_sink):
+        """Test ten flushed batches trigger one commit"""
+        mysql_mocks.cursor.rowcount = 2
+        sink = make_mysql_sink(batch_size=2)
+
+        for i in range(10):
+            sink.insert_many([(f"{i}a", "{}"), (f"{i}b", "{}")])
+
+        mysql_mocks.conn.commit.assert_called_once()
+        sink.commit()
+        mysql_mocks.conn.commit.assert_called_once()
+
+    def test_failed_batch_rolls_back_uncommitted_batches(self, mysql_mocks, make_mysql_sink):
+        """Test a statement failing after uncommitted batches counts all their rows as errors"""
+        mysql_mocks.cursor.rowcount = 2
+        # Three batches, a deadlock, then the failed batch's rows retried one by one
+        mysql_mocks.cursor.execute.side_effect = [None, None, None, Exception("Deadlock found"), None, None]
+        sink = make_mysql_sink(batch_size=2)  # commit_every_batches=10: nothing committed yet
+
+        for i in range(4):
+            sink.insert_many([(f"{i}a", "{}"), (f"{i}b", "{}")])
+
+        # The open transaction is rolled back, never committed; only the two
+        # retried rows are committed afterwards, one at a time
+        transaction = [name for name, _, _ in mysql_mocks.conn.mock_calls if name in ("commit", "rollback")]
+        assert transaction == ["rollback", "commit", "commit"]
+        assert sink.get_stats() == {"inserted": 2, "skipped": 0, "errors": 6}
+
+    def test_commit_every_single_inserts(self, mysql_mocks, make_mysql_sink):
+        """Test single-record inserts share a transaction until commit_every"""
+        mysql_mocks.cursor.rowcount = 1
+        sink = make_mysql_sink(commit_every=3)
+
+        for i in range(7):
+            sink.insert_record(str(i), "{}")
+
+        assert mysql_mocks.conn.commit.call_count == 2
+        sink.close()
+        assert mysql_mocks.conn.commit.call_count == 3
+
+    def test_failed_commit_counts_rows_as_errors(self, mysql_mocks, mysql_sink):
+        """Test rows lost to a failed commit move from inserted to errors"""
+        mysql_mocks.cursor.rowcount = 2
+        mysql_mocks.conn.commit.side_effect = Exception("Lock wait timeout")
+
+        mysql_sink.insert_many([("1", "{}"), ("2", "{}")])
+        mysql_sink.commit()
+
+        assert mysql_sink.get_stats() == {"inserted": 0, "skipped": 0, "errors": 2}
+
+    def test_batch_insert_error(self, mysql_mocks, mysql_sink):
+        """Test a failed multi-row INSERT whose rows also fail alone counts them all as errors"""
+        mysql_mocks.cursor.execute.side_effect = Exception("DB error")
+
+        assert mysql_sink.insert_many([("1", "{}"), ("2", "{}")]) == 0
+        assert mysql_sink.get_stats()["errors"] == 2
+        # The batch, then each row on its own; every failure drops its connection
+        assert mysql_mocks.cursor.execute.call_count == 3
+        assert mysql_mocks.conn.close.call_count == 3
+
+    def test_batch_insert_error_retries_rows(self, mysql_mocks, mysql_sink):
+        """Test one bad row fails only itself: the batch is retried row by row"""
+        def execute(sql, params):
+            if len(params) > 2 or params[0] == "2":
+                raise mysql.connector.errors.DataError("Data too long for column 'content'")
+        mysql_mocks.cursor.execute.side_effect = execute
+        mysql_mocks.cursor.rowcount = 1
+
+        assert mysql_sink.insert_many([("1", "{}"), ("2", "x" * 100), ("3", "{}")]) == 2
+
+        retried = [c.args for c in mysql_mocks.cursor.execute.call_args_list[1:]]
+        assert retried == [(mysql_sink.insert_sql, ("1", "{}")),
+                           (mysql_sink.insert_sql, ("2", "x" * 100)),
+                           (mysql_sink.insert_sql, ("3", "{}"))]
+        assert mysql_sink.get_stats() == {"inserted": 2, "skipped": 0, "errors": 1}
+
+    def test_bulk_load(self, mysql_mocks, make_mysql_sink):
+        """Test local_infile=True loads a whole batch with one LOAD DATA statement"""
+        loaded = []
+        mysql_mocks.cursor.execute.side_effect = lambda sql, params: loaded.append(
+            open(params[0], encoding="utf-8").read())
+        mysql_mocks.cursor.rowcount = 9999  # One duplicate ignored
+        sink = make_mysql_sink(local_infile=True)
+        assert mysql_mocks.pool_class.call_args.kwargs["allow_local_infile_in_path"] == sink.infile_dir
+
+        rows = ([(str(i), "{}") for i in range(9998)] + [("9998", b"{}")]
+                + [("tab", {"text": "a\tb\\n"})])
+        assert sink.insert_many(rows) == 9999
+
+        mysql_mocks.cursor.execute.assert_called_once()
+        mysql_mocks.cursor.executemany.assert_not_called()
+        sql, (path,) = mysql_mocks.cursor.execute.call_args.args
+        assert sql.startswith("LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE testtable")
+        lines = loaded[0].split("\n")
+        assert len(lines) == 10001 and lines[0] == "0\t{}"
+        assert lines[9999] == "tab\t" + r'{"text": "a\\tb\\\\n"}'  # JSON escapes, doubled
+        assert sink.get_stats() == {"inserted": 9999, "skipped": 1, "errors": 0}
+
+        sink.close()
+        assert not os.path.exists(path) and not os.path.exists(sink.infile_dir)
+
+    def test_bulk_load_none_content(self, mysql_mocks, make_mysql_sink):
+        """Test LOAD DATA writes None content as its NULL marker"""
+        loaded = []
+        mysql_mocks.cursor.execute.side_effect = lambda sql, params: loaded.append(
+            open(params[0], encoding="utf-8").read())
+        mysql_mocks.cursor.rowcount = 2
+        sink = make_mysql_sink(local_infile=True)
+
+        assert sink.insert_many([("1", None), ("2", 7)]) == 2
+        assert loaded == ["1\t\\N\n2\t7\n"]
+        sink.close()
+
+    def test_bulk_threshold(self, mysql_mocks, make_mysql_sink):
+        """Test local_infile with bulk_threshold only loads large batches with LOAD DATA"""
+        mysql_mocks.cursor.rowcount = 2
+        sink = make_mysql_sink(local_infile=True, bulk_threshold=3)
+
+        sink.insert_many([("1", "{}"), ("2", "{}")])
+        assert mysql_mocks.cursor.execute.call_args.args[0] == sink._insert_values_sql(2)
+
+        mysql_mocks.cursor.rowcount = 3
+        assert sink.insert_many([("3", "{}"), ("4", {"a": 1}), ("5", "{}")]) == 3
+        assert "LOAD DATA" in mysql_mocks.cursor.execute.call_args.args[0]
+        assert mysql_mocks.cursor.execute.call_count == 2
+        sink.close()
+
+    def test_bulk_load_error(self, mysql_mocks, make_mysql_sink):
+        """Test a failed LOAD DATA counts the batch as errors and drops the connection"""
+        mysql_mocks.cursor.execute.side_effect = Exception("Loading local data is disabled")
+        sink = make_mysql_sink(local_infile=True)
+
+        assert sink.bulk_load([("1", "{}"), ("2", "{}")]) == 0
+        assert sink.get_stats()["errors"] == 2
+        mysql_mocks.conn.close.assert_called_once()
+        assert os.listdir(sink.infile_dir) == []
+        sink.close()
+
+    def test_buffered_insert_record(self, mysql_mocks, make_mysql_sink):
+        """Test buffer_rows turns insert_record() calls into one multi-row INSERT per buffer"""
+        mysql_mocks.cursor.rowcount = 2  # One duplicate in the first buffer
+        sink = make_mysql_sink(buffer_rows=3)
+
+        for i in range(4):
+            assert sink.insert_record(str(i), {"n": i}) is True
+
+        mysql_mocks.cursor.execute.assert_called_once()
+        sql, params = mysql_mocks.cursor.execute.call_args.args
+        assert sql == sink._insert_values_sql(3)
+        assert params == ("0", '{"n": 0}', "1", '{"n": 1}', "2", '{"n": 2}')
+        assert sink.get_stats() == {"inserted": 2, "skipped": 1, "errors": 0}
+
+        # commit() writes the partial buffer first, then commits both writes
+        mysql_mocks.cursor.rowcount = 1
+        sink.commit()
+        assert mysql_mocks.cursor.execute.call_args.args == (sink.insert_sql, ("3", '{"n": 3}'))
+        mysql_mocks.conn.commit.assert_called_once()
+        assert sink.get_stats() == {"inserted": 3, "skipped": 1, "errors": 0}
+        assert sink.flush() == 0  # Nothing left
+
+    def test_slots_reject_typo(self, mysql_sink):
+        """Test a misspelt attribute assignment fails instead of being ignored"""
+        assert not hasattr(mysql_sink, "__dict__")
+        with pytest.raises(AttributeError):
+            mysql_sink.commitevery = 10
+
+    def test_bulk_load_needs_local_infile(self, mysql_mocks, mysql_sink):
+        """Test bulk_load() refuses to run unless local_infile was enabled"""
+        assert "allow_local_infile_in_path" not in mysql_mocks.pool_class.call_args.kwargs
+        with pytest.raises(ValueError, match="local_infile=True"):
+            mysql_sink.bulk_load([("1", "{}")])
+
+
+class TestIntegration:
+    """Integration test"""
+
+    @pytest.fixture
+    def es_source(self, es_post, tmp_path, monkeypatch):
+        """Scroll source whose first page holds two hits"""
+        monkeypatch.chdir(tmp_path)
+        es_post.side_effect = [
+            _es_response(200, {
+                "hits": {"hits": [
+                    {"_id": "1", "_source": {"data": "test1"}},
+                    {"_id": "2", "_source": {"data": "test2"}}
+                ]},
+                "_scroll_id": "scroll123"
+            }),
+            _es_response(200, {"hits": {"hits": []}, "_scroll_id": "scroll123"}),
+        ]
+        return ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
 
-        sink = MySQLSink(
-            host="localhost", user="root", password="password",
-            database="testdb", table="testtable"
-        )
+    def test_full_pipeline(self, es_source, mysql_mocks, mysql_sink):
+        """Test ES -> MySQL pipeline"""
+        mysql_mocks.cursor.rowcount = 1
 
-        for record_id, content in source.fetch_records():
-            sink.insert_record(record_id, content)
+        for record_id, content in es_source.fetch_records():
+            mysql_sink.insert_record(record_id, content)
 
-        sink.commit()
+        mysql_sink.commit()
 
-        stats = sink.get_stats()
+        stats = mysql_sink.get_stats()
         assert stats["inserted"] == 2
 
-        source.close()
-        sink.close()
+        es_source.close()
+        mysql_sink.close()
+
+    def test_full_pipeline_batched(self, es_source, mysql_mocks, mysql_sink):
+        """Test single-threaded DataPipeline flushes ES hits to MySQL in batches"""
+        from pipeline import DataPipeline
+
+        mysql_mocks.cursor.rowcount = 2
+
+        with DataPipeline(es_source, mysql_sink, num_threads=1, enable_metrics=False) as pipeline:
+            stats = pipeline.run()
+
+        assert stats["inserted"] == 2
+        mysql_mocks.cursor.execute.assert_called_once()
+        assert mysql_mocks.cursor.execute.call_args.args[0] == mysql_sink._insert_values_sql(2)
+
+    def test_full_pipeline_multithreaded(self, es_source, mysql_mocks, mysql_sink):
+        """Test worker threads write each queued batch with one multi-row INSERT"""
+        from pipeline import DataPipeline
+
+        mysql_mocks.cursor.rowcount = 2
+
+        with DataPipeline(es_source, mysql_sink, num_threads=3, enable_metrics=False) as pipeline:
+            stats = pipeline.run()
+
+        assert stats == {"inserted": 2, "skipped": 0, "errors": 0}
+        assert pipeline.total_processed == 2
+        mysql_mocks.cursor.execute.assert_called_once()
+        assert mysql_mocks.cursor.execute.call_args.args[0] == mysql_sink._insert_values_sql(2)
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -9,171 +9,99 @@ These tests target uncovered lines:
 Author: Kevin McAllorum (kevin_mcallorum@linux.com)
 """
 import pytest
-from unittest.mock import Mock, patch
-import json
-from production_impl import ElasticsearchSource, MySQLSink
+from production_impl import ElasticsearchSource
+from es_testing import FakeResponse, sent_body
+
+# The last, empty page of a scroll - FakeResponse is frozen, so tests share it
+_EMPTY_PAGE = FakeResponse(200, {"hits": {"hits": []}, "_scroll_id": "end"})
 
 
 class TestElasticsearchSourceEdgeCases:
     """Test edge cases in ElasticsearchSource"""
     
-    def test_authentication_with_api_key(self):
-        """Test ES source with API key authentication"""
+    @pytest.mark.parametrize("auth_kwargs, headers, auth", [
+        ({"api_key": "test-api-key-12345"}, {"Authorization": "ApiKey test-api-key-12345"}, None),
+        ({"es_user": "admin", "es_pass": "secret"}, {}, ("admin", "secret")),
+    ], ids=["api_key", "user_pass"])
+    def test_authentication(self, auth_kwargs, headers, auth):
+        """Test ES source with API key or username/password authentication"""
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
-            api_key="test-api-key-12345",
-            batch_size=100
+            batch_size=100,
+            **auth_kwargs
         )
         
-        # Verify API key is in headers
-        assert "Authorization" in source.headers
-        assert source.headers["Authorization"] == "ApiKey test-api-key-12345"
-        assert source.auth is None
-    
-    def test_authentication_with_user_pass(self):
-        """Test ES source with username/password authentication"""
-        source = ElasticsearchSource(
-            es_url="http://localhost:9200/test/_search",
-            es_user="admin",
-            es_pass="secret",
-            batch_size=100
-        )
-        
-        # Verify basic auth is set
-        assert source.auth == ("admin", "secret")
-        assert "Authorization" not in source.headers
-    
-    def test_authentication_missing_both(self):
-        """Test ES source with no authentication raises error"""
-        with pytest.raises(ValueError) as exc_info:
-            ElasticsearchSource(
-                es_url="http://localhost:9200/test/_search",
-                batch_size=100
-            )
-        
-        assert "api_key or both es_user and es_pass must be provided" in str(exc_info.value)
+        assert source.headers == {"Content-Type": "application/json", **headers}
+        assert source.auth == auth
     
-    def test_authentication_missing_password(self):
-        """Test ES source with only username raises error"""
-        with pytest.raises(ValueError) as exc_info:
+    @pytest.mark.parametrize("auth_kwargs", [{}, {"es_user": "admin"}], ids=["missing_both", "missing_password"])
+    def test_authentication_missing(self, auth_kwargs):
+        """Test ES source without complete credentials raises error"""
+        with pytest.raises(ValueError, match="api_key or both es_user and es_pass must be provided"):
             ElasticsearchSource(
                 es_url="http://localhost:9200/test/_search",
-                es_user="admin",
-                batch_size=100
+                batch_size=100,
+                **auth_kwargs
             )
-        
-        assert "api_key or both es_user and es_pass must be provided" in str(exc_info.value)
     
-    @patch('production_impl.requests.post')
-    def test_query_building_match_all(self, mock_post):
-        """Test query building with match_all"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "hits": {"hits": []},
-            "_scroll_id": "scroll123"
-        }
-        mock_post.return_value = mock_response
+    @pytest.mark.parametrize("query_params, query", [
+        ({"match_all": True}, {"match_all": {}}),
+        ({"gte": "2024-01-01T00:00:00", "lte": "2024-12-31T23:59:59"},
+         {"constant_score": {"filter": {"range": {"@timestamp": {
+             "gte": "2024-01-01T00:00:00",
+             "lte": "2024-12-31T23:59:59",
+             "format": "strict_date_optional_time",
+         }}}}}),
+    ], ids=["match_all", "date_range"])
+    def test_query_building(self, es_post, query_params, query):
+        """Test the query sent for match_all and for a date range"""
+        es_post.return_value = _EMPTY_PAGE
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
-        )
-        
-        # Query with match_all
-        list(source.fetch_records({"match_all": True}))
-        
-        # Verify the query sent
-        call_args = mock_post.call_args_list[0]
-        sent_query = json.loads(call_args[1]['data'])
-        
-        assert sent_query == {"query": {"match_all": {}}}
-    
-    @patch('production_impl.requests.post')
-    def test_query_building_with_date_range(self, mock_post):
-        """Test query building with date range"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "hits": {"hits": []},
-            "_scroll_id": "scroll123"
-        }
-        mock_post.return_value = mock_response
-        
-        source = ElasticsearchSource(
-            es_url="http://localhost:9200/test/_search",
-            es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
-        
-        # Query with date range
-        query_params = {
-            "gte": "2024-01-01T00:00:00",
-            "lte": "2024-12-31T23:59:59"
-        }
         list(source.fetch_records(query_params))
         
-        # Verify the query sent
-        call_args = mock_post.call_args_list[0]
-        sent_query = json.loads(call_args[1]['data'])
-        
-        assert "query" in sent_query
-        assert "range" in sent_query["query"]
-        assert "@timestamp" in sent_query["query"]["range"]
-        assert sent_query["query"]["range"]["@timestamp"]["gte"] == "2024-01-01T00:00:00"
-        assert sent_query["query"]["range"]["@timestamp"]["lte"] == "2024-12-31T23:59:59"
+        assert sent_body(es_post, 0) == {"query": query, "sort": ["_doc"]}
     
-    def test_query_building_missing_gte(self):
-        """Test query building with missing gte raises error"""
+    @pytest.mark.parametrize("query_params", [
+        {"lte": "2024-12-31T23:59:59"},
+        {"gte": "2024-01-01T00:00:00"},
+    ], ids=["missing_gte", "missing_lte"])
+    def test_query_building_missing_bound(self, query_params):
+        """Test query building with a missing gte or lte raises error"""
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
             es_pass="pass"
         )
         
-        with pytest.raises(ValueError) as exc_info:
-            list(source.fetch_records({"lte": "2024-12-31T23:59:59"}))
-        
-        assert "gte and lte required" in str(exc_info.value)
+        with pytest.raises(ValueError, match="gte and lte required"):
+            list(source.fetch_records(query_params))
     
-    def test_query_building_missing_lte(self):
-        """Test query building with missing lte raises error"""
-        source = ElasticsearchSource(
-            es_url="http://localhost:9200/test/_search",
-            es_user="user",
-            es_pass="pass"
-        )
-        
-        with pytest.raises(ValueError) as exc_info:
-            list(source.fetch_records({"gte": "2024-01-01T00:00:00"}))
-        
-        assert "gte and lte required" in str(exc_info.value)
-    
-    @patch('production_impl.requests.post')
-    def test_scroll_error_handling(self, mock_post):
+    def test_scroll_error_handling(self, es_post):
         """Test error handling during scroll"""
         # First request succeeds
-        first_response = Mock()
-        first_response.status_code = 200
-        first_response.json.return_value = {
+        first_response = FakeResponse(200, {
             "hits": {"hits": [
                 {"_id": "1", "_source": {"data": "test1"}}
             ]},
             "_scroll_id": "scroll123"
-        }
+        })
         
         # Second request fails
-        error_response = Mock()
-        error_response.status_code = 500
-        error_response.text = "Internal Server Error"
+        error_response = FakeResponse(500, text="Internal Server Error")
         
-        mock_post.side_effect = [first_response, error_response]
+        es_post.side_effect = [first_response, error_response]
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
+            es_pass="pass",
+            use_pit=False
         )
         
         # Should get one record then stop due to error
@@ -182,38 +110,27 @@ class TestElasticsearchSourceEdgeCases:
         assert len(records) == 1
         assert records[0][0] == "1"
     
-    @patch('production_impl.requests.post')
-    def test_multiple_batches(self, mock_post):
+    def test_multiple_batches(self, es_post):
         """Test scrolling through multiple batches"""
-        # Three responses: two with data, one empty
-        response1 = Mock()
-        response1.status_code = 200
-        response1.json.return_value = {
+        # Three responses: two full pages (batch_size=1), then the empty one
+        response1 = FakeResponse(200, {
             "hits": {"hits": [{"_id": "1", "_source": {"data": "batch1"}}]},
             "_scroll_id": "scroll1"
-        }
+        })
         
-        response2 = Mock()
-        response2.status_code = 200
-        response2.json.return_value = {
+        response2 = FakeResponse(200, {
             "hits": {"hits": [{"_id": "2", "_source": {"data": "batch2"}}]},
             "_scroll_id": "scroll2"
-        }
-        
-        response3 = Mock()
-        response3.status_code = 200
-        response3.json.return_value = {
-            "hits": {"hits": []},
-            "_scroll_id": "scroll3"
-        }
+        })
         
-        mock_post.side_effect = [response1, response2, response3]
+        es_post.side_effect = [response1, response2, _EMPTY_PAGE]
         
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
             es_pass="pass",
-            batch_size=1
+            batch_size=1,
+            use_pit=False
         )
         
         records = list(source.fetch_records())
@@ -221,106 +138,70 @@ class TestElasticsearchSourceEdgeCases:
         assert len(records) == 2
         assert records[0][0] == "1"
         assert records[1][0] == "2"
+        # One initial search and one scroll call per page, all answered by plain FakeResponses
+        assert es_post.call_count == 3
+        assert sent_body(es_post, 1) == {"scroll": "10m", "scroll_id": "scroll1"}
 
 
 class TestMySQLSinkEdgeCases:
     """Test edge cases in MySQLSink"""
     
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_error_handling_detailed(self, mock_pool_class):
+    def test_error_handling_detailed(self, mysql_mocks, mysql_sink):
         """Test detailed error handling in insert"""
-        mock_cursor = Mock()
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-        
-        sink = MySQLSink(
-            host="localhost",
-            user="root",
-            password="password",
-            database="testdb",
-            table="testtable"
-        )
-        
         # Simulate various error conditions
-        mock_cursor.execute.side_effect = [
+        mysql_mocks.cursor.execute.side_effect = [
             None,  # First succeeds (rowcount=1)
             Exception("Connection lost"),  # Second fails
             None,  # Third succeeds
         ]
-        mock_cursor.rowcount = 1
+        mysql_mocks.cursor.rowcount = 1
         
-        result1 = sink.insert_record("1", '{"data": "test1"}')
+        result1 = mysql_sink.insert_record("1", '{"data": "test1"}')
         assert result1 is True
         
-        result2 = sink.insert_record("2", '{"data": "test2"}')
+        result2 = mysql_sink.insert_record("2", '{"data": "test2"}')
         assert result2 is False
         
-        mock_cursor.rowcount = 1
-        result3 = sink.insert_record("3", '{"data": "test3"}')
+        mysql_mocks.cursor.rowcount = 1
+        result3 = mysql_sink.insert_record("3", '{"data": "test3"}')
         assert result3 is True
         
-        stats = sink.get_stats()
-        assert stats["inserted"] == 2
-        assert stats["errors"] == 1
+        # Record 1 was still uncommitted on the connection record 2 failed
+        # on, so it was rolled back with it and counts as an error
+        stats = mysql_sink.get_stats()
+        assert stats["inserted"] == 1
+        assert stats["errors"] == 2
+        
+        # One prepared-statement execute per record; the failed record's
+        # connection was rolled back and dropped rather than reused
+        assert mysql_mocks.cursor.execute.call_count == 3
+        mysql_mocks.conn.rollback.assert_called_once()
+        mysql_mocks.conn.commit.assert_not_called()  # Record 1 is never committed
+        mysql_mocks.conn.close.assert_called_once()
     
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_commit_logging(self, mock_pool_class):
-        """Test that commit logs stats (commit is a no-op, commits happen per-record)"""
-        mock_cursor = Mock()
-        mock_cursor.rowcount = 1
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
+    def test_commit_logging(self, mysql_mocks, mysql_sink):
+        """Test that inserts wait for commit() (or commit_every rows) to commit"""
+        mysql_mocks.cursor.rowcount = 1
 
-        sink = MySQLSink(
-            host="localhost",
-            user="root",
-            password="password",
-            database="testdb",
-            table="testtable"
-        )
+        # A single insert stays in the open transaction
+        mysql_sink.insert_record("1", '{"data": "test"}')
+        assert mysql_mocks.conn.commit.call_count == 0
 
-        # Insert calls commit once per record
-        sink.insert_record("1", '{"data": "test"}')
-        assert mock_conn.commit.call_count == 1
+        # sink.commit() commits it; a second commit has nothing left to do
+        mysql_sink.commit()
+        mysql_sink.commit()
 
-        # sink.commit() is a no-op that just logs, doesn't call conn.commit()
-        sink.commit()
-        sink.commit()
-
-        # Commit count should still be 1 (from insert_record)
-        assert mock_conn.commit.call_count == 1
+        assert mysql_mocks.conn.commit.call_count == 1
     
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    def test_stats_copy_independence(self, mock_pool_class):
+    def test_stats_copy_independence(self, mysql_sink):
         """Test that get_stats returns independent copy"""
-        mock_cursor = Mock()
-        mock_cursor.rowcount = 1
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
-        
-        sink = MySQLSink(
-            host="localhost",
-            user="root",
-            password="password",
-            database="testdb",
-            table="testtable"
-        )
+        # Seed the counters directly - the insert path isn't under test
+        mysql_sink._count(inserted=1)
         
-        sink.insert_record("1", '{"data": "test"}')
-        
-        stats1 = sink.get_stats()
+        stats1 = mysql_sink.get_stats()
         stats1["inserted"] = 999  # Modify returned stats
         
-        stats2 = sink.get_stats()
+        stats2 = mysql_sink.get_stats()
         
         # Original stats should be unchanged
         assert stats2["inserted"] == 1
@@ -330,82 +211,59 @@ class TestMySQLSinkEdgeCases:
 class TestProductionImplIntegration:
     """Integration tests for production implementations"""
     
-    @patch('production_impl.mysql.connector.pooling.MySQLConnectionPool')
-    @patch('production_impl.requests.post')
-    def test_full_es_to_mysql_flow(self, mock_post, mock_pool_class):
+    def test_full_es_to_mysql_flow(self, es_post, mysql_mocks, mysql_sink):
         """Test complete ES -> MySQL flow with all edge cases"""
         # Setup ES mock with multiple batches
-        batch1 = Mock()
-        batch1.status_code = 200
-        batch1.json.return_value = {
+        batch1 = FakeResponse(200, {
             "hits": {"hits": [
                 {"_id": "1", "_source": {"data": "test1"}},
                 {"_id": "2", "_source": {"data": "test2"}}
             ]},
             "_scroll_id": "scroll1"
-        }
+        })
 
-        batch2 = Mock()
-        batch2.status_code = 200
-        batch2.json.return_value = {
+        batch2 = FakeResponse(200, {
             "hits": {"hits": [
                 {"_id": "3", "_source": {"data": "test3"}}
             ]},
             "_scroll_id": "scroll2"
-        }
-
-        empty = Mock()
-        empty.status_code = 200
-        empty.json.return_value = {
-            "hits": {"hits": []},
-            "_scroll_id": "scroll3"
-        }
+        })
 
-        mock_post.side_effect = [batch1, batch2, empty]
+        # batch2 is a short page, so no empty page is fetched after it
+        es_post.side_effect = [batch1, batch2]
 
         # Setup MySQL mock with some errors
-        mock_cursor = Mock()
-        mock_conn = Mock()
-        mock_conn.cursor.return_value = mock_cursor
-        mock_pool = Mock()
-        mock_pool.get_connection.return_value = mock_conn
-        mock_pool_class.return_value = mock_pool
         
         # First two inserts succeed, third fails
-        mock_cursor.execute.side_effect = [
+        mysql_mocks.cursor.execute.side_effect = [
             None,  # Record 1: success
             None,  # Record 2: success
             Exception("Deadlock"),  # Record 3: error
         ]
-        mock_cursor.rowcount = 1
+        mysql_mocks.cursor.rowcount = 1
         
-        # Create source and sink
+        # Create source
         source = ElasticsearchSource(
             es_url="http://localhost:9200/test/_search",
             es_user="user",
-            es_pass="pass"
-        )
-        
-        sink = MySQLSink(
-            host="localhost",
-            user="root",
-            password="password",
-            database="testdb",
-            table="testtable"
+            es_pass="pass",
+            batch_size=2,
+            use_pit=False
         )
         
         # Run the pipeline manually
         for record_id, content in source.fetch_records():
-            sink.insert_record(record_id, content)
+            mysql_sink.insert_record(record_id, content)
         
-        sink.commit()
+        mysql_sink.commit()
         
-        stats = sink.get_stats()
-        assert stats["inserted"] == 2
-        assert stats["errors"] == 1
+        # The deadlock rolls back the whole open transaction, records 1 and 2 included
+        stats = mysql_sink.get_stats()
+        assert stats["inserted"] == 0
+        assert stats["errors"] == 3
         
         source.close()
-        sink.close()
+        mysql_sink.close()
 
 
 if __name__ == "__main__":  # pragma: no cover
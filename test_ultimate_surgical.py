@@ -9,12 +9,42 @@ Lines targeted:
 Author: Kevin McAllorum
 """
 import pytest
-import tempfile
-import csv
-import os
-import time
+import io
+from types import SimpleNamespace
 from unittest.mock import patch
-import importlib
+import importlib.util
+
+
+def _handle_get(path):
+    """
+    Run MetricsHandler.do_GET() for path without a socket or server thread;
+    returns the response status code
+    """
+    from metrics_server import MetricsHandler, _MetricsCache
+    
+    handler = MetricsHandler.__new__(MetricsHandler)
+    handler.server = SimpleNamespace(metrics_cache=_MetricsCache())
+    handler.client_address = ("127.0.0.1", 0)
+    handler.command, handler.path = "GET", path
+    handler.request_version = handler.protocol_version
+    handler.requestline = f"GET {path} {handler.protocol_version}"
+    handler.wfile = io.BytesIO()
+    handler.do_GET()
+    return int(handler.wfile.getvalue().split(b" ", 2)[1])
+
+
+@pytest.fixture(scope="module")
+def metrics_server():
+    """
+    One running MetricsServer for the end-to-end endpoint tests in this
+    module. They only request /metrics with generate_latest() patched to
+    fail, so no output is ever cached between them.
+    """
+    from metrics_server import MetricsServer
+    
+    with MetricsServer(port=0) as server:
+        assert server.wait_ready()
+        yield server
 
 
 class TestMetricsServerLine49to51:
@@ -22,23 +52,11 @@ class TestMetricsServerLine49to51:
     
     def test_metrics_endpoint_with_exception(self):
         """Test /metrics when generate_latest() raises exception"""
-        from metrics_server import MetricsServer
-        import urllib.request
-        
-        with MetricsServer(port=9700) as server:
-            time.sleep(0.2)
-            
-            # Patch generate_latest to raise exception
-            with patch('metrics_server.generate_latest', side_effect=Exception("Metrics generation failed")):
-                try:
-                    urllib.request.urlopen(f"{server.get_url()}/metrics", timeout=2)
-                    # Should get 500 error
-                    pytest.fail("Should have raised HTTPError")  # pragma: no cover
-                except urllib.error.HTTPError as e:
-                    # Lines 49-51: exception caught and _serve_error called
-                    assert e.code == 500
-                except Exception as e:  # pragma: no cover
-                    pytest.skip(f"Could not connect: {e}")  # pragma: no cover
+        # Patch generate_latest to raise exception; the handler runs directly,
+        # test_error_flow_end_to_end covers the same path over HTTP
+        with patch('metrics_server.generate_latest', side_effect=Exception("Metrics generation failed")):
+            # Lines 49-51: exception caught and _serve_error called
+            assert _handle_get("/metrics") == 500
 
 
 class TestMetricsServerLine171:
@@ -48,9 +66,9 @@ class TestMetricsServerLine171:
         """Test server stop when thread is still running"""
         from metrics_server import MetricsServer
         
-        server = MetricsServer(port=9701)
+        server = MetricsServer(port=0)
         server.start()
-        time.sleep(0.2)
+        assert server.wait_ready()
         
         # Verify thread is alive
         assert server.thread.is_alive()
@@ -65,57 +83,41 @@ class TestMetricsServerLine171:
 class TestPipelineLine270:
     """Hit line 270: Multi-threaded worker without metrics"""
     
-    def test_multithreaded_without_metrics(self):
+    def test_multithreaded_without_metrics(self, tmp_path):
         """Test multi-threaded pipeline with metrics disabled"""
         from test_impl import CSVSource, JSONLSink
         from pipeline import DataPipeline
         
-        # Create test CSV
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as f:
-            writer = csv.DictWriter(f, fieldnames=["id", "data"])
-            writer.writeheader()
-            for i in range(10):
-                writer.writerow({"id": str(i), "data": f"test{i}"})
-            csv_path = f.name
+        # In-memory CSV - the target is the worker path, not file reading
+        source = CSVSource.from_bytes(
+            b"id,data\n" + b"".join(f"{i},test{i}\n".encode() for i in range(10)))
+        sink = JSONLSink(str(tmp_path / "out.jsonl"))
         
-        output_path = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False).name
+        # Multi-threaded with metrics DISABLED
+        pipeline = DataPipeline(
+            source,
+            sink,
+            num_threads=2,
+            enable_metrics=False,  # Disabled!
+            pipeline_id="no-metrics"
+        )
         
-        try:
-            source = CSVSource(csv_path)
-            sink = JSONLSink(output_path)
-            
-            # Multi-threaded with metrics DISABLED
-            pipeline = DataPipeline(
-                source,
-                sink,
-                num_threads=2,
-                enable_metrics=False,  # Disabled!
-                pipeline_id="no-metrics"
-            )
-            
-            stats = pipeline.run()
-            pipeline.cleanup()
-            
-            # Line 270 should be hit in workers (insert without metrics)
-            assert stats["inserted"] == 10
-            
-        finally:
-            if os.path.exists(csv_path):
-                os.unlink(csv_path)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
+        stats = pipeline.run()
+        pipeline.cleanup()
+        
+        # Line 270 should be hit in workers (insert without metrics)
+        assert stats["inserted"] == 10
 
 
 class TestPipelineCLILine32to34:
     """Hit lines 32-34: ImportError for metrics_server"""
     
-    def test_cli_import_error_path(self):
+    def test_cli_import_error_path(self, monkeypatch):
         """Test the ImportError path when metrics_server can't be imported"""
-        # We need to simulate the import failing
-        # The import happens at module load, so we need to reload the module
-        
-        # Save original import
+        # The import happens at module load, so a disposable copy of the module
+        # is loaded; the cached pipeline_cli in sys.modules is never touched
         import builtins
+        import pipeline_cli
         original_import = builtins.__import__
         
         def mock_import(name, *args, **kwargs):
@@ -123,60 +125,41 @@ class TestPipelineCLILine32to34:
                 raise ImportError("Simulated import error")
             return original_import(name, *args, **kwargs)
         
-        # Temporarily replace __import__
-        builtins.__import__ = mock_import
+        spec = importlib.util.spec_from_file_location("pipeline_cli_probe", pipeline_cli.__file__)
+        probe = importlib.util.module_from_spec(spec)
+        monkeypatch.setattr(builtins, "__import__", mock_import)
+        spec.loader.exec_module(probe)
         
-        try:
-            # Reload pipeline_cli to trigger the import
-            import pipeline_cli
-            importlib.reload(pipeline_cli)
-            
-            # Lines 32-34 should be executed
-            # METRICS_AVAILABLE should be False
-            assert not pipeline_cli.METRICS_AVAILABLE
-            
-        finally:
-            # Restore original import
-            builtins.__import__ = original_import
-            
-            # Reload pipeline_cli again to restore normal state
-            import pipeline_cli
-            importlib.reload(pipeline_cli)
+        # Lines 32-34 should be executed
+        # METRICS_AVAILABLE should be False
+        assert probe.METRICS_AVAILABLE is False
+        assert pipeline_cli.METRICS_AVAILABLE is True
 
 
 class TestAllMissingLinesTogether:
     """Comprehensive test hitting multiple missing lines"""
     
-    def test_error_flow_end_to_end(self):
+    def test_error_flow_end_to_end(self, metrics_server):
         """Test complete error flow through metrics server"""
-        from metrics_server import MetricsServer
         import urllib.request
         
-        # Start server
-        server = MetricsServer(port=9702)
-        server.start()
-        time.sleep(0.2)
-        
         try:
             # Test 404 path (hits _serve_error indirectly)
             try:
-                urllib.request.urlopen(f"{server.get_url()}/bad-path", timeout=2)
+                urllib.request.urlopen(f"{metrics_server.get_url()}/bad-path", timeout=2)
             except urllib.error.HTTPError as e:
                 assert e.code == 404
             
             # Test metrics path with mocked failure
             with patch('metrics_server.generate_latest', side_effect=RuntimeError("Test")):
                 try:
-                    urllib.request.urlopen(f"{server.get_url()}/metrics", timeout=2)
+                    urllib.request.urlopen(f"{metrics_server.get_url()}/metrics", timeout=2)
                 except urllib.error.HTTPError as e:
                     # This hits lines 49-51 and 93-97
                     assert e.code == 500
             
         except Exception as e:  # pragma: no cover
             pytest.skip(f"Network error: {e}")  # pragma: no cover
-        finally:
-            # Stop server - hits line 171
-            server.stop()
 
 
 if __name__ == "__main__":  # pragma: no cover